@@ -0,0 +1,50 @@
+"""Add project task rollups
+
+Revision ID: 36d8421c7097
+Revises: 80286e5d7bf1
+Create Date: 2026-10-19 09:12:41.530218
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '36d8421c7097'
+down_revision: Union[str, Sequence[str], None] = '80286e5d7bf1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('projects', sa.Column('total_tasks', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('projects', sa.Column('completed_tasks', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('projects', sa.Column('next_deadline', sa.TIMESTAMP(timezone=True), nullable=True))
+    op.create_index('ix_tasks_project_id_deadline_date', 'tasks', ['project_id', 'deadline_date'], unique=False)
+    # Backfill rollups for existing tasks
+    op.execute(
+        """
+        UPDATE projects SET
+            total_tasks = (SELECT count(*) FROM tasks WHERE tasks.project_id = projects.id),
+            completed_tasks = (
+                SELECT count(*) FROM tasks
+                WHERE tasks.project_id = projects.id AND tasks.status = 'completed'
+            ),
+            next_deadline = (
+                SELECT min(tasks.deadline_date) FROM tasks
+                WHERE tasks.project_id = projects.id AND tasks.status != 'completed'
+            )
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_tasks_project_id_deadline_date', table_name='tasks')
+    with op.batch_alter_table('projects') as batch_op:
+        batch_op.drop_column('next_deadline')
+        batch_op.drop_column('completed_tasks')
+        batch_op.drop_column('total_tasks')
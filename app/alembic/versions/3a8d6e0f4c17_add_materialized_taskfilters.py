@@ -0,0 +1,49 @@
+"""Add materialized taskfilters
+
+Revision ID: 3a8d6e0f4c17
+Revises: 7e2f5b1c9a83
+Create Date: 2026-10-19 15:02:44.810273
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3a8d6e0f4c17'
+down_revision: Union[str, Sequence[str], None] = '7e2f5b1c9a83'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        'taskfilters',
+        sa.Column('materialized', sa.Boolean(), server_default=sa.false(), nullable=False),
+    )
+    # Existing filters are not materialized so the membership starts empty
+    op.create_table(
+        'taskfilter_members',
+        sa.Column('filter_id', sa.Uuid(), nullable=False),
+        sa.Column('task_id', sa.Uuid(), nullable=False),
+        sa.ForeignKeyConstraint(['filter_id'], ['taskfilters.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['task_id'], ['tasks.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('filter_id', 'task_id'),
+    )
+    op.create_index(
+        op.f('ix_taskfilter_members_task_id'),
+        'taskfilter_members',
+        ['task_id'],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_taskfilter_members_task_id'), table_name='taskfilter_members')
+    op.drop_table('taskfilter_members')
+    with op.batch_alter_table('taskfilters') as batch_op:
+        batch_op.drop_column('materialized')
@@ -0,0 +1,77 @@
+"""Add task positions
+
+Revision ID: 5b0e6f3c21a4
+Revises: 36d8421c7097
+Create Date: 2026-10-19 10:03:17.224512
+
+"""
+from itertools import groupby
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.repository_layer.util_fractional_index import keys_between
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b0e6f3c21a4'
+down_revision: Union[str, Sequence[str], None] = '36d8421c7097'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Unnamed constraints are not reflected when SQLite copies the table in batch mode
+TASKS_TABLE_ARGS = (sa.CheckConstraint('coalesce(project_id , parent_task_id) is not null'),)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        'tasks',
+        sa.Column(
+            'position',
+            sa.String().with_variant(sa.String(collation='C'), 'postgresql'),
+            nullable=True,
+        ),
+    )
+
+    # Give existing tasks positions in creation order within each sibling list
+    connection = op.get_bind()
+    rows = connection.execute(
+        sa.text(
+            "SELECT id, project_id, parent_task_id FROM tasks "
+            "ORDER BY project_id, parent_task_id, created_at, id"
+        )
+    ).all()
+    positions = []
+    for _, siblings in groupby(rows, key=lambda row: (row.project_id, row.parent_task_id)):
+        sibling_ids = [row.id for row in siblings]
+        positions.extend(
+            {"task_id": task_id, "position": position}
+            for task_id, position in zip(sibling_ids, keys_between(None, None, len(sibling_ids)))
+        )
+    if positions:
+        connection.execute(
+            sa.text("UPDATE tasks SET position = :position WHERE id = :task_id"), positions
+        )
+
+    with op.batch_alter_table('tasks', table_args=TASKS_TABLE_ARGS) as batch_op:
+        batch_op.alter_column('position', existing_type=sa.String(), nullable=False)
+    # SQLite can not defer unique constraints, see Tasks.__table_args__
+    if connection.dialect.name == 'postgresql':
+        op.create_unique_constraint(
+            'uq_tasks_sibling_position',
+            'tasks',
+            ['project_id', 'parent_task_id', 'position'],
+            postgresql_nulls_not_distinct=True,
+            deferrable=True,
+            initially='DEFERRED',
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_constraint('uq_tasks_sibling_position', 'tasks', type_='unique')
+    with op.batch_alter_table('tasks', table_args=TASKS_TABLE_ARGS) as batch_op:
+        batch_op.drop_column('position')
@@ -0,0 +1,41 @@
+"""Add version columns
+
+Revision ID: 7e2f5b1c9a83
+Revises: d41a7c9e2b60
+Create Date: 2026-10-19 14:21:09.537816
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7e2f5b1c9a83'
+down_revision: Union[str, Sequence[str], None] = 'd41a7c9e2b60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+VERSIONED_TABLES = ('projects', 'tasks', 'taskfilters')
+# Unnamed constraints are not reflected when SQLite copies a table in batch mode
+TABLE_ARGS = {
+    'tasks': (sa.CheckConstraint('coalesce(project_id , parent_task_id) is not null'),),
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in VERSIONED_TABLES:
+        # Server default fills the existing rows without rewriting them
+        op.add_column(
+            table,
+            sa.Column('version', sa.Integer(), server_default='1', nullable=False),
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in VERSIONED_TABLES:
+        with op.batch_alter_table(table, table_args=TABLE_ARGS.get(table, ())) as batch_op:
+            batch_op.drop_column('version')
@@ -0,0 +1,49 @@
+"""Add full text search vectors
+
+Revision ID: 9c4d2a7e81f3
+Revises: 5b0e6f3c21a4
+Create Date: 2026-10-19 11:02:17.402113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.repository_layer.models.models import SEARCH_VECTOR_EXPRESSION
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c4d2a7e81f3'
+down_revision: Union[str, Sequence[str], None] = '5b0e6f3c21a4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Full text search is only supported on Postgres
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table in ('projects', 'tasks'):
+        # Stored generated column is filled for existing rows by the ALTER
+        op.execute(
+            f"ALTER TABLE {table} ADD COLUMN search_vector tsvector "
+            f"GENERATED ALWAYS AS ({SEARCH_VECTOR_EXPRESSION}) STORED"
+        )
+        op.create_index(
+            f'ix_{table}_search_vector',
+            table,
+            ['search_vector'],
+            unique=False,
+            postgresql_using='gin',
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table in ('projects', 'tasks'):
+        op.drop_index(f'ix_{table}_search_vector', table_name=table)
+        op.drop_column(table, 'search_vector')
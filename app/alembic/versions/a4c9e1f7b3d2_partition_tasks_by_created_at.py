@@ -0,0 +1,106 @@
+"""Partition tasks by created_at
+
+Only runs on Postgres with TASK_PARTITIONING set, see task_partitions.py. The
+tasks are copied into the partitioned table so run it in a maintenance window.
+
+Revision ID: a4c9e1f7b3d2
+Revises: f8b3d5a1e6c9
+Create Date: 2026-10-19 22:14:51.280734
+
+"""
+from datetime import datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.core_layer.config import settings
+from app.repository_layer.task_partitions import (
+    DEFAULT_PARTITION,
+    add_months,
+    create_partitions,
+    is_partitioned,
+)
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4c9e1f7b3d2'
+down_revision: Union[str, Sequence[str], None] = 'f8b3d5a1e6c9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Columns copied between the tables. The generated search_vector is recalculated
+TASK_COLUMNS = ', '.join((
+    'project_id', 'parent_task_id', 'position', 'deleted_at', 'name', 'id',
+    'created_at', 'updated_at', 'description', 'status', 'deadline_date',
+    'start_date', 'repeat_interval_type', 'repeat_interval', 'repeat_start',
+    'repeat_end', 'version',
+))
+
+
+def _copy_tasks_to(table: str, partition_by: str = '') -> None:
+    """Replaces tasks with a copy named `table` with the same columns, defaults and
+    check constraint but no keys or indexes"""
+    op.execute(
+        f"CREATE TABLE {table} (LIKE tasks INCLUDING DEFAULTS INCLUDING CONSTRAINTS "
+        f"INCLUDING GENERATED) {partition_by}"
+    )
+    if partition_by:
+        now = datetime.now(tz=timezone.utc)
+        create_partitions(
+            op.get_bind(),
+            start=op.get_bind().scalar(sa.text("SELECT min(created_at) FROM tasks")) or now,
+            end=add_months(now, settings.TASK_PARTITION_MONTHS * settings.TASK_PARTITIONS_AHEAD),
+            months=settings.TASK_PARTITION_MONTHS,
+            parent=table,
+        )
+        op.execute(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {table} DEFAULT")
+    op.execute(f"INSERT INTO {table} ({TASK_COLUMNS}) SELECT {TASK_COLUMNS} FROM tasks")
+    op.drop_table('tasks')
+    op.execute(f"ALTER TABLE {table} RENAME TO tasks")
+
+
+def _create_indexes() -> None:
+    op.create_foreign_key('tasks_project_id_fkey', 'tasks', 'projects', ['project_id'], ['id'])
+    op.create_index('ix_tasks_project_id_deadline_date', 'tasks', ['project_id', 'deadline_date'])
+    op.create_index('ix_tasks_deleted_at', 'tasks', ['deleted_at'])
+    op.create_index('ix_tasks_search_vector', 'tasks', ['search_vector'], postgresql_using='gin')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql' or not settings.TASK_PARTITIONING:
+        return
+    # Foreign keys can not reference a partitioned table without the partition key
+    op.drop_constraint('taskfilter_members_task_id_fkey', 'taskfilter_members', type_='foreignkey')
+    _copy_tasks_to('tasks_partitioned', partition_by='PARTITION BY RANGE (created_at)')
+    op.create_primary_key('tasks_pkey', 'tasks', ['id', 'created_at'])
+    _create_indexes()
+    # Unique constraints must include created_at so sibling positions are only indexed
+    op.create_index('ix_tasks_sibling_position', 'tasks', ['project_id', 'parent_task_id', 'position'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql' or not is_partitioned(op.get_bind()):
+        return
+    _copy_tasks_to('tasks_unpartitioned')
+    op.create_primary_key('tasks_pkey', 'tasks', ['id'])
+    _create_indexes()
+    op.create_foreign_key('tasks_parent_task_id_fkey', 'tasks', 'tasks', ['parent_task_id'], ['id'])
+    op.create_unique_constraint(
+        'uq_tasks_sibling_position',
+        'tasks',
+        ['project_id', 'parent_task_id', 'position'],
+        postgresql_nulls_not_distinct=True,
+        deferrable=True,
+        initially='DEFERRED',
+    )
+    op.create_foreign_key(
+        'taskfilter_members_task_id_fkey',
+        'taskfilter_members',
+        'tasks',
+        ['task_id'],
+        ['id'],
+        ondelete='CASCADE',
+    )
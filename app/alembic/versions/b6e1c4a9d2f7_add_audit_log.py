@@ -0,0 +1,49 @@
+"""Add audit log
+
+Revision ID: b6e1c4a9d2f7
+Revises: 3a8d6e0f4c17
+Create Date: 2026-10-19 18:21:05.417392
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6e1c4a9d2f7'
+down_revision: Union[str, Sequence[str], None] = '3a8d6e0f4c17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'audit_log',
+        sa.Column('id', sa.Uuid(), nullable=False),
+        sa.Column('entity_type', sa.String(length=50), nullable=False),
+        sa.Column('entity_id', sa.Uuid(), nullable=False),
+        sa.Column('action', sa.String(length=10), nullable=False),
+        sa.Column(
+            'changes',
+            sa.JSON().with_variant(postgresql.JSONB(), 'postgresql'),
+            nullable=False,
+        ),
+        sa.Column('changed_at', sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(
+        'ix_audit_log_entity_id_changed_at',
+        'audit_log',
+        ['entity_id', 'changed_at'],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_audit_log_entity_id_changed_at', table_name='audit_log')
+    op.drop_table('audit_log')
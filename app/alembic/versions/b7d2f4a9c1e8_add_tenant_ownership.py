@@ -0,0 +1,96 @@
+"""Add tenant ownership and row level security
+
+Existing rows are given DEFAULT_TENANT_ID. On Postgres row level security limits
+every transaction that set app.tenant_id to the rows of that tenant, see
+tenancy.py.
+
+Revision ID: b7d2f4a9c1e8
+Revises: a4c9e1f7b3d2
+Create Date: 2026-10-19 23:02:17.448120
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.core_layer.config import settings
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d2f4a9c1e8'
+down_revision: Union[str, Sequence[str], None] = 'a4c9e1f7b3d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TENANT_TABLES = ('projects', 'tasks', 'taskfilters', 'archived_tasks', 'audit_log')
+
+# Unnamed constraints are not reflected when SQLite copies the table in batch mode
+TABLE_ARGS = {'tasks': (sa.CheckConstraint('coalesce(project_id , parent_task_id) is not null'),)}
+
+# Requests set app.tenant_id in every transaction. Transactions setting neither it
+# nor app.all_tenants, which the maintenance commands and the audit writer set,
+# see and write no rows so a tenant that was not set fails closed. The policy can
+# not be used for index lookups so queries also compare tenant_id themselves
+TENANT_POLICY = (
+    "tenant_id = nullif(current_setting('app.tenant_id', true), '')::uuid "
+    "OR current_setting('app.all_tenants', true) = 'on'"
+)
+
+TENANT_INDEXES = (
+    ('ix_projects_tenant_id_parent_project_id', 'projects', ['tenant_id', 'parent_project_id']),
+    ('ix_projects_tenant_id_status', 'projects', ['tenant_id', 'status']),
+    ('ix_tasks_tenant_id_project_id_deadline_date', 'tasks', ['tenant_id', 'project_id', 'deadline_date']),
+    ('ix_tasks_tenant_id_parent_task_id_position', 'tasks', ['tenant_id', 'parent_task_id', 'position']),
+    ('ix_tasks_tenant_id_status_deadline_date', 'tasks', ['tenant_id', 'status', 'deadline_date']),
+    ('ix_taskfilters_tenant_id_name', 'taskfilters', ['tenant_id', 'name']),
+    ('ix_archived_tasks_tenant_id_project_id', 'archived_tasks', ['tenant_id', 'project_id']),
+)
+
+
+def _default_tenant() -> str:
+    """DEFAULT_TENANT_ID as stored by the Uuid type, which SQLite stores as hex"""
+    if op.get_bind().dialect.name == 'postgresql':
+        return str(settings.DEFAULT_TENANT_ID)
+    return settings.DEFAULT_TENANT_ID.hex
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in TENANT_TABLES:
+        op.add_column(
+            table,
+            sa.Column('tenant_id', sa.Uuid(), nullable=False, server_default=_default_tenant()),
+        )
+        # New rows get the tenant of the request from the application
+        with op.batch_alter_table(table, table_args=TABLE_ARGS.get(table, ())) as batch_op:
+            batch_op.alter_column('tenant_id', server_default=None)
+    op.drop_index('ix_tasks_project_id_deadline_date', table_name='tasks')
+    for name, table, columns in TENANT_INDEXES:
+        op.create_index(name, table, columns, unique=False)
+
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table in TENANT_TABLES:
+        op.execute(f"ALTER TABLE {table} ENABLE ROW LEVEL SECURITY")
+        # Also applies to the table owner, which the application usually connects as
+        op.execute(f"ALTER TABLE {table} FORCE ROW LEVEL SECURITY")
+        op.execute(
+            f"CREATE POLICY tenant_isolation ON {table} "
+            f"USING ({TENANT_POLICY}) WITH CHECK ({TENANT_POLICY})"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == 'postgresql':
+        for table in TENANT_TABLES:
+            op.execute(f"DROP POLICY tenant_isolation ON {table}")
+            op.execute(f"ALTER TABLE {table} NO FORCE ROW LEVEL SECURITY")
+            op.execute(f"ALTER TABLE {table} DISABLE ROW LEVEL SECURITY")
+    for name, table, columns in TENANT_INDEXES:
+        op.drop_index(name, table_name=table)
+    op.create_index('ix_tasks_project_id_deadline_date', 'tasks', ['project_id', 'deadline_date'], unique=False)
+    for table in TENANT_TABLES:
+        with op.batch_alter_table(table, table_args=TABLE_ARGS.get(table, ())) as batch_op:
+            batch_op.drop_column('tenant_id')
@@ -0,0 +1,55 @@
+"""Use the portable column types of the models on SQLite
+
+The first revision created projects.parent_project_id and tasks.project_id as
+UUID and taskfilters.rules as JSONB. SQLite gives those declared types numeric
+affinity, unlike the CHAR(32) and JSON columns of the Uuid and JSON types the models
+use. Postgres already has the same types either way so only SQLite is changed.
+
+Revision ID: c2e9f4b7a1d5
+Revises: b7d2f4a9c1e8
+Create Date: 2026-10-19 23:41:05.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c2e9f4b7a1d5'
+down_revision: Union[str, Sequence[str], None] = 'b7d2f4a9c1e8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Unnamed constraints are not reflected when SQLite copies the table in batch mode
+TABLE_ARGS = {'tasks': (sa.CheckConstraint('coalesce(project_id , parent_task_id) is not null'),)}
+
+# Table, column, type of the first revision and type of the models
+COLUMNS = (
+    ('projects', 'parent_project_id', sa.UUID(), sa.Uuid()),
+    ('tasks', 'project_id', sa.UUID(), sa.Uuid()),
+    ('taskfilters', 'rules', postgresql.JSONB(astext_type=sa.Text()), sa.JSON()),
+)
+
+
+def _alter_types(to_model_types: bool) -> None:
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for table, column, first_type, model_type in COLUMNS:
+        with op.batch_alter_table(table, table_args=TABLE_ARGS.get(table, ())) as batch_op:
+            if to_model_types:
+                batch_op.alter_column(column, existing_type=first_type, type_=model_type)
+            else:
+                batch_op.alter_column(column, existing_type=model_type, type_=first_type)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _alter_types(to_model_types=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _alter_types(to_model_types=False)
@@ -0,0 +1,49 @@
+"""Add idempotency keys
+
+Revision ID: d41a7c9e2b60
+Revises: 9c4d2a7e81f3
+Create Date: 2026-10-19 13:40:52.118304
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd41a7c9e2b60'
+down_revision: Union[str, Sequence[str], None] = '9c4d2a7e81f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'idempotency_keys',
+        sa.Column('key', sa.String(length=255), nullable=False),
+        sa.Column('request_hash', sa.String(length=64), nullable=False),
+        sa.Column('status_code', sa.Integer(), nullable=True),
+        sa.Column(
+            'response_headers',
+            sa.JSON().with_variant(postgresql.JSONB(), 'postgresql'),
+            nullable=True,
+        ),
+        sa.Column('response_body', sa.LargeBinary(), nullable=True),
+        sa.Column('expires_at', sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('key'),
+    )
+    op.create_index(
+        op.f('ix_idempotency_keys_expires_at'),
+        'idempotency_keys',
+        ['expires_at'],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_idempotency_keys_expires_at'), table_name='idempotency_keys')
+    op.drop_table('idempotency_keys')
@@ -0,0 +1,46 @@
+"""Add outbox events
+
+Revision ID: e3f7a2c8b5d1
+Revises: b6e1c4a9d2f7
+Create Date: 2026-10-19 19:47:12.093518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3f7a2c8b5d1'
+down_revision: Union[str, Sequence[str], None] = 'b6e1c4a9d2f7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'outbox_events',
+        sa.Column(
+            'id',
+            sa.BigInteger().with_variant(sa.Integer(), 'sqlite'),
+            autoincrement=True,
+            nullable=False,
+        ),
+        sa.Column('event_type', sa.String(length=50), nullable=False),
+        sa.Column('entity_id', sa.Uuid(), nullable=False),
+        sa.Column(
+            'payload',
+            sa.JSON().with_variant(postgresql.JSONB(), 'postgresql'),
+            nullable=False,
+        ),
+        sa.Column('created_at', sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('outbox_events')
@@ -0,0 +1,80 @@
+"""Add task soft delete and archive
+
+Revision ID: f8b3d5a1e6c9
+Revises: e3f7a2c8b5d1
+Create Date: 2026-10-19 21:05:38.614207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f8b3d5a1e6c9'
+down_revision: Union[str, Sequence[str], None] = 'e3f7a2c8b5d1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Unnamed constraints are not reflected when SQLite copies the table in batch mode
+TASKS_TABLE_ARGS = (sa.CheckConstraint('coalesce(project_id , parent_task_id) is not null'),)
+
+STATUSES = ('not_started', 'in_progress', 'completed')
+REPEAT_INTERVAL_TYPES = ('intervalFromLastCompletedDate', 'intervalFromRepeatStartdate')
+
+
+def _existing_enum(*values: str, name: str) -> sa.Enum:
+    """Enum type already created on Postgres by the tasks table"""
+    return sa.Enum(*values, name=name).with_variant(
+        postgresql.ENUM(*values, name=name, create_type=False), 'postgresql'
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('tasks', sa.Column('deleted_at', sa.TIMESTAMP(timezone=True), nullable=True))
+    op.create_index('ix_tasks_deleted_at', 'tasks', ['deleted_at'], unique=False)
+    op.create_table(
+        'archived_tasks',
+        sa.Column('project_id', sa.Uuid(), nullable=True),
+        sa.Column('parent_task_id', sa.Uuid(), nullable=True),
+        sa.Column(
+            'position',
+            sa.String().with_variant(sa.String(collation='C'), 'postgresql'),
+            nullable=False,
+        ),
+        sa.Column('deleted_at', sa.TIMESTAMP(timezone=True), nullable=True),
+        sa.Column('archived_at', sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('id', sa.Uuid(), nullable=False),
+        sa.Column('created_at', sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.Column('updated_at', sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.Column('description', sa.String(), nullable=False),
+        sa.Column('status', _existing_enum(*STATUSES, name='taskandprojectstatuses'), nullable=False),
+        sa.Column('deadline_date', sa.TIMESTAMP(timezone=True), nullable=True),
+        sa.Column('start_date', sa.TIMESTAMP(timezone=True), nullable=True),
+        sa.Column(
+            'repeat_interval_type',
+            _existing_enum(*REPEAT_INTERVAL_TYPES, name='repeatintervaltype'),
+            nullable=True,
+        ),
+        sa.Column('repeat_interval', sa.Interval(), nullable=True),
+        sa.Column('repeat_start', sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.Column('repeat_end', sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.Column('version', sa.Integer(), server_default='1', nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_archived_tasks_project_id', 'archived_tasks', ['project_id'], unique=False)
+    op.create_index('ix_archived_tasks_parent_task_id', 'archived_tasks', ['parent_task_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_archived_tasks_parent_task_id', table_name='archived_tasks')
+    op.drop_index('ix_archived_tasks_project_id', table_name='archived_tasks')
+    op.drop_table('archived_tasks')
+    op.drop_index('ix_tasks_deleted_at', table_name='tasks')
+    with op.batch_alter_table('tasks', table_args=TASKS_TABLE_ARGS) as batch_op:
+        batch_op.drop_column('deleted_at')
@@ -2,28 +2,34 @@ from typing import Annotated
 from uuid import UUID
 
 from dependency_injector.wiring import Provide
-from fastapi import APIRouter, status, Query
+from fastapi import APIRouter, status, Query, Header, Response
 
 from app.core_layer.dependency_injector import TasklyDependencyContainer
 from app.service_layer.taskfilter_service import FilterService
+from app.service_layer.task_service import TaskService
+from app.service_layer.schemas.task_schemas import TaskResponse
 from app.service_layer.schemas.taskfilter_schemas import (
     TaskFilterResponse,
     TaskFilterUpdate,
     TaskFilterCreate,
+    TaskFilterTasksParams,
 )
-from .utils import generate_multi_get_description
+from .utils import etag, generate_multi_get_description, parse_if_match
 from ...service_layer.schemas.common_field_search_schema import CommonSearchFieldsSchema
 
 filter_router = APIRouter(prefix="/filters", tags=["Taskfilters"])
 # noinspection DuplicatedCode
 filter_service: FilterService = Provide[TasklyDependencyContainer.filter_service]
+task_service: TaskService = Provide[TasklyDependencyContainer.task_service]
 
 
 @filter_router.get(
     path="/{id}", status_code=status.HTTP_200_OK, response_model=TaskFilterResponse
 )
-async def get(id: UUID):
-    return await filter_service.get(id=id)
+async def get(id: UUID, response: Response):
+    resource = await filter_service.get(id=id)
+    response.headers["ETag"] = etag(resource.version)
+    return resource
 
 
 @filter_router.get(
@@ -41,17 +47,44 @@ async def get_multi(
 @filter_router.post(
     path="/", status_code=status.HTTP_201_CREATED, response_model=TaskFilterResponse
 )
-async def create(create_schema: TaskFilterCreate):
-    return await filter_service.create(create_schema=create_schema, commit=True)
+async def create(create_schema: TaskFilterCreate, response: Response):
+    resource = await filter_service.create(create_schema=create_schema, commit=True)
+    response.headers["ETag"] = etag(resource.version)
+    return resource
 
 
 @filter_router.patch(
     path="/{id}", status_code=status.HTTP_200_OK, response_model=TaskFilterResponse
 )
-async def update(update_schema: TaskFilterUpdate, id: UUID):
-    return await filter_service.update(update_schema=update_schema, commit=True, id=id)
+async def update(
+    update_schema: TaskFilterUpdate,
+    id: UUID,
+    response: Response,
+    if_match: Annotated[str | None, Header()] = None,
+):
+    resource = await filter_service.update(
+        update_schema=update_schema,
+        commit=True,
+        id=id,
+        expected_version=parse_if_match(if_match),
+    )
+    response.headers["ETag"] = etag(resource.version)
+    return resource
 
 
 @filter_router.delete(path="/{id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete(id: UUID):
     return await filter_service.delete(id=id, commit=True)
+
+
+@filter_router.get(
+    path="/{id}/tasks",
+    status_code=status.HTTP_200_OK,
+    response_model=list[TaskResponse],
+    description=(
+        "List the tasks matching a saved filter ordered by creation. Materialized "
+        "filters are served from their precomputed task membership."
+    ),
+)
+async def get_tasks(id: UUID, params: Annotated[TaskFilterTasksParams, Query()]):
+    return await task_service.get_filter_tasks(filter_id=id, params=params)
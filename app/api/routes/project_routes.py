@@ -2,17 +2,17 @@ from typing import Annotated
 from uuid import UUID
 
 from dependency_injector.wiring import Provide, inject
-from fastapi import APIRouter, status, Query, Depends
+from fastapi import APIRouter, status, Query, Depends, Header, Response
 
-from .utils import generate_multi_get_description
+from .utils import etag, generate_multi_get_description, parse_if_match
 from app.core_layer.dependency_injector import TasklyDependencyContainer
 from app.service_layer.schemas.project_schemas import (
     ProjectResponse,
     ProjectUpdate,
     ProjectCreate,
+    ProjectSearchFieldsSchema,
 )
 from app.service_layer.project_service import ProjectService
-from ...service_layer.schemas.common_field_search_schema import CommonSearchFieldsSchema
 
 project_router = APIRouter(prefix="/projects", tags=["Projects"])
 # noinspection DuplicatedCode
@@ -22,8 +22,10 @@ project_service = Provide[TasklyDependencyContainer.project_service]
 @project_router.get(
     path="/{id}", status_code=status.HTTP_200_OK, response_model=ProjectResponse
 )
-async def get(id: UUID):
-    return await project_service.get(id=id)
+async def get(id: UUID, response: Response):
+    resource = await project_service.get(id=id)
+    response.headers["ETag"] = etag(resource.version)
+    return resource
 
 
 @project_router.get(
@@ -33,7 +35,7 @@ async def get(id: UUID):
     description=(generate_multi_get_description(model_name="Projects")),
 )
 async def get_multi(
-    filter_params: Annotated[CommonSearchFieldsSchema, Query()],
+    filter_params: Annotated[ProjectSearchFieldsSchema, Query()],
 ):
     return await project_service.get_multi(filter_params=filter_params)
 
@@ -41,15 +43,29 @@ async def get_multi(
 @project_router.post(
     path="/", status_code=status.HTTP_201_CREATED, response_model=ProjectResponse
 )
-async def create(create_schema: ProjectCreate):
-    return await project_service.create(create_schema=create_schema, commit=True)
+async def create(create_schema: ProjectCreate, response: Response):
+    resource = await project_service.create(create_schema=create_schema, commit=True)
+    response.headers["ETag"] = etag(resource.version)
+    return resource
 
 
 @project_router.patch(
     path="/{id}", status_code=status.HTTP_200_OK, response_model=ProjectResponse
 )
-async def update(update_schema: ProjectUpdate, id: UUID):
-    return await project_service.update(update_schema=update_schema, commit=True, id=id)
+async def update(
+    update_schema: ProjectUpdate,
+    id: UUID,
+    response: Response,
+    if_match: Annotated[str | None, Header()] = None,
+):
+    resource = await project_service.update(
+        update_schema=update_schema,
+        commit=True,
+        id=id,
+        expected_version=parse_if_match(if_match),
+    )
+    response.headers["ETag"] = etag(resource.version)
+    return resource
 
 
 @project_router.delete(path="/{id}", status_code=status.HTTP_204_NO_CONTENT)
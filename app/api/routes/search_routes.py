@@ -0,0 +1,30 @@
+from typing import Annotated
+
+from dependency_injector.wiring import Provide
+from fastapi import APIRouter, status, Query
+
+from app.core_layer.database import statement_timeout
+from app.core_layer.dependency_injector import TasklyDependencyContainer
+from app.service_layer.schemas.search_schemas import SearchParams, SearchResponse
+from app.service_layer.search_service import SearchService
+
+search_router = APIRouter(prefix="/search", tags=["Search"])
+search_service: SearchService = Provide[TasklyDependencyContainer.search_service]
+
+
+@search_router.get(
+    path="/",
+    status_code=status.HTTP_200_OK,
+    response_model=SearchResponse,
+    description=(
+        "Full text search across the names and descriptions of projects and tasks. "
+        "Results are ranked with name matches weighted above description matches. "
+        "Answers 501 with the SQLite backend, which has no full text search."
+        "\n\n**Pagination Options:**\n"
+        "- Use `page` & `itemsPerPage` for paginated results\n"
+    ),
+    # Interactive so a slow search is stopped early
+    openapi_extra=statement_timeout(5_000),
+)
+async def search(search_params: Annotated[SearchParams, Query()]):
+    return await search_service.search(search_params=search_params)
@@ -2,15 +2,29 @@ from typing import Annotated
 from uuid import UUID
 
 from dependency_injector.wiring import Provide, inject
-from fastapi import APIRouter, status, Query, Depends
+from fastapi import APIRouter, status, Query, Depends, BackgroundTasks, Header, Response
+from fastapi.responses import StreamingResponse
 
-from .utils import generate_multi_get_description
-from ...service_layer.schemas.common_field_search_schema import CommonSearchFieldsSchema
+from .utils import etag, generate_multi_get_description, parse_if_match
+from app.core_layer.database import statement_timeout
 from app.core_layer.dependency_injector import TasklyDependencyContainer
+from app.core_layer.rate_limiting import route_cost
 from app.service_layer.schemas.task_schemas import (
     TaskResponse,
     TaskUpdate,
     TaskCreate,
+    TaskListSearchFieldsSchema,
+    TaskStatsResponse,
+    TaskStatsSearchFieldsSchema,
+    TaskMove,
+    TaskMoveSubtree,
+    TaskBulkSearchFieldsSchema,
+    TaskBulkUpdate,
+    TaskBulkResult,
+    TaskSubtreeParams,
+    TaskSubtreeResponse,
+    TaskHistoryParams,
+    TaskHistoryEntry,
 )
 from app.service_layer.task_service import TaskService
 
@@ -19,11 +33,69 @@ task_router = APIRouter(prefix="/tasks", tags=["Tasks"])
 task_service = Provide[TasklyDependencyContainer.task_service]
 
 
+# Registered before "/{id}" so "stats" is not parsed as a task id
+@task_router.get(
+    path="/stats",
+    status_code=status.HTTP_200_OK,
+    response_model=TaskStatsResponse,
+    description=(
+        "Count tasks per status, project and deadline bucket. Counts can be scoped "
+        "with the common search fields or a saved Taskfilters id. "
+        "Pagination options are ignored."
+    ),
+    openapi_extra=route_cost(5),
+)
+async def get_stats(
+    filter_params: Annotated[TaskStatsSearchFieldsSchema, Query()],
+):
+    return await task_service.get_stats(filter_params=filter_params)
+
+
 @task_router.get(
     path="/{id}", status_code=status.HTTP_200_OK, response_model=TaskResponse
 )
-async def get(id: UUID):
-    return await task_service.get(id=id)
+async def get(id: UUID, response: Response):
+    resource = await task_service.get(id=id)
+    response.headers["ETag"] = etag(resource.version)
+    return resource
+
+
+@task_router.get(
+    path="/{id}/subtree",
+    status_code=status.HTTP_200_OK,
+    response_model=TaskSubtreeResponse,
+    description=(
+        "Get a task with its subtasks nested below it down to the given depth. "
+        "Subtasks are sorted within each level and the direct subtasks of the task "
+        "are paginated. Set stream to receive newline delimited JSON instead, one "
+        "task per line starting with the task itself, for very large trees."
+    ),
+    openapi_extra={**route_cost(5), **statement_timeout(120_000)},
+)
+async def get_subtree(id: UUID, params: Annotated[TaskSubtreeParams, Query()]):
+    if not params.stream:
+        return await task_service.get_subtree(id=id, params=params)
+    items = await task_service.stream_subtree(id=id, params=params)
+
+    async def lines():
+        async for item in items:
+            yield item.model_dump_json() + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@task_router.get(
+    path="/{id}/history",
+    status_code=status.HTTP_200_OK,
+    response_model=list[TaskHistoryEntry],
+    description=(
+        "List the field level changes of a task, newest first. Deleted tasks keep "
+        "their history. Changes are written in batches so the latest change may "
+        "take a moment to appear."
+    ),
+)
+async def get_history(id: UUID, params: Annotated[TaskHistoryParams, Query()]):
+    return await task_service.get_history(id=id, params=params)
 
 
 @task_router.get(
@@ -33,7 +105,7 @@ async def get(id: UUID):
     description=(generate_multi_get_description(model_name="Tasks")),
 )
 async def get_multi(
-    filter_params: Annotated[CommonSearchFieldsSchema, Query()],
+    filter_params: Annotated[TaskListSearchFieldsSchema, Query()],
 ):
     return await task_service.get_multi(filter_params=filter_params)
 
@@ -41,17 +113,117 @@ async def get_multi(
 @task_router.post(
     path="/", status_code=status.HTTP_201_CREATED, response_model=TaskResponse
 )
-async def create(create_schema: TaskCreate):
-    return await task_service.create(create_schema=create_schema, commit=True)
+async def create(create_schema: TaskCreate, response: Response):
+    resource = await task_service.create(create_schema=create_schema, commit=True)
+    response.headers["ETag"] = etag(resource.version)
+    return resource
+
+
+@task_router.patch(
+    path="/",
+    status_code=status.HTTP_200_OK,
+    response_model=TaskBulkResult,
+    description=(
+        "Update every task matching the common search fields or a saved Taskfilters "
+        "id in a single statement. Pagination options are ignored. Use dry_run to "
+        "count the affected tasks first."
+    ),
+    openapi_extra={**route_cost(10), **statement_timeout(120_000)},
+)
+async def bulk_update(
+    filter_params: Annotated[TaskBulkSearchFieldsSchema, Query()],
+    update_schema: TaskBulkUpdate,
+):
+    return await task_service.bulk_update(
+        filter_params=filter_params, update_schema=update_schema
+    )
+
+
+@task_router.delete(
+    path="/",
+    status_code=status.HTTP_200_OK,
+    response_model=TaskBulkResult,
+    description=(
+        "Delete every task matching the common search fields or a saved Taskfilters "
+        "id along with their subtasks in a single statement. Pagination options are "
+        "ignored. Use dry_run to count the affected tasks first."
+    ),
+    openapi_extra={**route_cost(10), **statement_timeout(120_000)},
+)
+async def bulk_delete(
+    filter_params: Annotated[TaskBulkSearchFieldsSchema, Query()],
+):
+    return await task_service.bulk_delete(filter_params=filter_params)
 
 
 @task_router.patch(
     path="/{id}", status_code=status.HTTP_200_OK, response_model=TaskResponse
 )
-async def update(update_schema: TaskUpdate, id: UUID):
-    return await task_service.update(update_schema=update_schema, commit=True, id=id)
+async def update(
+    update_schema: TaskUpdate,
+    id: UUID,
+    response: Response,
+    if_match: Annotated[str | None, Header()] = None,
+):
+    resource = await task_service.update(
+        update_schema=update_schema,
+        commit=True,
+        id=id,
+        expected_version=parse_if_match(if_match),
+    )
+    response.headers["ETag"] = etag(resource.version)
+    return resource
 
 
-@task_router.delete(path="/{id}", status_code=status.HTTP_204_NO_CONTENT)
+@task_router.delete(
+    path="/{id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    description="Delete a task and all of its subtasks",
+)
 async def delete(id: UUID):
     return await task_service.delete(id=id, commit=True)
+
+
+@task_router.post(
+    path="/{id}/move",
+    status_code=status.HTTP_200_OK,
+    response_model=TaskResponse,
+    description=(
+        "Move a task before and/or after a sibling task. Siblings share the same "
+        "project and parent task. Only the moved task is written."
+    ),
+)
+async def move(id: UUID, move_schema: TaskMove, background_tasks: BackgroundTasks):
+    task = await task_service.move(id=id, move_schema=move_schema)
+    if task_service.position_needs_rebalance(task):
+        background_tasks.add_task(
+            task_service.rebalance_positions,
+            project_id=task.project_id,
+            parent_task_id=task.parent_task_id,
+        )
+    return task
+
+
+@task_router.post(
+    path="/{id}/move-subtree",
+    status_code=status.HTTP_200_OK,
+    response_model=TaskResponse,
+    description=(
+        "Move a task and all of its subtasks to another project and/or parent task "
+        "in a single transaction. The task is placed at the end of its new siblings."
+    ),
+    openapi_extra=route_cost(5),
+)
+async def move_subtree(id: UUID, move_schema: TaskMoveSubtree):
+    return await task_service.move_subtree(id=id, move_schema=move_schema)
+
+
+@task_router.post(
+    path="/{id}/complete-subtree",
+    status_code=status.HTTP_200_OK,
+    response_model=TaskResponse,
+    description="Mark a task and all of its subtasks as completed",
+    openapi_extra=route_cost(5),
+)
+async def complete_subtree(id: UUID):
+    return await task_service.complete_subtree(id=id)
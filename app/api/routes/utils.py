@@ -1,3 +1,6 @@
+from fastapi import HTTPException, status
+
+
 def generate_multi_get_description(model_name) -> str:
     description: str = (
         f"Read multiple {model_name} rows from the database.\n\n"
@@ -5,3 +8,25 @@ def generate_multi_get_description(model_name) -> str:
         f"- Use `page` & `itemsPerPage` for paginated results\n"
     )
     return description
+
+
+def etag(version: int) -> str:
+    """ETag header value of a resource version"""
+    return f'"{version}"'
+
+
+def parse_if_match(if_match: str | None) -> int | None:
+    """Returns the resource version required by an If-Match header or None if any
+    version is accepted. Raises a 412 HTTPException for ETags that are not versions
+    as they can never match"""
+    if if_match is None or if_match.strip() == "*":
+        return None
+    value = if_match.strip().removeprefix("W/")
+    if value.startswith('"') and value.endswith('"'):
+        value = value[1:-1]
+    if not value.isdigit():
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="If-Match must be the ETag of a single version of the resource",
+        )
+    return int(value)
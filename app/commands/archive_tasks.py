@@ -0,0 +1,39 @@
+"""Moves tasks completed or deleted more than TASK_ARCHIVE_AFTER_DAYS ago to the
+archived_tasks table, in transactions of TASK_ARCHIVE_BATCH_SIZE tasks.
+
+Usage:
+    python -m app.commands.archive_tasks [--days DAYS]
+
+Archived tasks are still listed by GET /tasks/?include_archived=true. Run it
+regularly e.g. nightly.
+"""
+
+import argparse
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from app.core_layer.config import settings
+from app.core_layer.database import dispose_engines, get_async_session_maker
+from app.core_layer.tenancy import all_tenants
+from app.repository_layer.task_archive import TaskArchiver
+
+
+async def archive_tasks(days: int) -> None:
+    archiver = TaskArchiver(
+        session_factory=get_async_session_maker(),
+        batch_size=settings.TASK_ARCHIVE_BATCH_SIZE,
+    )
+    cutoff = datetime.now(tz=timezone.utc) - timedelta(days=days)
+    try:
+        archived = await archiver.archive(cutoff=cutoff)
+    finally:
+        await dispose_engines()
+    print(f"Archived {archived} tasks completed or deleted before {cutoff:%Y-%m-%d}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, default=settings.TASK_ARCHIVE_AFTER_DAYS)
+    args = parser.parse_args()
+    with all_tenants():
+        asyncio.run(archive_tasks(days=args.days))
@@ -0,0 +1,23 @@
+"""Recalculates the task rollup columns of every project from the tasks table.
+
+Usage:
+    python -m app.commands.backfill_project_rollups
+"""
+
+import asyncio
+
+from app.core_layer.database import get_async_session_maker
+from app.core_layer.tenancy import all_tenants
+from app.repository_layer.project_rollups import refresh_project_rollups
+
+
+async def backfill_project_rollups() -> None:
+    session_factory = get_async_session_maker()
+    async with session_factory() as session:
+        await refresh_project_rollups(session=session)
+        await session.commit()
+
+
+if __name__ == "__main__":
+    with all_tenants():
+        asyncio.run(backfill_project_rollups())
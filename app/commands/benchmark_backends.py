@@ -0,0 +1,164 @@
+"""Measures the throughput of common repository operations on the configured database.
+
+Creates a project with --tasks tasks, then times reading, listing, updating,
+counting stats for and deleting them. Prints operations per second for each step
+so the Postgres and SQLite backends can be compared on the same machine. The
+database must already be migrated and the project is removed afterwards.
+
+Usage:
+    python -m app.commands.benchmark_backends [--tasks 500] [--page-size 50]
+
+Set DATABASE_BACKEND=sqlite (and SQLITE_PATH) to benchmark the SQLite backend.
+"""
+
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core_layer.config import settings
+from app.core_layer.database import (
+    dispose_engines,
+    get_async_session_maker,
+    get_engine,
+)
+from app.core_layer.tenancy import all_tenants
+from app.repository_layer.models.enumerations import (
+    ProjectTypes,
+    TaskAndProjectStatuses,
+)
+from app.repository_layer.project_database_repository import (
+    ProjectDatabaseRepository,
+)
+from app.repository_layer.task_database_repository import TaskDatabaseRepository
+from app.service_layer.schemas.project_schemas import ProjectCreate
+from app.service_layer.schemas.task_schemas import (
+    TaskCreate,
+    TaskSearchFieldsSchema,
+    TaskStatsSearchFieldsSchema,
+    TaskUpdate,
+)
+
+
+class _ClosingSessionFactory:
+    """Session factory whose sessions can be closed after each operation so the
+    benchmark does not wait on the garbage collector to return connections"""
+
+    def __init__(self):
+        self._session_maker = get_async_session_maker()
+        self._sessions: list[AsyncSession] = []
+
+    def __call__(self, **kwargs) -> AsyncSession:
+        session = self._session_maker(**kwargs)
+        self._sessions.append(session)
+        return session
+
+    async def close_all(self) -> None:
+        while self._sessions:
+            await self._sessions.pop().close()
+
+
+async def _timed(
+    label: str,
+    operations: int,
+    run: Callable[[int], Awaitable],
+    session_factory: _ClosingSessionFactory,
+) -> None:
+    start = time.perf_counter()
+    for index in range(operations):
+        await run(index)
+        await session_factory.close_all()
+    seconds = time.perf_counter() - start
+    print(f"{label:<8} {operations:>6} ops {operations / seconds:>10.1f} ops/s")
+
+
+async def benchmark_backends(tasks: int, page_size: int) -> None:
+    # Statement logging would dominate the timings
+    get_engine().echo = False
+    session_factory = _ClosingSessionFactory()
+    project_repository = ProjectDatabaseRepository(session_factory=session_factory)
+    task_repository = TaskDatabaseRepository(session_factory=session_factory)
+    now = datetime.now(tz=timezone.utc)
+    # Repeat dates are required by the tables so every row sets them
+    repeat_dates = {"repeat_start": now, "repeat_end": now}
+
+    project = await project_repository.create(
+        ProjectCreate.model_construct(
+            name="Benchmark",
+            description="Benchmark project",
+            type=ProjectTypes.project,
+            **repeat_dates,
+        )
+    )
+    task_ids = []
+
+    async def create(index: int) -> None:
+        # Built without validation as the schema does not accept top level
+        # project tasks yet
+        task = await task_repository.create(
+            TaskCreate.model_construct(
+                name=f"Task {index}",
+                description="Benchmark task",
+                project_id=project["id"],
+                deadline_date=now + timedelta(days=index % 14 - 7),
+                status=TaskAndProjectStatuses.not_started,
+                **repeat_dates,
+            )
+        )
+        task_ids.append(task["id"])
+
+    async def get(index: int) -> None:
+        await task_repository.get(task_ids[index])
+
+    async def list_page(index: int) -> None:
+        await task_repository.get_multi(
+            TaskSearchFieldsSchema(
+                project_id=project["id"],
+                page=index % max(tasks // page_size, 1) + 1,
+                itemsPerPage=page_size,
+            )
+        )
+
+    async def update(index: int) -> None:
+        await task_repository.update(
+            task_ids[index],
+            TaskUpdate.model_construct(
+                name=f"Task {index} updated",
+                description="Benchmark task",
+                project_id=project["id"],
+                status=TaskAndProjectStatuses.in_progress,
+                **repeat_dates,
+            ),
+        )
+
+    async def stats(index: int) -> None:
+        await task_repository.get_stats(
+            TaskStatsSearchFieldsSchema(project_id=project["id"])
+        )
+
+    async def delete(index: int) -> None:
+        await task_repository.delete(task_ids[index])
+
+    print(f"Backend {settings.DATABASE_BACKEND}, {tasks} tasks")
+    await session_factory.close_all()
+    await _timed("create", tasks, create, session_factory)
+    await _timed("get", tasks, get, session_factory)
+    await _timed("list", tasks, list_page, session_factory)
+    await _timed("update", tasks, update, session_factory)
+    await _timed("stats", max(tasks // 10, 1), stats, session_factory)
+    await _timed("delete", tasks, delete, session_factory)
+    await project_repository.delete(project["id"])
+    await session_factory.close_all()
+    await dispose_engines()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=500)
+    parser.add_argument("--page-size", type=int, default=50)
+    args = parser.parse_args()
+    with all_tenants():
+        asyncio.run(benchmark_backends(tasks=args.tasks, page_size=args.page_size))
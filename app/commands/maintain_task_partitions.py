@@ -0,0 +1,47 @@
+"""Creates the partitions of the tasks table for the next TASK_PARTITIONS_AHEAD
+periods of TASK_PARTITION_MONTHS months.
+
+Usage:
+    python -m app.commands.maintain_task_partitions
+
+Only does something when tasks was partitioned by the migrations with
+TASK_PARTITIONING set. Schedule it e.g. daily so partitions always exist before
+tasks are created in their range. See task_partitions.py.
+"""
+
+import asyncio
+from datetime import datetime, timezone
+
+from app.core_layer.config import settings
+from app.core_layer.database import dispose_engines, get_engine
+from app.core_layer.tenancy import all_tenants
+from app.repository_layer.task_partitions import (
+    add_months,
+    create_partitions,
+    is_partitioned,
+)
+
+
+async def maintain_task_partitions() -> None:
+    now = datetime.now(tz=timezone.utc)
+    try:
+        async with get_engine().begin() as connection:
+            if not await connection.run_sync(is_partitioned):
+                print("The tasks table is not partitioned")
+                return
+            created = await connection.run_sync(
+                create_partitions,
+                start=now,
+                end=add_months(
+                    now, settings.TASK_PARTITION_MONTHS * settings.TASK_PARTITIONS_AHEAD
+                ),
+                months=settings.TASK_PARTITION_MONTHS,
+            )
+    finally:
+        await dispose_engines()
+    print(f"Created {len(created)} task partitions {', '.join(created)}")
+
+
+if __name__ == "__main__":
+    with all_tenants():
+        asyncio.run(maintain_task_partitions())
@@ -0,0 +1,171 @@
+"""Reports where the startup time of the app goes.
+
+Starts a fresh interpreter with -X importtime, imports app.main, runs the app
+lifespan startup and sends the first request in process. Prints the slowest
+imports by cumulative time and the time to first request, and exits with status
+1 if that is above the target so it can be used as a CI check.
+
+Usage:
+    python -m app.commands.profile_startup [--top 25] [--path /docs] [--target-ms 1500]
+
+Set LAZY_STARTUP=true to profile the lazy startup mode. Without it the lifespan
+connects to the database.
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import subprocess
+import sys
+import time
+from typing import NamedTuple
+
+from app.core_layer.config import settings
+
+_MEASURE_FLAG = "--measure"
+
+
+class ImportTime(NamedTuple):
+    module: str
+    self_us: int
+    cumulative_us: int
+
+
+def parse_import_times(stderr: str) -> list[ImportTime]:
+    """Parses the "import time: self [us] | cumulative | imported package" lines"""
+    import_times = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, module = line[len("import time:") :].split("|")
+        if not self_us.strip().isdigit():
+            # Header line
+            continue
+        import_times.append(
+            ImportTime(module.strip(), int(self_us), int(cumulative_us))
+        )
+    return import_times
+
+
+async def _run_first_request(app, path: str) -> tuple[float, int]:
+    """Runs the lifespan startup then a GET request against the ASGI app.
+    Returns the seconds taken by the startup and the response status"""
+    lifespan_messages: asyncio.Queue = asyncio.Queue()
+    started = asyncio.Event()
+
+    async def lifespan_send(message):
+        if message["type"].startswith("lifespan.startup"):
+            if message["type"] == "lifespan.startup.failed":
+                raise RuntimeError(message.get("message", "Lifespan startup failed"))
+            started.set()
+
+    start = time.perf_counter()
+    await lifespan_messages.put({"type": "lifespan.startup"})
+    lifespan = asyncio.create_task(
+        app(
+            {"type": "lifespan", "asgi": {"version": "3.0"}},
+            lifespan_messages.get,
+            lifespan_send,
+        )
+    )
+    await started.wait()
+    startup_seconds = time.perf_counter() - start
+
+    status = None
+
+    async def http_receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def http_send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(
+        {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "root_path": "",
+            "query_string": b"",
+            "headers": [(b"host", b"localhost")],
+            "client": ("127.0.0.1", 0),
+            "server": ("localhost", 80),
+        },
+        http_receive,
+        http_send,
+    )
+    await lifespan_messages.put({"type": "lifespan.shutdown"})
+    await lifespan
+    return startup_seconds, status
+
+
+def _measure(path: str) -> None:
+    """Runs in the profiled interpreter. Prints the timings as JSON on stdout"""
+    start = time.perf_counter()
+    app = importlib.import_module("app.main").app
+    import_seconds = time.perf_counter() - start
+    startup_seconds, status = asyncio.run(_run_first_request(app, path))
+    first_request_seconds = time.perf_counter() - start
+    print(
+        json.dumps(
+            {
+                "import_ms": import_seconds * 1000,
+                "lifespan_startup_ms": startup_seconds * 1000,
+                "first_request_ms": first_request_seconds * 1000,
+                "status": status,
+            }
+        )
+    )
+
+
+def profile_startup(top: int, path: str, target_ms: float) -> bool:
+    """Prints the startup report. Returns True if the target was met"""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", __spec__.name, _MEASURE_FLAG, path],
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode != 0:
+        print(completed.stderr, file=sys.stderr)
+        raise SystemExit(completed.returncode)
+    timings = json.loads(completed.stdout.strip().splitlines()[-1])
+    import_times = parse_import_times(completed.stderr)
+
+    print(f"Slowest {top} imports by cumulative time")
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for import_time in sorted(
+        import_times, key=lambda i: i.cumulative_us, reverse=True
+    )[:top]:
+        print(
+            f"{import_time.cumulative_us / 1000:>14.1f} "
+            f"{import_time.self_us / 1000:>9.1f}  {import_time.module}"
+        )
+    print()
+    print(f"Lazy startup:             {settings.LAZY_STARTUP}")
+    print(f"Import app.main:          {timings['import_ms']:.0f} ms")
+    print(f"Lifespan startup:         {timings['lifespan_startup_ms']:.0f} ms")
+    print(
+        f"Time to first request:    {timings['first_request_ms']:.0f} ms "
+        f"(GET {path} returned {timings['status']}, target {target_ms:.0f} ms)"
+    )
+    return timings["first_request_ms"] <= target_ms
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == _MEASURE_FLAG:
+        _measure(path=sys.argv[2])
+        raise SystemExit(0)
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--path", default="/docs")
+    parser.add_argument("--target-ms", type=float, default=settings.STARTUP_TARGET_MS)
+    args = parser.parse_args()
+    met = profile_startup(top=args.top, path=args.path, target_ms=args.target_ms)
+    raise SystemExit(0 if met else 1)
@@ -0,0 +1,22 @@
+"""Deletes the idempotency keys whose responses are no longer replayed.
+
+Usage:
+    python -m app.commands.purge_idempotency_keys
+"""
+
+import asyncio
+
+from app.core_layer.database import get_async_session_maker
+from app.repository_layer.idempotency_database_repository import (
+    IdempotencyKeyRepository,
+)
+
+
+async def purge_idempotency_keys() -> None:
+    repository = IdempotencyKeyRepository(session_factory=get_async_session_maker())
+    deleted = await repository.purge_expired()
+    print(f"Deleted {deleted} expired idempotency keys")
+
+
+if __name__ == "__main__":
+    asyncio.run(purge_idempotency_keys())
@@ -0,0 +1,96 @@
+"""Delivers the events of the transactional outbox to the configured sink.
+
+Runs until interrupted, logging the delivered events, throughput and lag every
+OUTBOX_RELAY_METRICS_INTERVAL_SECONDS. Start several relays against Postgres to
+share the work. With --once the events written so far are delivered and the
+command exits, e.g. to drain the outbox in tests.
+
+Usage:
+    python -m app.commands.relay_outbox [--once]
+
+The sink is chosen with OUTBOX_SINK: file appends to OUTBOX_FILE_PATH and webhook
+POSTs each batch to OUTBOX_WEBHOOK_URL.
+"""
+
+import argparse
+import asyncio
+import logging
+import signal
+
+from app.core_layer.config import settings
+from app.core_layer.database import dispose_engines, get_async_session_maker
+from app.repository_layer.outbox import OutboxRelay
+from app.repository_layer.outbox_sinks import FileSink, OutboxSink, WebhookSink
+
+logger = logging.getLogger(__name__)
+
+
+def _create_sink() -> OutboxSink:
+    if settings.OUTBOX_SINK == "webhook":
+        return WebhookSink(
+            url=settings.OUTBOX_WEBHOOK_URL,
+            timeout_seconds=settings.OUTBOX_WEBHOOK_TIMEOUT_SECONDS,
+        )
+    return FileSink(path=settings.OUTBOX_FILE_PATH)
+
+
+async def _log_metrics(relay: OutboxRelay, stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(
+                stop.wait(), settings.OUTBOX_RELAY_METRICS_INTERVAL_SECONDS
+            )
+        except TimeoutError:
+            pass
+        pending, oldest_seconds = await relay.pending()
+        metrics = relay.metrics
+        logger.info(
+            "Outbox relay delivered=%s batches=%s failed_batches=%s "
+            "events_per_second=%.1f lag_seconds=%.3f pending=%s "
+            "oldest_pending_seconds=%.3f",
+            metrics.delivered,
+            metrics.batches,
+            metrics.failed_batches,
+            metrics.events_per_second,
+            metrics.lag_seconds,
+            pending,
+            oldest_seconds,
+        )
+
+
+async def relay_outbox(once: bool) -> None:
+    sink = _create_sink()
+    relay = OutboxRelay(
+        session_factory=get_async_session_maker(),
+        sink=sink,
+        batch_size=settings.OUTBOX_RELAY_BATCH_SIZE,
+    )
+    try:
+        if once:
+            while await relay.relay_batch() == relay.batch_size:
+                pass
+            print(f"Delivered {relay.metrics.delivered} outbox events")
+            return
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signal_number, stop.set)
+        await asyncio.gather(
+            relay.run(
+                poll_interval_seconds=settings.OUTBOX_RELAY_POLL_INTERVAL_MS / 1000,
+                stop=stop,
+            ),
+            _log_metrics(relay, stop=stop),
+        )
+    finally:
+        if isinstance(sink, WebhookSink):
+            await sink.close()
+        await dispose_engines()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--once", action="store_true")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(relay_outbox(once=args.once))
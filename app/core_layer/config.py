@@ -1,6 +1,7 @@
 import os
 import secrets
-from typing import Annotated, Any, Literal
+from typing import Annotated, Any, Literal, Self
+from uuid import UUID
 
 from pydantic import (
     AnyUrl,
@@ -9,6 +10,7 @@ from pydantic import (
     HttpUrl,
     PostgresDsn,
     computed_field,
+    model_validator,
 )
 from pydantic_core import MultiHostUrl
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -52,22 +54,179 @@ class Settings(BaseSettings):
 
     PROJECT_NAME: str
     SENTRY_DSN: HttpUrl | None = None
-    POSTGRES_SERVER: str
+
+    # Postgres for shared deployments or a SQLite file for single node and edge
+    # deployments. Read replicas need Postgres and GET /search/ answers 501 on
+    # SQLite as it has no full text search
+    DATABASE_BACKEND: Literal["postgresql", "sqlite"] = "postgresql"
+    POSTGRES_SERVER: str = ""
     POSTGRES_PORT: int = 5432
-    POSTGRES_USER: str
+    POSTGRES_USER: str = ""
     POSTGRES_PASSWORD: str = ""
     POSTGRES_DB: str = ""
 
+    # SQLite database file and the pragmas set on every connection. WAL lets reads
+    # run while a write is in progress and with synchronous NORMAL a commit only
+    # syncs the log at checkpoints. Reads are served from the memory mapped file
+    SQLITE_PATH: str = "taskly.db"
+    SQLITE_MMAP_SIZE_BYTES: int = 256 * 1024 * 1024
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+
+    @model_validator(mode="after")
+    def check_database_backend(self) -> Self:
+        if self.DATABASE_BACKEND == "postgresql" and not (
+            self.POSTGRES_SERVER and self.POSTGRES_USER
+        ):
+            raise ValueError(
+                "POSTGRES_SERVER and POSTGRES_USER are required for the postgresql backend"
+            )
+        if self.DATABASE_BACKEND == "sqlite" and self.POSTGRES_REPLICA_DSNS:
+            raise ValueError("Read replicas require the postgresql backend")
+        if self.DATABASE_BACKEND == "sqlite" and self.TASK_PARTITIONING:
+            raise ValueError("Task partitioning requires the postgresql backend")
+        if self.RATE_LIMIT_ENABLED and (
+            self.RATE_LIMIT_PER_SECOND <= 0 or self.RATE_LIMIT_BURST < 1
+        ):
+            raise ValueError("Rate limits need a positive rate and burst")
+        return self
+
+    # Server settings used by python -m app.serve. Workers default to the CPU count
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    SERVER_WORKERS: int | None = None
+    SERVER_GRACEFUL_SHUTDOWN_SECONDS: int = 30
+
+    # With lazy startup the workers accept requests as soon as they are imported and
+    # database connections, dependencies and filtersets are created on first use.
+    # Used for autoscaled and serverless deployments. Check the time to first
+    # request against STARTUP_TARGET_MS with python -m app.commands.profile_startup
+    LAZY_STARTUP: bool = False
+    STARTUP_TARGET_MS: int = 1500
+
+    # Database connections shared by all workers. Each worker gets an equal share
+    # of the budget as its pool, per database server
+    DATABASE_CONNECTION_BUDGET: int = 20
+    DATABASE_POOL_TIMEOUT_SECONDS: int = 30
+
+    @computed_field  # type: ignore[prop-decorator]
+    @property
+    def server_workers(self) -> int:
+        return self.SERVER_WORKERS or os.cpu_count() or 1
+
+    @computed_field  # type: ignore[prop-decorator]
+    @property
+    def database_pool_size(self) -> int:
+        return max(1, self.DATABASE_CONNECTION_BUDGET // self.server_workers)
+
+    # Read replicas. Comma separated Postgres DSNs of the replicas. Reads go to
+    # the primary for READ_YOUR_WRITES_SECONDS after a client changed data and a
+    # failing replica is skipped for REPLICA_RETRY_SECONDS
+    POSTGRES_REPLICA_DSNS: Annotated[list[str] | str, BeforeValidator(parse_cors)] = []
+    READ_YOUR_WRITES_SECONDS: int = 5
+    REPLICA_RETRY_SECONDS: int = 30
+
+    # Responses of requests sent with an Idempotency-Key header are replayed to
+    # retries with the same key for this long. Expired keys are deleted with
+    # python -m app.commands.purge_idempotency_keys
+    IDEMPOTENCY_KEY_TTL_SECONDS: int = 60 * 60 * 24
+
+    # Tenants sharing the database, see tenancy.py. Requests act for the tenant
+    # id in the TENANT_HEADER header, which must be set by a trusted gateway, or
+    # DEFAULT_TENANT_ID without it unless TENANT_REQUIRED is set
+    TENANT_HEADER: str = "X-Tenant-Id"
+    TENANT_REQUIRED: bool = False
+    DEFAULT_TENANT_ID: UUID = UUID(int=0)
+
+    # Token bucket rate limit per tenant, see rate_limiting.py. A tenant can send
+    # RATE_LIMIT_BURST requests at once and RATE_LIMIT_PER_SECOND per second after
+    # that, routes with a cost take more tokens. Buckets are kept per worker
+    # unless RATE_LIMIT_BACKEND is redis, which shares them at RATE_LIMIT_REDIS_URL
+    RATE_LIMIT_ENABLED: bool = False
+    RATE_LIMIT_PER_SECOND: float = 20
+    RATE_LIMIT_BURST: int = 100
+    RATE_LIMIT_BACKEND: Literal["memory", "redis"] = "memory"
+    RATE_LIMIT_REDIS_URL: str = "redis://localhost:6379/0"
+
+    # Load shedding. Each worker answers 503 with a Retry-After of
+    # LOAD_SHED_RETRY_AFTER_SECONDS while it has LOAD_SHED_MAX_IN_FLIGHT requests
+    # in progress or requests recently waited more than LOAD_SHED_POOL_WAIT_MS on
+    # average for a pooled database connection. 0 turns a threshold off
+    LOAD_SHED_MAX_IN_FLIGHT: int = 256
+    LOAD_SHED_POOL_WAIT_MS: int = 500
+    LOAD_SHED_RETRY_AFTER_SECONDS: int = 1
+
+    # Most milliseconds a statement of a request may run on Postgres before it is
+    # stopped and the request answered with 503. Routes can declare their own
+    # timeout, see StatementTimeoutMiddleware. SQLite statements are not limited
+    STATEMENT_TIMEOUT_MS: int = 30_000
+
+    # Sibling task positions longer than this trigger a background rebalance
+    TASK_POSITION_REBALANCE_LENGTH: int = 12
+
+    # Most subtasks returned by GET /tasks/{id}/subtree. Streamed subtrees are
+    # written out as they are read so they can be larger
+    TASK_SUBTREE_MAX_NODES: int = 1000
+    TASK_SUBTREE_STREAM_MAX_NODES: int = 100_000
+
+    # Native range partitioning of tasks on created_at. Set before running the
+    # migrations, see task_partitions.py. Each partition covers
+    # TASK_PARTITION_MONTHS months and python -m app.commands.maintain_task_partitions
+    # keeps TASK_PARTITIONS_AHEAD future partitions
+    TASK_PARTITIONING: bool = False
+    TASK_PARTITION_MONTHS: int = 1
+    TASK_PARTITIONS_AHEAD: int = 3
+
+    # Tasks completed or deleted more than TASK_ARCHIVE_AFTER_DAYS ago are moved to
+    # the archived_tasks table by python -m app.commands.archive_tasks, in
+    # transactions of TASK_ARCHIVE_BATCH_SIZE tasks
+    TASK_ARCHIVE_AFTER_DAYS: int = 90
+    TASK_ARCHIVE_BATCH_SIZE: int = 500
+
+    # Task history is queued in process and written in batches of up to
+    # AUDIT_BATCH_SIZE events at most AUDIT_FLUSH_INTERVAL_MS after the first
+    # queued event. Requests wait when AUDIT_QUEUE_SIZE events are waiting. On
+    # shutdown the writer gets AUDIT_STOP_TIMEOUT_MS to catch up before the rest is
+    # written by the shutdown itself
+    AUDIT_QUEUE_SIZE: int = 10_000
+    AUDIT_BATCH_SIZE: int = 500
+    AUDIT_FLUSH_INTERVAL_MS: int = 200
+    AUDIT_STOP_TIMEOUT_MS: int = 10_000
+
+    # Transactional outbox, see outbox.py. Events are delivered by
+    # python -m app.commands.relay_outbox to a newline delimited JSON file or a
+    # webhook, in batches of OUTBOX_RELAY_BATCH_SIZE
+    OUTBOX_ENABLED: bool = False
+    OUTBOX_SINK: Literal["file", "webhook"] = "file"
+    OUTBOX_FILE_PATH: str = "outbox_events.jsonl"
+    OUTBOX_WEBHOOK_URL: str = ""
+    OUTBOX_WEBHOOK_TIMEOUT_SECONDS: float = 10
+    OUTBOX_RELAY_BATCH_SIZE: int = 100
+    OUTBOX_RELAY_POLL_INTERVAL_MS: int = 500
+    OUTBOX_RELAY_METRICS_INTERVAL_SECONDS: int = 60
+
+    # Statement caches. Filter templates are built once per combination of filter
+    # fields, SQL Alchemy caches their compiled SQL and asyncpg caches the prepared
+    # statements per connection so Postgres does not plan them again
+    FILTER_STATEMENT_CACHE_SIZE: int = 256
+    # Compiled rules of saved Taskfilters, see util_compiled_filter_rules.py
+    FILTER_RULES_CACHE_SIZE: int = 512
+    SQLALCHEMY_QUERY_CACHE_SIZE: int = 1000
+    ASYNCPG_PREPARED_STATEMENT_CACHE_SIZE: int = 500
+
     @computed_field  # type: ignore[prop-decorator]
     @property
-    def SQLALCHEMY_DATABASE_URI(self) -> MultiHostUrl:
-        return MultiHostUrl.build(
-            scheme="postgresql+asyncpg",
-            username=self.POSTGRES_USER,
-            password=self.POSTGRES_PASSWORD,
-            host=self.POSTGRES_SERVER,
-            port=self.POSTGRES_PORT,
-            path=self.POSTGRES_DB,
+    def SQLALCHEMY_DATABASE_URI(self) -> str:
+        if self.DATABASE_BACKEND == "sqlite":
+            return f"sqlite+aiosqlite:///{self.SQLITE_PATH}"
+        return str(
+            MultiHostUrl.build(
+                scheme="postgresql+asyncpg",
+                username=self.POSTGRES_USER,
+                password=self.POSTGRES_PASSWORD,
+                host=self.POSTGRES_SERVER,
+                port=self.POSTGRES_PORT,
+                path=self.POSTGRES_DB,
+            )
         )
 
 
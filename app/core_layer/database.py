@@ -1,23 +1,361 @@
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+import asyncio
+import itertools
+import logging
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from sqlalchemy import Engine, ExceptionContext, Select, event, func, make_url, select, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    create_async_engine,
+    async_sessionmaker,
+)
+from sqlalchemy.orm import ORMExecuteState, Session, with_loader_criteria
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.sql.dml import UpdateBase
+
 from app.core_layer.config import settings
+from app.core_layer.tenancy import acting_for_all_tenants, current_tenant_id
+from app.repository_layer.abstract_database_repository import READ_ONLY_SESSION_KEY
+from app.repository_layer.exceptions_repository import TasklyRepositoryException
+from app.repository_layer.models.model_mixins import HasTenant
 from app.repository_layer.models.models import (
     Projects,
     Tasks,
     DatabaseBaseModel,
 )  # noqa
 
-engine = create_async_engine(
-    str(settings.SQLALCHEMY_DATABASE_URI), future=True, echo=True
+logger = logging.getLogger(__name__)
+
+
+class DecayingAverage:
+    """Exponentially weighted average of recent observations. Halves every
+    half_life_seconds nothing is observed so it returns to 0 once the
+    observations stop"""
+
+    def __init__(self, half_life_seconds: float, weight: float = 0.2):
+        self.half_life_seconds = half_life_seconds
+        self.weight = weight
+        self._value = 0.0
+        self._observed_at = time.monotonic()
+
+    def value(self) -> float:
+        elapsed = time.monotonic() - self._observed_at
+        return self._value * 0.5 ** (elapsed / self.half_life_seconds)
+
+    def observe(self, value: float) -> None:
+        self._value = self.value() * (1 - self.weight) + value * self.weight
+        self._observed_at = time.monotonic()
+
+
+# Seconds recently spent waiting for a pooled connection. Requests are shed while
+# it is high, see LoadSheddingMiddleware
+pool_wait_seconds = DecayingAverage(half_life_seconds=2)
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool recording how long each checkout waited for a connection"""
+
+    def _do_get(self):
+        started = time.monotonic()
+        try:
+            return super()._do_get()
+        finally:
+            pool_wait_seconds.observe(time.monotonic() - started)
+
+
+def _create_engine(url) -> AsyncEngine:
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite":
+        connect_args = {}
+    else:
+        connect_args = {
+            "prepared_statement_cache_size": settings.ASYNCPG_PREPARED_STATEMENT_CACHE_SIZE
+        }
+    # Fixed size pool so all workers together stay within the connection budget
+    engine = create_async_engine(
+        url,
+        future=True,
+        poolclass=TimedQueuePool,
+        pool_size=settings.database_pool_size,
+        max_overflow=0,
+        pool_timeout=settings.DATABASE_POOL_TIMEOUT_SECONDS,
+        query_cache_size=settings.SQLALCHEMY_QUERY_CACHE_SIZE,
+        connect_args=connect_args,
+    )
+    if url.get_backend_name() == "sqlite":
+        event.listen(engine.sync_engine, "connect", _set_sqlite_pragmas)
+    event.listen(engine.sync_engine, "handle_error", _raise_statement_timeout)
+    return engine
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """Tunes every new SQLite connection. See the SQLITE_ settings"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE_BYTES)}")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+    # Foreign keys, including the cascades, are off unless enabled per connection
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+# Engines are created on first use so importing the app does not load the driver
+_engine: AsyncEngine | None = None
+_replica_set: "ReplicaSet | None" = None
+
+
+def get_engine() -> AsyncEngine:
+    """Engine of the primary database"""
+    global _engine
+    if _engine is None:
+        _engine = _create_engine(str(settings.SQLALCHEMY_DATABASE_URI))
+    return _engine
+
+
+def get_replica_set() -> "ReplicaSet":
+    """Engines of the read replicas. Empty if no replicas are configured"""
+    global _replica_set
+    if _replica_set is None:
+        _replica_set = ReplicaSet(
+            [
+                _create_engine(make_url(dsn).set(drivername="postgresql+asyncpg"))
+                for dsn in settings.POSTGRES_REPLICA_DSNS
+            ],
+            retry_seconds=settings.REPLICA_RETRY_SECONDS,
+        )
+    return _replica_set
+
+
+# Set per request so a client reads its own writes. See ReadYourWritesMiddleware
+read_from_primary: ContextVar[bool] = ContextVar("read_from_primary", default=False)
+
+# Most milliseconds a statement of the request may run on Postgres. Set per request
+# from STATEMENT_TIMEOUT_MS or the timeout of the route, see StatementTimeoutMiddleware
+statement_timeout_ms: ContextVar[int | None] = ContextVar(
+    "statement_timeout_ms", default=None
 )
 
+# OpenAPI extension holding the statement timeout of a route
+STATEMENT_TIMEOUT_KEY = "x-statement-timeout-ms"
+
+
+def statement_timeout(milliseconds: int) -> dict:
+    """openapi_extra of a route whose statements may run for `milliseconds`
+    instead of STATEMENT_TIMEOUT_MS"""
+    return {STATEMENT_TIMEOUT_KEY: milliseconds}
+
+
+@dataclass
+class QueryMetrics:
+    """Counters of the worker since it started"""
+
+    # Statements stopped by Postgres after running longer than the timeout
+    timed_out: int = 0
+    # Requests cancelled with their running statement as the client went away
+    cancelled_on_disconnect: int = 0
+
+
+query_metrics = QueryMetrics()
+
+
+def _raise_statement_timeout(context: ExceptionContext) -> None:
+    """Counts statements stopped by statement_timeout and answers them with 503
+    rather than as an unexpected error"""
+    error = context.original_exception
+    if getattr(error, "sqlstate", None) != "57014" or "statement timeout" not in str(
+        error
+    ):
+        return
+    query_metrics.timed_out += 1
+    logger.warning(
+        "Statement timed out, timed_out=%s: %s",
+        query_metrics.timed_out,
+        context.statement,
+    )
+    raise TasklyRepositoryException(
+        error_message="The request took too long and was stopped", status_code=503
+    ) from context.sqlalchemy_exception
+
+
+class ReplicaSet:
+    """Round robin over the replicas that have not failed recently"""
+
+    def __init__(self, engines: list[AsyncEngine], retry_seconds: float):
+        self.async_engines = engines
+        self.engines = [e.sync_engine for e in engines]
+        self.retry_seconds = retry_seconds
+        self._unhealthy_until: dict[Engine, float] = {}
+        self._next = itertools.cycle(self.engines)
+
+    def choose(self) -> Engine | None:
+        """Returns the next healthy replica or None if there are none"""
+        now = time.monotonic()
+        for _ in range(len(self.engines)):
+            replica = next(self._next)
+            if self._unhealthy_until.get(replica, 0) <= now:
+                return replica
+        return None
+
+    def mark_unhealthy(self, replica: Engine) -> None:
+        self._unhealthy_until[replica] = time.monotonic() + self.retry_seconds
+
+
+class RoutingSession(Session):
+    """Sends the selects of read only sessions to a replica and everything else to
+    the primary. Repositories mark sessions used only for reads with
+    READ_ONLY_SESSION_KEY in the session info. If a replica can not be reached the
+    statement is retried on the primary and the replica is skipped for a while."""
+
+    _replica: Engine | None = None
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self._replica is not None:
+            return self._replica
+        if (
+            self.info.get(READ_ONLY_SESSION_KEY)
+            and not self._flushing
+            and not read_from_primary.get()
+            and _is_plain_read(clause)
+        ):
+            self._replica = get_replica_set().choose()
+            if self._replica is not None:
+                return self._replica
+        return get_engine().sync_engine
+
+    def execute(self, *args, **kwargs):
+        try:
+            return super().execute(*args, **kwargs)
+        except (DBAPIError, OSError) as e:
+            if self._replica is None or not _is_connection_error(e):
+                raise
+            get_replica_set().mark_unhealthy(self._replica)
+            self._replica = None
+            # Read only sessions have nothing to lose by starting over on the primary
+            self.rollback()
+            self.info[READ_ONLY_SESSION_KEY] = False
+            return super().execute(*args, **kwargs)
+
+    def close(self) -> None:
+        super().close()
+        self._replica = None
+
+
+def _is_plain_read(clause) -> bool:
+    """Statements that neither write nor lock rows"""
+    if isinstance(clause, UpdateBase):
+        return False
+    return not isinstance(clause, Select) or clause._for_update_arg is None
+
+
+def _is_connection_error(error: Exception) -> bool:
+    if isinstance(error, DBAPIError):
+        return error.connection_invalidated
+    return True
+
+
+def _scope_to_tenant(execute_state: ORMExecuteState) -> None:
+    """Limits the ORM selects, updates and deletes of a request to the rows of its
+    tenant. The criteria is added wherever a tenant owned model appears in the
+    statement, including aliases, subqueries and CTEs, so the queries use the
+    tenant leading indexes. Statements on tables rather than models and
+    INSERT ... SELECT are not scoped and must be limited to ids selected through
+    the models or compare tenant_id themselves"""
+    tenant_id = current_tenant_id.get()
+    if (
+        tenant_id is None
+        or not (
+            execute_state.is_select
+            or execute_state.is_update
+            or execute_state.is_delete
+        )
+        or execute_state.is_column_load
+        or execute_state.is_relationship_load
+    ):
+        return
+    execute_state.statement = execute_state.statement.options(
+        with_loader_criteria(
+            HasTenant, lambda cls: cls.tenant_id == tenant_id, include_aliases=True
+        )
+    )
+
+
+def _set_transaction_settings(session: Session, transaction, connection) -> None:
+    """Sets the tenant of the request, or app.all_tenants for code acting for
+    every tenant, for the row level security policies of Postgres and the
+    statement timeout of the request, in one round trip. Local to the transaction
+    so the pooled connections are shared by all tenants and are never left with
+    the settings of an earlier request. SQLite has neither"""
+    if connection.dialect.name != "postgresql":
+        return
+    values = {}
+    tenant_id = current_tenant_id.get()
+    if tenant_id is not None:
+        values["app.tenant_id"] = str(tenant_id)
+    elif acting_for_all_tenants.get():
+        values["app.all_tenants"] = "on"
+    timeout = statement_timeout_ms.get()
+    if timeout is not None:
+        values["statement_timeout"] = str(timeout)
+    if values:
+        connection.execute(
+            select(*(func.set_config(name, value, True) for name, value in values.items()))
+        )
+
+
+event.listen(Session, "do_orm_execute", _scope_to_tenant)
+event.listen(Session, "after_begin", _set_transaction_settings)
+
 
 def get_async_session_maker():
     async_session_factory = async_sessionmaker(
-        engine, expire_on_commit=False, class_=AsyncSession
+        get_engine(),
+        expire_on_commit=False,
+        class_=AsyncSession,
+        sync_session_class=RoutingSession if settings.POSTGRES_REPLICA_DSNS else Session,
     )
     return async_session_factory
 
 
+async def warm_up_connections() -> None:
+    """Opens the connection pool of every engine so the first requests do not pay
+    for connecting. Replicas that can not be reached are skipped for a while"""
+
+    async def open_connection(async_engine: AsyncEngine) -> None:
+        async with async_engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+
+    async def open_pool(async_engine: AsyncEngine) -> None:
+        await asyncio.gather(
+            *[
+                open_connection(async_engine)
+                for _ in range(settings.database_pool_size)
+            ]
+        )
+
+    await open_pool(get_engine())
+    replica_set = get_replica_set()
+    for replica in replica_set.async_engines:
+        try:
+            await open_pool(replica)
+        except (DBAPIError, OSError):
+            logger.warning("Read replica %s is not reachable", replica.url)
+            replica_set.mark_unhealthy(replica.sync_engine)
+
+
+async def dispose_engines() -> None:
+    """Closes all pooled connections of the engines created so far"""
+    if _engine is not None:
+        await _engine.dispose()
+    if _replica_set is not None:
+        for replica in _replica_set.async_engines:
+            await replica.dispose()
+
+
 async def create_tables_and_indexes(engine):
     # Tables can be created by using alembic or calling this function
     async with engine.begin() as conn:
@@ -9,8 +9,25 @@ from ..repository_layer.taskfilters_database_repository import (
 )
 from ..repository_layer.project_database_repository import ProjectDatabaseRepository
 from ..repository_layer.task_database_repository import TaskDatabaseRepository
+from ..repository_layer.search_database_repository import SearchDatabaseRepository
+from ..repository_layer.audit_database_repository import (
+    AuditLogRepository,
+    AuditWriter,
+)
+from ..repository_layer.idempotency_database_repository import (
+    IdempotencyKeyRepository,
+)
+from ..repository_layer.memory_repository import (
+    IdempotencyKeyMemoryRepository,
+    InMemoryStore,
+    ProjectMemoryRepository,
+    TaskfiltersMemoryRepository,
+    TaskMemoryRepository,
+)
 from ..service_layer.taskfilter_service import FilterService
 from ..service_layer.project_service import ProjectService
+from ..service_layer.task_service import TaskService
+from ..service_layer.search_service import SearchService
 
 
 class TasklyDependencyContainer(containers.DeclarativeContainer):
@@ -19,8 +36,11 @@ class TasklyDependencyContainer(containers.DeclarativeContainer):
             "app.api.routes.project_routes",
             "app.api.routes.task_routes",
             "app.api.routes.filter_routes",
+            "app.api.routes.search_routes",
             "app.main",
         ],
+        # Wired in the app lifespan rather than when the container is created
+        auto_wire=False,
     )
 
     config = providers.Configuration(strict=True, pydantic_settings=[settings])
@@ -32,17 +52,59 @@ class TasklyDependencyContainer(containers.DeclarativeContainer):
     )
     project_service = providers.Factory(ProjectService, repository=project_repo)
 
-    task_repo = providers.Factory(
-        TaskDatabaseRepository, session_factory=session_factory
-    )
-    task_service = providers.Factory(ProjectService, repository=task_repo)
-
     filter_repo = providers.Factory(
         TaskfiltersDatabaseRepository, session_factory=session_factory
     )
     filter_service = providers.Factory(FilterService, repository=filter_repo)
+
+    # One writer per worker so its queue batches the history of all requests
+    audit_writer = providers.Singleton(
+        AuditWriter,
+        session_factory=session_factory,
+        max_queue_size=settings.AUDIT_QUEUE_SIZE,
+        batch_size=settings.AUDIT_BATCH_SIZE,
+        flush_interval_seconds=settings.AUDIT_FLUSH_INTERVAL_MS / 1000,
+        stop_timeout_seconds=settings.AUDIT_STOP_TIMEOUT_MS / 1000,
+    )
+    audit_repo = providers.Factory(AuditLogRepository, session_factory=session_factory)
+
+    task_repo = providers.Factory(
+        TaskDatabaseRepository,
+        session_factory=session_factory,
+        audit_writer=audit_writer,
+    )
+    task_service = providers.Factory(
+        TaskService,
+        repository=task_repo,
+        filter_service=filter_service,
+        audit_repository=audit_repo,
+    )
+
+    search_repo = providers.Factory(
+        SearchDatabaseRepository, session_factory=session_factory
+    )
+    search_service = providers.Factory(SearchService, repository=search_repo)
+
+    idempotency_repo = providers.Factory(
+        IdempotencyKeyRepository, session_factory=session_factory
+    )
     # task_service = providers.Factory(
     #     TasklyTaskService,
     #     task_repository=task_repo,
     #     database_session_factory=async_session_factory
     # )
+
+
+class InMemoryRepositoriesContainer(containers.DeclarativeContainer):
+    """Repositories keeping data in memory for tests and service level benchmarks.
+    Overrides the repositories of TasklyDependencyContainer with the same name e.g.
+    app.container.override(InMemoryRepositoriesContainer()). Search and task
+    history still need the database. Set LAZY_STARTUP so startup does not connect
+    to the database"""
+
+    store = providers.Singleton(InMemoryStore)
+
+    project_repo = providers.Factory(ProjectMemoryRepository, store=store)
+    filter_repo = providers.Factory(TaskfiltersMemoryRepository, store=store)
+    task_repo = providers.Factory(TaskMemoryRepository, store=store)
+    idempotency_repo = providers.Factory(IdempotencyKeyMemoryRepository, store=store)
@@ -21,3 +21,11 @@ def app_specific_exception_handler(request: Request, exc: TasklyServiceValidatio
     raise HTTPException(
         status_code=status.HTTP_422_UNPROCESSABLE_CONTENT, detail=exc.message
     )
+
+
+def taskly_exception_handler(request: Request, exc: TasklyBaseException):
+    """Returns the status code and message carried by any Taskly exception"""
+    logger.warning("Taskly Error", exc_info=exc)
+    return JSONResponse(
+        status_code=exc.status_code, content={"detail": exc.error_message}
+    )
@@ -0,0 +1,428 @@
+import asyncio
+import hashlib
+import logging
+import math
+import time
+from typing import Callable
+from uuid import UUID
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import HTTPConnection
+from starlette.responses import JSONResponse, Response
+from starlette.routing import BaseRoute, Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core_layer.database import (
+    STATEMENT_TIMEOUT_KEY,
+    DecayingAverage,
+    query_metrics,
+    read_from_primary,
+    statement_timeout_ms,
+)
+from app.core_layer.rate_limiting import ROUTE_COST_KEY, TokenBuckets
+from app.core_layer.tenancy import current_tenant_id, tenant_for_insert
+from app.repository_layer.idempotency_database_repository import (
+    IdempotencyKeyRepository,
+    StoredResponse,
+)
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+def _route_extra(routes: list[BaseRoute], scope: Scope) -> dict:
+    """openapi_extra of the route handling the request, empty if it has none"""
+    for route in routes:
+        match, _ = route.matches(scope)
+        if match is not Match.FULL:
+            continue
+        # Routers included in the app match as a whole, their routes have the full
+        # path
+        included = getattr(route, "original_router", None)
+        if included is not None:
+            return _route_extra(included.routes, scope)
+        return getattr(route, "openapi_extra", None) or {}
+    return {}
+
+
+class TenantMiddleware:
+    """Sets the tenant of each request from the tenant header so the request only
+    sees and creates rows of that tenant, see tenancy.py. Requests without the
+    header act for the default tenant or are rejected with 400 if there is none"""
+
+    def __init__(self, app: ASGIApp, header_name: str, default_tenant_id: UUID | None):
+        self.app = app
+        self.header_name = header_name
+        self.default_tenant_id = default_tenant_id
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        header = Headers(scope=scope).get(self.header_name)
+        try:
+            tenant_id = self.default_tenant_id if header is None else UUID(header)
+        except ValueError:
+            tenant_id = None
+        if tenant_id is None:
+            await JSONResponse(
+                status_code=400,
+                content={"detail": f"{self.header_name} header must be a tenant id"},
+            )(scope, receive, send)
+            return
+
+        token = current_tenant_id.set(tenant_id)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_tenant_id.reset(token)
+
+
+class LoadSheddingMiddleware:
+    """Answers 503 with Retry-After instead of queueing more work while the worker
+    is overloaded: too many requests are in progress or requests recently waited
+    too long on average for a pooled database connection. Rejecting early keeps
+    the latency of the accepted requests low and lets load balancers and clients
+    back off. A threshold of 0 is not checked."""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        max_in_flight: int,
+        max_pool_wait_seconds: float,
+        retry_after_seconds: int,
+        pool_wait_seconds: DecayingAverage,
+    ):
+        self.app = app
+        self.max_in_flight = max_in_flight
+        self.max_pool_wait_seconds = max_pool_wait_seconds
+        self.retry_after_seconds = retry_after_seconds
+        self.pool_wait_seconds = pool_wait_seconds
+        self.in_flight = 0
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if self._overloaded():
+            await JSONResponse(
+                status_code=503,
+                content={"detail": "The server is overloaded, retry later"},
+                headers={"retry-after": str(self.retry_after_seconds)},
+            )(scope, receive, send)
+            return
+
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
+
+    def _overloaded(self) -> bool:
+        return (0 < self.max_in_flight <= self.in_flight) or (
+            0 < self.max_pool_wait_seconds < self.pool_wait_seconds.value()
+        )
+
+
+class RateLimitMiddleware:
+    """Limits the requests of each tenant with a token bucket, see
+    rate_limiting.py. Requests take the cost their route declares under
+    ROUTE_COST_KEY in openapi_extra, 1 otherwise. Requests over the limit get 429
+    with Retry-After in seconds."""
+
+    def __init__(self, app: ASGIApp, buckets: TokenBuckets, routes: list[BaseRoute]):
+        self.app = app
+        self.buckets = buckets
+        # The routes of the app, read on each request as they are added after the
+        # middleware
+        self.routes = routes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        cost = min(
+            _route_extra(self.routes, scope).get(ROUTE_COST_KEY, 1), self.buckets.burst
+        )
+        wait = await self.buckets.take(key=str(tenant_for_insert()), cost=cost)
+        if wait > 0:
+            await JSONResponse(
+                status_code=429,
+                content={"detail": "Rate limit exceeded, retry later"},
+                headers={"retry-after": str(math.ceil(wait))},
+            )(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+
+class StatementTimeoutMiddleware:
+    """Limits how long each database statement of a request may run on Postgres
+    so a pathological query can not hold a pooled connection for minutes. Routes
+    declare a longer or shorter timeout than the default under
+    STATEMENT_TIMEOUT_KEY in openapi_extra."""
+
+    def __init__(self, app: ASGIApp, routes: list[BaseRoute], default_ms: int):
+        self.app = app
+        # The routes of the app, read on each request as they are added after the
+        # middleware
+        self.routes = routes
+        self.default_ms = default_ms
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timeout = _route_extra(self.routes, scope).get(
+            STATEMENT_TIMEOUT_KEY, self.default_ms
+        )
+        token = statement_timeout_ms.set(timeout)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            statement_timeout_ms.reset(token)
+
+
+class CancelOnDisconnectMiddleware:
+    """Cancels a request when its client disconnects before the response was
+    sent. asyncpg cancels the statement the request was waiting for on the server
+    so it stops using the connection. Work after the response, e.g. background
+    tasks, is not cancelled. SQLite statements run to completion in their thread
+    but the request stops waiting for them."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        # Messages are read here and passed on to the app so a disconnect is seen
+        # while the app is busy
+        messages: asyncio.Queue[Message] = asyncio.Queue()
+        response_sent = False
+        cancelled = False
+
+        async def send_and_track(message: Message) -> None:
+            nonlocal response_sent
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get(
+                "more_body", False
+            ):
+                response_sent = True
+
+        request = asyncio.create_task(self.app(scope, messages.get, send_and_track))
+
+        async def watch_for_disconnect() -> None:
+            nonlocal cancelled
+            while True:
+                message = await receive()
+                await messages.put(message)
+                if message["type"] == "http.disconnect":
+                    if not response_sent and not request.done():
+                        cancelled = True
+                        request.cancel()
+                    return
+
+        watcher = asyncio.create_task(watch_for_disconnect())
+        try:
+            await request
+        except asyncio.CancelledError:
+            if not cancelled:
+                raise
+            query_metrics.cancelled_on_disconnect += 1
+            logger.info(
+                "Request %s %s cancelled as the client disconnected, "
+                "cancelled_on_disconnect=%s",
+                scope["method"],
+                scope["path"],
+                query_metrics.cancelled_on_disconnect,
+            )
+        finally:
+            watcher.cancel()
+
+
+class ReadYourWritesMiddleware:
+    """Routes the reads of a client to the primary database for a short time after
+    the client changed data so it never reads stale data from a lagging replica.
+
+    Successful mutations set a cookie and a response header with the time until
+    which reads stick to the primary. Browsers send the cookie back, other clients
+    can echo the header. Requests that change data always use the primary."""
+
+    COOKIE_NAME = "taskly_read_primary_until"
+    HEADER_NAME = "x-read-primary-until"
+
+    def __init__(self, app: ASGIApp, sticky_seconds: int):
+        self.app = app
+        self.sticky_seconds = sticky_seconds
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        mutating = scope["method"] not in SAFE_METHODS
+        token = read_from_primary.set(mutating or self._is_sticky(scope))
+
+        async def send_with_sticky_marker(message: Message) -> None:
+            if (
+                mutating
+                and message["type"] == "http.response.start"
+                and message["status"] < 400
+            ):
+                until = int(time.time()) + self.sticky_seconds
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "set-cookie",
+                    f"{self.COOKIE_NAME}={until}; Max-Age={self.sticky_seconds}; "
+                    "Path=/; HttpOnly; SameSite=Lax",
+                )
+                headers.append(self.HEADER_NAME, str(until))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_sticky_marker)
+        finally:
+            read_from_primary.reset(token)
+
+    def _is_sticky(self, scope: Scope) -> bool:
+        connection = HTTPConnection(scope)
+        until = connection.headers.get(self.HEADER_NAME) or connection.cookies.get(
+            self.COOKIE_NAME
+        )
+        try:
+            return until is not None and int(until) > time.time()
+        except ValueError:
+            return False
+
+
+class IdempotencyMiddleware:
+    """Makes requests that change data safe to retry. A request sent with an
+    Idempotency-Key header runs once, its response is stored and retries with the
+    same key get the stored response without running the request again.
+
+    Using a key for a different request is rejected with 422 and a retry that
+    arrives while the first request is still running gets 409. Server errors are
+    not stored so the request can be retried. Replayed responses have the status,
+    headers and body of the stored response. Keys are stored prefixed with the
+    tenant of the request so tenants can not replay each other's responses."""
+
+    HEADER_NAME = "idempotency-key"
+    REPLAYED_HEADER_NAME = "idempotent-replayed"
+    # Leaves room for the tenant id prefix in the 255 character key column
+    MAX_KEY_LENGTH = 218
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        repository_factory: Callable[[], IdempotencyKeyRepository],
+        ttl_seconds: int,
+    ):
+        self.app = app
+        self.repository_factory = repository_factory
+        self.ttl_seconds = ttl_seconds
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+        key = Headers(scope=scope).get(self.HEADER_NAME)
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+        if not key or len(key) > self.MAX_KEY_LENGTH:
+            await JSONResponse(
+                status_code=400,
+                content={
+                    "detail": f"Idempotency-Key must be 1 to {self.MAX_KEY_LENGTH} characters"
+                },
+            )(scope, receive, send)
+            return
+        key = f"{tenant_for_insert()}:{key}"
+
+        body = await self._read_body(receive)
+        request_hash = self._request_hash(scope, body)
+        repository = self.repository_factory()
+        stored = await repository.reserve(
+            key=key, request_hash=request_hash, ttl_seconds=self.ttl_seconds
+        )
+        if stored is not None:
+            await self._stored_response(stored, request_hash)(scope, receive, send)
+            return
+
+        response_start: Message | None = None
+        response_body = bytearray()
+
+        async def replay_body() -> Message:
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def send_and_capture(message: Message) -> None:
+            nonlocal response_start
+            if message["type"] == "http.response.start":
+                response_start = message
+            elif message["type"] == "http.response.body":
+                response_body.extend(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, replay_body, send_and_capture)
+        except BaseException:
+            await repository.release(key)
+            raise
+        if response_start is None or response_start["status"] >= 500:
+            await repository.release(key)
+            return
+        await repository.save_response(
+            key=key,
+            status_code=response_start["status"],
+            headers=[
+                (name.decode("latin-1"), value.decode("latin-1"))
+                for name, value in response_start.get("headers", [])
+            ],
+            body=bytes(response_body),
+        )
+
+    @staticmethod
+    async def _read_body(receive: Receive) -> bytes:
+        body = bytearray()
+        while True:
+            message = await receive()
+            body.extend(message.get("body", b""))
+            if not message.get("more_body", False):
+                return bytes(body)
+
+    @staticmethod
+    def _request_hash(scope: Scope, body: bytes) -> str:
+        request_hash = hashlib.sha256()
+        for part in (scope["method"], scope["path"], scope["query_string"]):
+            request_hash.update(part if isinstance(part, bytes) else part.encode())
+            request_hash.update(b"\0")
+        request_hash.update(body)
+        return request_hash.hexdigest()
+
+    def _stored_response(self, stored: StoredResponse, request_hash: str) -> Response:
+        if stored.request_hash != request_hash:
+            return JSONResponse(
+                status_code=422,
+                content={
+                    "detail": "Idempotency-Key was already used for a different request"
+                },
+            )
+        if stored.status_code is None:
+            return JSONResponse(
+                status_code=409,
+                content={
+                    "detail": "A request with this Idempotency-Key is still in progress"
+                },
+                headers={"retry-after": "1"},
+            )
+        response = Response(content=stored.body, status_code=stored.status_code)
+        # The stored headers replace those of Response, e.g. the ETag of the
+        # changed record is replayed along with its body
+        response.raw_headers = [
+            (name.encode("latin-1"), value.encode("latin-1"))
+            for name, value in stored.headers
+        ]
+        response.headers[self.REPLAYED_HEADER_NAME] = "true"
+        return response
@@ -0,0 +1,130 @@
+"""Token bucket rate limits per tenant, see RateLimitMiddleware.
+
+Each tenant has a bucket of RATE_LIMIT_BURST tokens refilled at
+RATE_LIMIT_PER_SECOND tokens per second. A request takes the cost of its route in
+tokens, 1 unless the route declares more with route_cost, and is rejected with
+429 while the bucket has too few tokens. Buckets are kept in the memory of each
+worker by default so the limit applies per worker. With RATE_LIMIT_BACKEND set to
+redis they are shared by all workers and servers."""
+
+import logging
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from app.core_layer.config import settings
+
+logger = logging.getLogger(__name__)
+
+# OpenAPI extension holding the cost of a route in tokens
+ROUTE_COST_KEY = "x-rate-limit-cost"
+
+
+def route_cost(cost: int) -> dict:
+    """openapi_extra of a route taking `cost` tokens per request, e.g. for bulk
+    changes and exports that do the work of many requests"""
+    return {ROUTE_COST_KEY: cost}
+
+
+class TokenBuckets(ABC):
+    def __init__(self, rate_per_second: float, burst: int):
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+
+    @abstractmethod
+    async def take(self, key: str, cost: int) -> float:
+        """Takes `cost` tokens from the bucket of `key` if it has enough.
+        Returns:
+            0 if the tokens were taken, otherwise the seconds until the bucket
+            has enough tokens
+        """
+        pass
+
+
+class InMemoryTokenBuckets(TokenBuckets):
+    """Buckets in the memory of the worker. Also a stand in for the shared buckets
+    in development and tests. The least recently used buckets beyond max_keys are
+    dropped, which only refills them early"""
+
+    def __init__(self, rate_per_second: float, burst: int, max_keys: int = 100_000):
+        super().__init__(rate_per_second=rate_per_second, burst=burst)
+        self.max_keys = max_keys
+        # Key to tokens left and the time they were counted
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    async def take(self, key: str, cost: int) -> float:
+        now = time.monotonic()
+        tokens, counted_at = self._buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - counted_at) * self.rate_per_second)
+        wait = 0.0
+        if tokens >= cost:
+            tokens -= cost
+        else:
+            wait = (cost - tokens) / self.rate_per_second
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+# Same algorithm as InMemoryTokenBuckets run atomically in Redis with its clock.
+# The wait is returned as a string as Redis truncates Lua numbers to integers
+_TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'counted_at')
+local tokens = tonumber(bucket[1]) or burst
+local counted_at = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - counted_at) * rate)
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'counted_at', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+
+class RedisTokenBuckets(TokenBuckets):
+    """Buckets shared through Redis. Requests are let through while Redis can not
+    be reached so an outage of the limiter does not take the API down. Needs
+    redis"""
+
+    def __init__(self, url: str, rate_per_second: float, burst: int):
+        # Imported here so redis is only needed when the shared buckets are used
+        import redis.asyncio as redis
+
+        super().__init__(rate_per_second=rate_per_second, burst=burst)
+        self._redis = redis.from_url(url)
+        self._take = self._redis.register_script(_TAKE_SCRIPT)
+        self._errors = (redis.RedisError, OSError)
+
+    async def take(self, key: str, cost: int) -> float:
+        try:
+            wait = await self._take(
+                keys=[f"rate_limit:{key}"],
+                args=[self.rate_per_second, self.burst, cost],
+            )
+        except self._errors:
+            logger.warning("Rate limit of %s not checked, Redis failed", key, exc_info=True)
+            return 0.0
+        return float(wait)
+
+
+def create_token_buckets() -> TokenBuckets:
+    """Buckets of the configured RATE_LIMIT_BACKEND"""
+    if settings.RATE_LIMIT_BACKEND == "redis":
+        return RedisTokenBuckets(
+            url=settings.RATE_LIMIT_REDIS_URL,
+            rate_per_second=settings.RATE_LIMIT_PER_SECOND,
+            burst=settings.RATE_LIMIT_BURST,
+        )
+    return InMemoryTokenBuckets(
+        rate_per_second=settings.RATE_LIMIT_PER_SECOND, burst=settings.RATE_LIMIT_BURST
+    )
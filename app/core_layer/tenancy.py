@@ -0,0 +1,48 @@
+"""Tenant of the current request.
+
+Projects, tasks and saved filters belong to a tenant so many small customers can
+share one database and one connection pool. TenantMiddleware sets the tenant of
+each request from the TENANT_HEADER header. Rows created during the request get
+its tenant and every ORM query of the request only sees the rows of its tenant,
+see database.py. On Postgres the tenant is also set for each transaction with
+SET LOCAL so row level security policies reject rows of other tenants that a
+query would otherwise reach.
+
+Outside requests, e.g. in the maintenance commands, no tenant is set and ORM
+queries are not scoped. Row level security still hides every row from
+transactions without a tenant so a tenant that was not set fails closed. Code
+acting for every tenant on purpose says so with all_tenants."""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+from uuid import UUID
+
+from app.core_layer.config import settings
+
+current_tenant_id: ContextVar[UUID | None] = ContextVar(
+    "current_tenant_id", default=None
+)
+
+# Set by code acting for every tenant, e.g. the maintenance commands and the audit
+# writer. Sets app.all_tenants for the row level security policies, see database.py
+acting_for_all_tenants: ContextVar[bool] = ContextVar(
+    "acting_for_all_tenants", default=False
+)
+
+
+@contextmanager
+def all_tenants() -> Iterator[None]:
+    """Reads and writes the rows of every tenant within the block. Only for code
+    outside requests"""
+    token = acting_for_all_tenants.set(True)
+    try:
+        yield
+    finally:
+        acting_for_all_tenants.reset(token)
+
+
+def tenant_for_insert() -> UUID:
+    """Tenant of new rows. Rows created outside requests belong to the default
+    tenant"""
+    return current_tenant_id.get() or settings.DEFAULT_TENANT_ID
@@ -1,3 +1,6 @@
+from contextlib import asynccontextmanager
+
+from dependency_injector import providers
 from fastapi import FastAPI
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
@@ -5,24 +8,108 @@ from starlette.middleware.cors import CORSMiddleware
 
 from app.api.routes.filter_routes import filter_router
 from app.api.routes.project_routes import project_router
+from app.api.routes.search_routes import search_router
 from app.api.routes.task_routes import task_router
 from app.core_layer.config import settings
-from app.core_layer.database import create_tables_and_indexes
+from app.core_layer.database import (
+    create_tables_and_indexes,
+    dispose_engines,
+    pool_wait_seconds,
+    warm_up_connections,
+)
 from app.core_layer.dependency_injector import TasklyDependencyContainer
+from app.core_layer.middleware import (
+    CancelOnDisconnectMiddleware,
+    IdempotencyMiddleware,
+    LoadSheddingMiddleware,
+    RateLimitMiddleware,
+    ReadYourWritesMiddleware,
+    StatementTimeoutMiddleware,
+    TenantMiddleware,
+)
+from app.core_layer.rate_limiting import create_token_buckets
+from app.repository_layer.util_search_manager import build_filtersets
 from app.core_layer.exception_handlers import (
     TasklyBaseException,
     app_specific_exception_handler,
+    taskly_exception_handler,
 )
 from app.service_layer.service_exceptions import TasklyServiceValidationError
 
-app = FastAPI(debug=False)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Runs in every worker before it accepts requests
+    app.container.wire()
+    if not settings.LAZY_STARTUP:
+        build_filtersets()
+        await warm_up_connections()
+        for provider in app.container.traverse(types=[providers.Factory]):
+            provider()
+    yield
+    # In flight requests have been drained by the server at this point so no
+    # more task history is queued
+    await app.container.audit_writer().stop()
+    await dispose_engines()
+
+
+app = FastAPI(debug=False, lifespan=lifespan)
 app.container = TasklyDependencyContainer()
 # Generic handler for taskly errors including subclassed exceptions
 # Exceptions raised by framework e.g. pydantic validations
 app.add_exception_handler(TasklyServiceValidationError, app_specific_exception_handler)
-app.add_exception_handler(TasklyBaseException, app_specific_exception_handler)
+app.add_exception_handler(TasklyBaseException, taskly_exception_handler)
+
+# Retried writes sent with an Idempotency-Key get the stored response. Added before
+# the read your writes middleware so replayed responses get a fresh sticky marker
+app.add_middleware(
+    IdempotencyMiddleware,
+    repository_factory=app.container.idempotency_repo,
+    ttl_seconds=settings.IDEMPOTENCY_KEY_TTL_SECONDS,
+)
+
+# Reads may be served by replicas so clients must be able to read their own writes
+if settings.POSTGRES_REPLICA_DSNS:
+    app.add_middleware(
+        ReadYourWritesMiddleware, sticky_seconds=settings.READ_YOUR_WRITES_SECONDS
+    )
+
+# Limits each tenant so a noisy client can not starve the connection pool. Added
+# before the tenant middleware so it runs for the tenant of the request
+if settings.RATE_LIMIT_ENABLED:
+    app.add_middleware(
+        RateLimitMiddleware, buckets=create_token_buckets(), routes=app.routes
+    )
+
+# Covers the statements of the middlewares above and the routes
+app.add_middleware(
+    StatementTimeoutMiddleware,
+    routes=app.routes,
+    default_ms=settings.STATEMENT_TIMEOUT_MS,
+)
+
+# Added after the middlewares above so they and the routes run for the tenant of
+# the request
+app.add_middleware(
+    TenantMiddleware,
+    header_name=settings.TENANT_HEADER,
+    default_tenant_id=None if settings.TENANT_REQUIRED else settings.DEFAULT_TENANT_ID,
+)
+
+# Stops the work and the running statement of requests whose client went away
+app.add_middleware(CancelOnDisconnectMiddleware)
+
+# Rejects requests before any work is done for them while the worker is overloaded
+app.add_middleware(
+    LoadSheddingMiddleware,
+    max_in_flight=settings.LOAD_SHED_MAX_IN_FLIGHT,
+    max_pool_wait_seconds=settings.LOAD_SHED_POOL_WAIT_MS / 1000,
+    retry_after_seconds=settings.LOAD_SHED_RETRY_AFTER_SECONDS,
+    pool_wait_seconds=pool_wait_seconds,
+)
 
-# Add CORS middleware to set allowed origins
+# Add CORS middleware to set allowed origins. Added last so it is the outermost
+# and preflight requests do not need a tenant
 # Set all CORS enabled origins
 if settings.all_cors_origins:
     app.add_middleware(
@@ -37,3 +124,4 @@ if settings.all_cors_origins:
 app.include_router(project_router)
 app.include_router(task_router)
 app.include_router(filter_router)
+app.include_router(search_router)
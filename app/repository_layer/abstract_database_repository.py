@@ -7,18 +7,27 @@ from typing import (
 from uuid import UUID
 
 from pydantic import BaseModel as BaseSchemaModel
-from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm.exc import StaleDataError
 
+from app.repository_layer.audit_database_repository import (
+    AuditWriter,
+    column_values,
+    diff_values,
+)
 from app.repository_layer.exceptions_repository import TasklyRepositoryException
 from app.repository_layer.models.models import DatabaseBaseModel
-from app.repository_layer.util_search_manager import (
-    RepositoryCommonSearchFieldManager,
-)
+from app.repository_layer.outbox import add_outbox_event
+from app.repository_layer.util_search_manager import get_filterset
+from app.repository_layer.util_statement_cache import filter_statement_cache
 from app.service_layer.schemas.common_field_search_schema import (
     CommonSearchFieldsSchema,
 )
 
+# Session info key marking sessions that only read. These may be routed to a read
+# replica. See RoutingSession
+READ_ONLY_SESSION_KEY = "read_only"
+
 
 class CrudActions(Enum):
     CREATE = "create"
@@ -49,8 +58,12 @@ class AbstractDatabaseRepository(ABC):
         delete:
             Hard deletes a record or multiple records from the database_manager based on provided filters.
 
+    Repositories given an audit_writer pass the field level changes of creates,
+    updates and deletes to post_processing.
     """
 
+    audit_writer: AuditWriter | None = None
+
     @abstractmethod
     async def create_model_obj_from_schema(
         self, schema: BaseSchemaModel
@@ -96,9 +109,46 @@ class AbstractDatabaseRepository(ABC):
         model: DatabaseBaseModel = None,
         request_data: BaseSchemaModel = None,
         request_id: UUID = None,
+        changes: dict = None,
     ) -> BaseSchemaModel:
+        """Hook called after a change is committed. `changes` holds the changed
+        fields as field name to [old value, new value] when the repository has an
+        audit_writer"""
+        pass
+
+    async def pre_commit_processing(
+        self,
+        session: AsyncSession,
+        request_action: CrudActions,
+        model: DatabaseBaseModel,
+    ) -> None:
+        """Hook called after the change is applied to the session but before it is
+        flushed or committed. Allows child classes to make further changes in the
+        same transaction. Changed attribute history is still available for updates.
+        Created models are still pending so queries should not autoflush them."""
         pass
 
+    def filter_target(self, model: Any, params: dict) -> tuple[Any, dict]:
+        """Hook returning the model selected by filter and the filterset params.
+        Allows child classes to select an aliased model or to add filters that
+        always apply"""
+        return model, params
+
+    def _audit_snapshot(self, model: DatabaseBaseModel) -> dict | None:
+        """Column values compared by _audit_changes. Taken only when auditing"""
+        if self.audit_writer is None:
+            return None
+        return column_values(model)
+
+    def _audit_changes(self, before: dict | None, after: dict | None) -> dict | None:
+        if self.audit_writer is None:
+            return None
+        return diff_values(before, after)
+
+    def _read_session(self) -> AsyncSession:
+        """Session for requests that only read. May be routed to a read replica"""
+        return self.session_factory(info={READ_ONLY_SESSION_KEY: True})
+
     async def _get_by_id(
         self, id: Any, session: AsyncSession, at_least_one_required=True
     ) -> DatabaseBaseModel:
@@ -131,27 +181,37 @@ class AbstractDatabaseRepository(ABC):
             Dictionary of updated request_data
         """
 
-        session = self.session_factory()
-
-        # Hook to allow child classes to implement their own validations
-        await self.validate(
-            request_data=data, request_action=CrudActions.CREATE, request_id=None
-        )
-
-        model = await self.create_model_obj_from_schema(data)
-        session.add(model)
-        if commit:
-            await session.commit()
-            await session.refresh(model)
-        else:
-            await session.flush()
-            await session.refresh(model)
+        async with self.session_factory() as session:
+            # Hook to allow child classes to implement their own validations
+            await self.validate(
+                request_data=data, request_action=CrudActions.CREATE, request_id=None
+            )
 
-        # Hook to allow child classes to perform custom post process
-        await self.post_processing(
-            model=model, request_action=CrudActions.CREATE, request_data=data
-        )
-        return await self.dump_model_to_dict(model)
+            model = await self.create_model_obj_from_schema(data)
+            session.add(model)
+            await self.pre_commit_processing(
+                session=session, request_action=CrudActions.CREATE, model=model
+            )
+            await add_outbox_event(
+                session, model=model, action=CrudActions.CREATE.value
+            )
+            if commit:
+                await session.commit()
+                await session.refresh(model)
+            else:
+                await session.flush()
+                await session.refresh(model)
+
+            # Hook to allow child classes to perform custom post process
+            await self.post_processing(
+                model=model,
+                request_action=CrudActions.CREATE,
+                request_data=data,
+                changes=self._audit_changes(
+                    before=None, after=self._audit_snapshot(model)
+                ),
+            )
+            return await self.dump_model_to_dict(model)
 
     async def get(
         self,
@@ -165,28 +225,27 @@ class AbstractDatabaseRepository(ABC):
         Returns:
             The retrieved request_data as a dictionary
         """
-        session = self.session_factory()
-
-        # Hook to allow child classes to implement their own validations
-        await self.validate(
-            request_id=primary_key,
-            request_action=CrudActions.READ,
-        )
+        async with self._read_session() as session:
+            # Hook to allow child classes to implement their own validations
+            await self.validate(
+                request_id=primary_key,
+                request_action=CrudActions.READ,
+            )
 
-        model = await self._get_by_id(session=session, id=primary_key)
+            model = await self._get_by_id(session=session, id=primary_key)
 
-        await self.post_processing(
-            model=model, request_id=primary_key, request_action=CrudActions.READ
-        )
+            await self.post_processing(
+                model=model, request_id=primary_key, request_action=CrudActions.READ
+            )
 
-        return await self.dump_model_to_dict(model)
+            return await self.dump_model_to_dict(model)
 
     async def filter(
         self,
         filter_params: CommonSearchFieldsSchema,
         session: AsyncSession = None,
     ) -> Sequence[DatabaseBaseModel]:
-        """Applies filter rules based on parameters and filterset rules retrieved from get_filterset.
+        """Applies filter rules based on parameters and the filterset built for the model class.
         Returns list of database model objects or empty list"""
 
         if not isinstance(filter_params, CommonSearchFieldsSchema):
@@ -199,14 +258,20 @@ class AbstractDatabaseRepository(ABC):
             )
 
         if session is None:
-            session = self.session_factory()
+            async with self._read_session() as session:
+                return await self.filter(filter_params=filter_params, session=session)
 
-        base_query = select(await self.model_class)
-        filterset = RepositoryCommonSearchFieldManager(
-            session=session, query=base_query
+        # Statement templates are cached per combination of filter fields present
+        model, params = self.filter_target(
+            model=await self.model_class,
+            params=filter_params.model_dump(exclude_none=True),
+        )
+        statement, bind_values = filter_statement_cache.get_statement(
+            filterset_class=get_filterset(model), model=model, params=params
+        )
+        filtered_result = (
+            (await session.execute(statement, bind_values)).unique().scalars().all()
         )
-        filter_params_dict = filter_params.model_dump(exclude_none=True)
-        filtered_result = await filterset.filter(filter_params_dict)
         await self.post_processing(
             request_action=CrudActions.FILTER, request_data=filter_params
         )
@@ -226,63 +291,91 @@ class AbstractDatabaseRepository(ABC):
             A list of dictionaries representing the retrieved records
         """
         # Check filter params are valid type.
-        session = self.session_factory()
-        # Taskfilters method will call validation and post processing which subclasses can override
-        # so no calls here for get_multi
-        model_list = await self.filter(session=session, filter_params=filter_params)
-        model_list_dict = [await self.dump_model_to_dict(model=m) for m in model_list]
-        return model_list_dict
+        async with self._read_session() as session:
+            # Taskfilters method will call validation and post processing which subclasses can override
+            # so no calls here for get_multi
+            model_list = await self.filter(session=session, filter_params=filter_params)
+            model_list_dict = [
+                await self.dump_model_to_dict(model=m) for m in model_list
+            ]
+            return model_list_dict
 
     async def update(
         self,
         id: UUID,
         data: BaseSchemaModel,
         commit: bool = True,
+        expected_version: int = None,
     ) -> dict:
         """
         Updates an existing record based on Id
 
         For filtering details see [the Advanced Taskfilters documentation](../advanced/crud.md/#advanced-filters)
 
+        The UPDATE only matches the row if it still has the version that was loaded
+        so a concurrent change is never overwritten.
+
         Args:
             id: Id of the record to update
             commit: If `True`, commits the transaction immediately. Default is `True`.
+            expected_version: Version the client last read e.g. from an If-Match
+                header. The update is rejected if the record has a different version
         Raises:
             TasklyRepositoryException if there is no resource matching the ID provided
+            or the record was changed since the expected version (412)
         Returns:
             The updated record(s) as the type specified in return_type
         """
-        session = self.session_factory()
-        model = await self._get_by_id(session=session, id=id)
-
-        # Hook to allow child classes to implement their own validations
-        await self.validate(
-            request_id=id, request_action=CrudActions.UPDATE, request_data=data
-        )
-
-        update_data_as_dict = data.model_dump(exclude_none=True)
+        async with self.session_factory() as session:
+            model = await self._get_by_id(session=session, id=id)
+            if expected_version is not None and model.version != expected_version:
+                raise _version_conflict(id=id)
+            before = self._audit_snapshot(model)
+
+            # Hook to allow child classes to implement their own validations
+            await self.validate(
+                request_id=id, request_action=CrudActions.UPDATE, request_data=data
+            )
 
-        # Update ORM object and the values will be inserted at next commit
-        for key, value in update_data_as_dict.items():
-            if hasattr(model, key):
-                setattr(model, key, value)
-            else:
-                raise TasklyRepositoryException(
-                    error_message=f"Resource {model.__class__.__name__} does not have field {key} "
+            update_data_as_dict = data.model_dump(exclude_none=True)
+
+            # Update ORM object and the values will be inserted at next commit
+            for key, value in update_data_as_dict.items():
+                if hasattr(model, key):
+                    setattr(model, key, value)
+                else:
+                    raise TasklyRepositoryException(
+                        error_message=f"Resource {model.__class__.__name__} does not have field {key} "
+                    )
+
+            try:
+                # The hook may flush the change itself
+                await self.pre_commit_processing(
+                    session=session, request_action=CrudActions.UPDATE, model=model
                 )
-
-        if commit:
-            await session.commit()
-            await session.refresh(model)
-        else:
-            await session.flush()
+                await add_outbox_event(
+                    session, model=model, action=CrudActions.UPDATE.value
+                )
+                if commit:
+                    await session.commit()
+                else:
+                    await session.flush()
+            except StaleDataError as e:
+                # The row was changed by someone else after it was loaded
+                await session.rollback()
+                raise _version_conflict(id=id) from e
             await session.refresh(model)
 
-        await self.post_processing(
-            request_action=CrudActions.UPDATE, request_data=data, request_id=id
-        )
+            await self.post_processing(
+                request_action=CrudActions.UPDATE,
+                request_data=data,
+                request_id=id,
+                changes=self._audit_changes(
+                    before=before, after=self._audit_snapshot(model)
+                ),
+            )
 
-        return await self.dump_model_to_dict(model)
+            return await self.dump_model_to_dict(model)
 
     async def delete(
         self,
@@ -301,19 +394,40 @@ class AbstractDatabaseRepository(ABC):
         Returns:
             None
         """
-        session = self.session_factory()
-        # Standard validation applicable to all classes
-        model = await self._get_by_id(session=session, id=id)
-        # Hook to allow child classes to implement their own validations
-        await self.validate(request_id=id, request_action=CrudActions.DELETE)
-
-        await session.delete(model)
-        if commit:
-            await session.commit()
-            await session.refresh(model)
-        else:
-            await session.flush()
-            await session.refresh(model)
+        async with self.session_factory() as session:
+            # Standard validation applicable to all classes
+            model = await self._get_by_id(session=session, id=id)
+            # Hook to allow child classes to implement their own validations
+            await self.validate(request_id=id, request_action=CrudActions.DELETE)
+            before = self._audit_snapshot(model)
+            await add_outbox_event(
+                session,
+                model=model,
+                action=CrudActions.DELETE.value,
+                payload=column_values(model),
+            )
+
+            await session.delete(model)
+            await self.pre_commit_processing(
+                session=session, request_action=CrudActions.DELETE, model=model
+            )
+            # Deleted instances can not be refreshed
+            if commit:
+                await session.commit()
+            else:
+                await session.flush()
+
+            await self.post_processing(
+                request_action=CrudActions.DELETE,
+                request_id=id,
+                changes=self._audit_changes(before=before, after=None),
+            )
+            return None
+
 
-        await self.post_processing(request_action=CrudActions.DELETE, request_id=id)
-        return None
+def _version_conflict(id: UUID) -> TasklyRepositoryException:
+    return TasklyRepositoryException(
+        error_message=f"Resource with id:{id} was changed by another request. "
+        "Read it again and retry the update",
+        status_code=412,
+    )
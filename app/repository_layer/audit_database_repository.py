@@ -0,0 +1,202 @@
+"""Field level change history of records, written off the request path.
+
+Repositories given an AuditWriter snapshot the columns of a record before and after
+a change and pass the difference to post_processing, which queues it with
+AuditWriter.record. A background task inserts the queued events in multi-row
+INSERTs once a batch is full or the flush interval has passed since the first
+queued event. The queue is bounded: when it is full requests wait for room rather
+than dropping history. stop writes everything still queued so a graceful shutdown
+loses no events, itself if the background task is gone or does not catch up in
+time. Events keep the tenant of the request that queued them."""
+
+import asyncio
+import contextvars
+import logging
+from datetime import datetime, timezone
+from typing import Any
+from uuid import UUID
+
+from pydantic_core import to_jsonable_python
+from sqlalchemy import inspect, insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.core_layer.tenancy import all_tenants, tenant_for_insert
+from app.repository_layer.models.models import AuditLog, DatabaseBaseModel
+
+logger = logging.getLogger(__name__)
+
+# Bookkeeping columns that change with every update
+_UNAUDITED_FIELDS = {"updated_at", "version"}
+
+
+def column_values(model: DatabaseBaseModel) -> dict[str, Any]:
+    """Current column values of a model keyed on attribute name"""
+    return {
+        attr.key: getattr(model, attr.key)
+        for attr in inspect(model).mapper.column_attrs
+    }
+
+
+def diff_values(
+    before: dict[str, Any] | None, after: dict[str, Any] | None
+) -> dict[str, list]:
+    """Fields whose value differs as field name to [old value, new value] in JSON
+    form. `before` is None for created records and `after` for deleted records"""
+    before = before or {}
+    after = after or {}
+    return {
+        field: to_jsonable_python([before.get(field), after.get(field)])
+        for field in before.keys() | after.keys()
+        if field not in _UNAUDITED_FIELDS and before.get(field) != after.get(field)
+    }
+
+
+class AuditWriter:
+    """Queues change events and writes them to the audit_log table in batches.
+    One writer is shared by all repositories of a worker."""
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker,
+        max_queue_size: int,
+        batch_size: int,
+        flush_interval_seconds: float,
+        stop_timeout_seconds: float = 10,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self.stop_timeout_seconds = stop_timeout_seconds
+        self._queue: asyncio.Queue[dict] = asyncio.Queue(maxsize=max_queue_size)
+        # Set when a full batch is queued so it is written without waiting
+        self._batch_full = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        # Events taken off the queue by the background writer and not yet written
+        self._in_flight: list[dict] = []
+
+    async def record(
+        self, entity_type: str, entity_id: UUID, action: str, changes: dict
+    ) -> None:
+        """Queues a change. Starts the background writer on first use"""
+        if self._task is None or self._task.done():
+            # Started without the tenant of the request as it writes for all tenants
+            self._task = asyncio.create_task(self._run(), context=contextvars.Context())
+        await self._queue.put(
+            {
+                "tenant_id": tenant_for_insert(),
+                "entity_type": entity_type,
+                "entity_id": entity_id,
+                "action": action,
+                "changes": changes,
+                "changed_at": datetime.now(tz=timezone.utc),
+            }
+        )
+        if self._queue.qsize() >= self.batch_size - 1:
+            self._batch_full.set()
+
+    async def stop(self) -> None:
+        """Writes the queued events then stops the background writer. Waits at
+        most stop_timeout_seconds for the background writer, then cancels it and
+        writes what is left itself, including the batch it was writing. Never
+        waits on a writer that has already stopped"""
+        if self._task is None:
+            return
+        if not self._task.done():
+            try:
+                await asyncio.wait_for(self._queue.join(), self.stop_timeout_seconds)
+            except TimeoutError:
+                logger.warning(
+                    "Audit writer did not catch up within %s seconds",
+                    self.stop_timeout_seconds,
+                )
+        self._task.cancel()
+        await asyncio.wait([self._task])
+        self._task = None
+        await self._write_left_over()
+
+    async def _write_left_over(self) -> None:
+        """Writes the batch the background writer was stopped with and the events
+        still queued in batches. A batch cancelled while it was being committed may
+        be written twice, which is preferred to losing it on shutdown"""
+        in_flight, self._in_flight = self._in_flight, []
+        if in_flight:
+            await self._write_batch(in_flight)
+        while not self._queue.empty():
+            await self._write_batch(
+                [
+                    self._queue.get_nowait()
+                    for _ in range(min(self.batch_size, self._queue.qsize()))
+                ]
+            )
+
+    async def _run(self) -> None:
+        while True:
+            # Kept until written so stop can write it if the writer is cancelled
+            batch = self._in_flight = [await self._queue.get()]
+            self._batch_full.clear()
+            if self._queue.qsize() < self.batch_size - 1:
+                try:
+                    await asyncio.wait_for(
+                        self._batch_full.wait(), self.flush_interval_seconds
+                    )
+                except TimeoutError:
+                    pass
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            await self._write_batch(batch)
+            self._in_flight = []
+
+    async def _write_batch(self, batch: list[dict]) -> None:
+        """Writes the events taken off the queue and marks them done. Cancelling
+        the write leaves them not done"""
+        try:
+            await self._write(batch)
+        except Exception:
+            # The events can not be put back without risking writing them twice
+            logger.exception("Failed to write %s audit log events", len(batch))
+        for _ in batch:
+            self._queue.task_done()
+
+    async def _write(self, events: list[dict]) -> None:
+        # A batch holds the events of many tenants
+        with all_tenants():
+            async with self.session_factory() as session:
+                await session.execute(insert(AuditLog), events)
+                await session.commit()
+
+
+class AuditLogRepository:
+    """Reads the change history written by AuditWriter"""
+
+    def __init__(self, session_factory: async_sessionmaker):
+        self._session_factory = session_factory
+
+    @property
+    def session_factory(self) -> async_sessionmaker:
+        return self._session_factory
+
+    async def get_history(
+        self, entity_type: str, entity_id: UUID, limit: int = 50, offset: int = 0
+    ) -> list[dict]:
+        """
+        Changes of a record, newest first. Includes the changes of deleted records.
+        Args:
+            entity_type: Table name of the record e.g. tasks
+            entity_id: Id of the record
+            limit: Maximum number of changes to return
+            offset: Number of changes to skip
+        Returns:
+            List of change dictionaries
+        """
+        async with self.session_factory() as session:
+            models = await session.scalars(
+                select(AuditLog)
+                .where(
+                    AuditLog.entity_id == entity_id,
+                    AuditLog.entity_type == entity_type,
+                )
+                .order_by(AuditLog.changed_at.desc(), AuditLog.id)
+                .limit(limit)
+                .offset(offset)
+            )
+            return [model.to_dict(nested=False, exclude=None) for model in models]
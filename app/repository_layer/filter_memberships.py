@@ -0,0 +1,151 @@
+"""Keeps the task membership of materialized saved filters in step with task changes.
+
+Saved Taskfilters flagged as materialized keep the ids of their matching tasks in the
+taskfilter_members table so reading them is a single indexed join. Task changes are
+queued on the session with record_task_changes and applied by
+apply_filter_memberships just before the transaction commits. Only filters whose
+rules reference a changed field re-check the changed tasks. Changing the rules of a
+filter rebuilds its membership with rebuild_filter_membership.
+
+Relative date rules (e.g. overdue) depend on the current time rather than the task
+so they are left out of the membership, which then holds a superset of the matching
+tasks. Readers apply the full rules on top of the join when
+CompiledFilterRules.has_relative_dates is set."""
+
+from typing import Iterable
+from uuid import UUID
+
+from sqlalchemy import ColumnElement, delete, insert, inspect, literal, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.repository_layer.models.models import TaskfilterMembers, Taskfilters, Tasks
+from app.repository_layer.util_compiled_filter_rules import (
+    ALL_RULE_FIELDS,
+    CompiledFilterRules,
+    compiled_filter_rules_cache,
+)
+
+_PENDING_MEMBERSHIPS_KEY = "pending_filter_memberships"
+_PENDING_PROJECT_TREE_KEY = "pending_filter_project_tree_change"
+
+
+def changed_fields(model) -> set[str]:
+    """Attributes of a loaded model changed in the session but not yet flushed"""
+    return {attr.key for attr in inspect(model).attrs if attr.history.has_changes()}
+
+
+def record_task_changes(
+    session: AsyncSession, task_ids: Iterable[UUID], fields: Iterable[str]
+) -> None:
+    """Queues task changes on the session.
+    Args:
+        session: Session the tasks are changed in
+        task_ids: Ids of the created or changed tasks. Deleted tasks are removed
+            from the memberships by the task repository
+        fields: Task columns that were changed. updated_at is always added as
+            every write sets it
+    """
+    fields = {*fields, "updated_at"} & ALL_RULE_FIELDS
+    if not fields:
+        return
+    pending = session.info.setdefault(_PENDING_MEMBERSHIPS_KEY, {})
+    for task_id in task_ids:
+        pending.setdefault(task_id, set()).update(fields)
+
+
+def record_project_tree_change(session: AsyncSession) -> None:
+    """Queues a change of project names or parents. Filters with parent project
+    rules are rebuilt as they match tasks by project name and project tree"""
+    session.info[_PENDING_PROJECT_TREE_KEY] = True
+
+
+async def apply_filter_memberships(session: AsyncSession) -> None:
+    """Applies the queued changes to the membership of every materialized filter.
+    Flushes the session first so created tasks can be matched."""
+    pending = session.info.pop(_PENDING_MEMBERSHIPS_KEY, None) or {}
+    project_tree_changed = session.info.pop(_PENDING_PROJECT_TREE_KEY, False)
+    if not pending and not project_tree_changed:
+        return
+    await session.flush()
+    materialized_filters = await session.execute(
+        select(Taskfilters.id, Taskfilters.version, Taskfilters.rules).where(
+            Taskfilters.materialized
+        )
+    )
+    for filter_id, version, stored_rules in materialized_filters:
+        rules = compiled_filter_rules_cache.get(
+            filter_id=filter_id, version=version, rules=stored_rules
+        )
+        if project_tree_changed and rules.has_parent_project_rules:
+            await rebuild_filter_membership(session, filter_id=filter_id, rules=rules)
+            continue
+        task_ids = [
+            task_id
+            for task_id, changed in pending.items()
+            if changed & rules.referenced_fields
+        ]
+        if task_ids:
+            await _refresh_membership(
+                session, filter_id=filter_id, rules=rules, task_ids=task_ids
+            )
+
+
+async def rebuild_filter_membership(
+    session: AsyncSession, filter_id: UUID, rules: CompiledFilterRules
+) -> None:
+    """Replaces the whole membership of a filter. Caller is responsible for commit"""
+    await clear_filter_membership(session, filter_id=filter_id)
+    await _insert_members(session, filter_id=filter_id, rules=rules)
+
+
+async def clear_filter_membership(session: AsyncSession, filter_id: UUID) -> None:
+    """Removes the membership of a filter e.g. when it is no longer materialized"""
+    await session.execute(
+        delete(TaskfilterMembers).where(TaskfilterMembers.filter_id == filter_id)
+    )
+
+
+async def _refresh_membership(
+    session: AsyncSession,
+    filter_id: UUID,
+    rules: CompiledFilterRules,
+    task_ids: list[UUID],
+) -> None:
+    """Re-checks the given tasks against the rules of the filter"""
+    await session.execute(
+        delete(TaskfilterMembers).where(
+            TaskfilterMembers.filter_id == filter_id,
+            TaskfilterMembers.task_id.in_(task_ids),
+        )
+    )
+    await _insert_members(
+        session, filter_id=filter_id, rules=rules, tasks_clause=Tasks.id.in_(task_ids)
+    )
+
+
+async def _insert_members(
+    session: AsyncSession,
+    filter_id: UUID,
+    rules: CompiledFilterRules,
+    tasks_clause: ColumnElement[bool] = None,
+) -> None:
+    members = TaskfilterMembers.__table__
+    # INSERT ... SELECT is not scoped to the tenant of the request so the tasks are
+    # limited to the tenant of the filter, also outside requests
+    filter_tenant_id = (
+        select(Taskfilters.tenant_id)
+        .where(Taskfilters.id == filter_id)
+        .scalar_subquery()
+    )
+    matches = select(
+        literal(filter_id, type_=members.c.filter_id.type), Tasks.id
+    ).where(
+        rules.static_clause,
+        Tasks.deleted_at.is_(None),
+        Tasks.tenant_id == filter_tenant_id,
+    )
+    if tasks_clause is not None:
+        matches = matches.where(tasks_clause)
+    await session.execute(
+        insert(members).from_select(["filter_id", "task_id"], matches)
+    )
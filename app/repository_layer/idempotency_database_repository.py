@@ -0,0 +1,121 @@
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.repository_layer.models.models import IdempotencyKeys
+
+
+class StoredResponse(NamedTuple):
+    """Key stored by an earlier request. status_code is None while that request is
+    still in progress. headers are the response headers as (name, value) pairs"""
+
+    request_hash: str
+    status_code: int | None
+    headers: list[tuple[str, str]] | None
+    body: bytes | None
+
+
+class IdempotencyKeyRepository:
+    """Stores the responses of requests sent with an Idempotency-Key header. Only
+    touches the idempotency_keys table so replaying a response never touches the
+    tables of the original request."""
+
+    def __init__(self, session_factory: async_sessionmaker):
+        self._session_factory = session_factory
+
+    @property
+    def session_factory(self) -> async_sessionmaker:
+        return self._session_factory
+
+    async def reserve(
+        self, key: str, request_hash: str, ttl_seconds: int
+    ) -> StoredResponse | None:
+        """
+        Claims the key for a request about to run. Keys that have expired are
+        claimed again.
+        Args:
+            key: Idempotency key sent by the client
+            request_hash: Hash identifying the request sent with the key
+            ttl_seconds: Seconds the key and its response are kept for
+        Returns:
+            None if the key was claimed, otherwise what is stored for the key
+        """
+        now = datetime.now(tz=timezone.utc)
+        table = IdempotencyKeys.__table__
+        statement = insert(table).values(
+            key=key,
+            request_hash=request_hash,
+            expires_at=now + timedelta(seconds=ttl_seconds),
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.key],
+            set_={
+                "request_hash": statement.excluded.request_hash,
+                "status_code": None,
+                "response_headers": None,
+                "response_body": None,
+                "expires_at": statement.excluded.expires_at,
+            },
+            where=table.c.expires_at <= now,
+        ).returning(table.c.key)
+
+        async with self.session_factory() as session:
+            claimed = (await session.execute(statement)).first()
+            await session.commit()
+            if claimed is not None:
+                return None
+            row = (
+                await session.execute(
+                    select(
+                        table.c.request_hash,
+                        table.c.status_code,
+                        table.c.response_headers,
+                        table.c.response_body,
+                    ).where(table.c.key == key)
+                )
+            ).first()
+        if row is None:
+            # Released by the request holding it in the meantime
+            return StoredResponse(request_hash, None, None, None)
+        request_hash, status_code, headers, body = row
+        if headers is not None:
+            headers = [tuple(header) for header in headers]
+        return StoredResponse(request_hash, status_code, headers, body)
+
+    async def save_response(
+        self, key: str, status_code: int, headers: list[tuple[str, str]], body: bytes
+    ) -> None:
+        """Stores the response of the request holding the key"""
+        async with self.session_factory() as session:
+            await session.execute(
+                IdempotencyKeys.__table__.update()
+                .where(IdempotencyKeys.key == key)
+                .values(
+                    status_code=status_code,
+                    response_headers=[list(header) for header in headers],
+                    response_body=body,
+                )
+            )
+            await session.commit()
+
+    async def release(self, key: str) -> None:
+        """Removes a key whose request failed so the client can retry it"""
+        async with self.session_factory() as session:
+            await session.execute(
+                delete(IdempotencyKeys).where(IdempotencyKeys.key == key)
+            )
+            await session.commit()
+
+    async def purge_expired(self) -> int:
+        """Deletes the expired keys. Returns the number of keys deleted"""
+        async with self.session_factory() as session:
+            result = await session.execute(
+                delete(IdempotencyKeys).where(
+                    IdempotencyKeys.expires_at <= datetime.now(tz=timezone.utc)
+                )
+            )
+            await session.commit()
+        return result.rowcount
@@ -0,0 +1,915 @@
+"""Repositories keeping records in memory instead of the database.
+
+They expose the same methods as the database repositories so services can run
+against them unchanged, e.g. in tests and service level benchmarks without a
+database. Swap them in by overriding the dependency container with
+InMemoryRepositoriesContainer.
+
+Records are dictionaries keyed on the column names of the models, filled with the
+column defaults like an INSERT. Secondary indexes map column values to record ids
+so sibling, subtree and project lookups do not scan every record. Methods never
+await between reading and writing records so each call is atomic within the event
+loop. The `commit` arguments are accepted for compatibility and ignored."""
+
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Iterable
+from uuid import UUID
+
+from pydantic import BaseModel as BaseSchemaModel
+
+from app.core_layer.tenancy import tenant_for_insert
+from app.repository_layer.exceptions_repository import TasklyRepositoryException
+from app.repository_layer.idempotency_database_repository import StoredResponse
+from app.repository_layer.models.enumerations import TaskAndProjectStatuses
+from app.repository_layer.models.models import (
+    DatabaseBaseModel,
+    IdempotencyKeys,
+    Projects,
+    Taskfilters,
+    Tasks,
+)
+from app.repository_layer.task_database_repository import (
+    DEADLINE_BUCKETS,
+    _NON_FILTER_FIELDS,
+    _bulk_result,
+)
+from app.repository_layer.util_compiled_filter_rules import CompiledFilterRules
+from app.repository_layer.util_fractional_index import key_between, keys_between
+from app.repository_layer.util_memory_filters import (
+    filter_fields,
+    order_and_paginate,
+    record_matches,
+    rules_match,
+)
+from app.repository_layer.util_search_manager import get_filterset
+from app.service_layer.schemas.common_field_search_schema import (
+    CommonSearchFieldsSchema,
+)
+from app.service_layer.schemas.taskfilter_mixins import ParentProjectFilter
+
+
+class MemoryTable:
+    """Records of one model keyed on their primary key with secondary indexes"""
+
+    def __init__(
+        self,
+        model: type[DatabaseBaseModel],
+        indexed_columns: Iterable[str] = (),
+        key: str = "id",
+    ):
+        self.model = model
+        self.key = key
+        self.records: dict[Any, dict] = {}
+        self.indexes: dict[str, defaultdict[Any, set]] = {
+            column: defaultdict(set) for column in indexed_columns
+        }
+
+    def new_record(self, values: dict) -> dict:
+        """Record with the given values and the column defaults for the others"""
+        record = {}
+        for column in self.model.__table__.columns:
+            if column.key in values:
+                record[column.key] = values[column.key]
+            else:
+                record[column.key] = _default_value(column.default)
+        return record
+
+    def get(self, key: Any) -> dict | None:
+        return self.records.get(key)
+
+    def insert(self, record: dict) -> dict:
+        self.records[record[self.key]] = record
+        for column, index in self.indexes.items():
+            index[record[column]].add(record[self.key])
+        return record
+
+    def update(self, key: Any, values: dict) -> dict:
+        record = self.records[key]
+        for column, index in self.indexes.items():
+            if column in values and values[column] != record[column]:
+                index[record[column]].discard(key)
+                index[values[column]].add(key)
+        record.update(values)
+        return record
+
+    def delete(self, key: Any) -> dict:
+        record = self.records.pop(key)
+        for column, index in self.indexes.items():
+            index[record[column]].discard(key)
+        return record
+
+    def keys_where(self, **values) -> set:
+        """Keys of the records having all the given values in indexed columns"""
+        matches = None
+        for column, value in values.items():
+            keys = self.indexes[column].get(value, set())
+            matches = set(keys) if matches is None else matches & keys
+        return set(self.records) if matches is None else matches
+
+    def where(self, **values) -> list[dict]:
+        return [self.records[key] for key in self.keys_where(**values)]
+
+
+def _default_value(default) -> Any:
+    if default is None:
+        return None
+    if default.is_callable:
+        return default.arg(None)
+    return default.arg
+
+
+class TenantTables:
+    """The tables of the records owned by one tenant"""
+
+    def __init__(self):
+        self.projects = MemoryTable(
+            Projects, indexed_columns=("parent_project_id", "status", "name")
+        )
+        self.tasks = MemoryTable(
+            Tasks, indexed_columns=("project_id", "parent_task_id", "status")
+        )
+        self.taskfilters = MemoryTable(Taskfilters)
+
+
+class InMemoryStore:
+    """The tables shared by the in memory repositories. Projects, tasks and saved
+    filters are kept per tenant so a request only sees the records of its tenant,
+    like the tenant scoped queries of the database repositories"""
+
+    def __init__(self):
+        self.tenants: dict[UUID, TenantTables] = {}
+        self.idempotency_keys = MemoryTable(IdempotencyKeys, key="key")
+
+    def _tenant_tables(self) -> TenantTables:
+        tenant_id = tenant_for_insert()
+        if tenant_id not in self.tenants:
+            self.tenants[tenant_id] = TenantTables()
+        return self.tenants[tenant_id]
+
+    @property
+    def projects(self) -> MemoryTable:
+        return self._tenant_tables().projects
+
+    @property
+    def tasks(self) -> MemoryTable:
+        return self._tenant_tables().tasks
+
+    @property
+    def taskfilters(self) -> MemoryTable:
+        return self._tenant_tables().taskfilters
+
+
+def _not_found(id: Any) -> TasklyRepositoryException:
+    return TasklyRepositoryException(
+        error_message=f"Resource not found with id:{id}", status_code=404
+    )
+
+
+class AbstractMemoryRepository:
+    """CRUD operations on the records of one table. Mirrors the public methods of
+    AbstractDatabaseRepository and the errors they raise"""
+
+    # Filter fields answered from the secondary indexes of the table
+    indexed_filter_fields: tuple[str, ...] = ()
+
+    def __init__(self, store: InMemoryStore):
+        self.store = store
+
+    @property
+    def table(self) -> MemoryTable:
+        raise NotImplementedError()
+
+    def values_from_schema(self, schema: BaseSchemaModel) -> dict:
+        return schema.model_dump()
+
+    def _get_record(self, id: Any) -> dict:
+        record = self.table.get(id)
+        if record is None:
+            raise _not_found(id)
+        return record
+
+    def _check_fields(self, values: dict) -> None:
+        columns = self.table.model.__table__.columns
+        for key in values:
+            if key not in columns:
+                raise TasklyRepositoryException(
+                    error_message=f"Resource {self.table.model.__name__} does not have field {key} "
+                )
+
+    def _update_values(self, record: dict, values: dict) -> dict:
+        """Values written by an UPDATE of the record including the version bump and
+        the onupdate column defaults"""
+        values = dict(values)
+        for column in self.table.model.__table__.columns:
+            if column.onupdate is not None and column.key not in values:
+                values[column.key] = _default_value(column.onupdate)
+        values["version"] = record["version"] + 1
+        return values
+
+    async def create(self, data: BaseSchemaModel, commit: bool = True) -> dict:
+        values = self.values_from_schema(data)
+        self._check_fields(values)
+        record = self.table.insert(self.table.new_record(values))
+        return dict(record)
+
+    async def get(self, primary_key: UUID) -> dict:
+        return dict(self._get_record(primary_key))
+
+    async def filter(self, filter_params: CommonSearchFieldsSchema) -> list[dict]:
+        """Applies the filterset built for the model class to the records. Returns
+        the matching records, not copies"""
+        if not isinstance(filter_params, CommonSearchFieldsSchema):
+            raise TasklyRepositoryException(
+                error_message="Filter params must be an instance of/subclass instance of CommonSearchFieldsSchema",
+                status_code=500,
+            )
+        model, params = self.filter_target(
+            model=self.table.model, params=filter_params.model_dump(exclude_none=True)
+        )
+        filterset_class = get_filterset(model)
+        candidates = self._candidates(filter_fields(filterset_class, params))
+        matches = [
+            record
+            for record in candidates
+            if record_matches(record, filterset_class, params)
+        ]
+        return order_and_paginate(matches, filterset_class, params)
+
+    def filter_target(self, model: Any, params: dict) -> tuple[Any, dict]:
+        """Hook returning the model whose filterset is applied and its params"""
+        return model, params
+
+    def _candidates(self, filter_params: dict) -> list[dict]:
+        """Records narrowed down by the indexed filter fields"""
+        indexed = {}
+        for field_name in self.indexed_filter_fields:
+            value = filter_params.get(field_name)
+            if value is None:
+                continue
+            if isinstance(value, (tuple, list, set)):
+                # In filters are the union of the records of each value
+                keys = set()
+                for item in value:
+                    keys |= self.table.keys_where(**{field_name: item})
+                indexed[field_name] = keys
+            else:
+                indexed[field_name] = self.table.keys_where(**{field_name: value})
+        if "id" in filter_params:
+            indexed["id"] = {filter_params["id"]} & set(self.table.records)
+        if not indexed:
+            return list(self.table.records.values())
+        keys = set.intersection(*indexed.values())
+        return [self.table.records[key] for key in keys]
+
+    async def get_multi(self, filter_params: CommonSearchFieldsSchema) -> list[dict]:
+        return [dict(record) for record in await self.filter(filter_params)]
+
+    async def update(
+        self,
+        id: UUID,
+        data: BaseSchemaModel,
+        commit: bool = True,
+        expected_version: int = None,
+    ) -> dict:
+        record = self._get_record(id)
+        if expected_version is not None and record["version"] != expected_version:
+            raise TasklyRepositoryException(
+                error_message=f"Resource with id:{id} was changed by another request. "
+                "Read it again and retry the update",
+                status_code=412,
+            )
+        values = data.model_dump(exclude_none=True)
+        self._check_fields(values)
+        self._before_update(record, values)
+        self.table.update(id, self._update_values(record, values))
+        return dict(record)
+
+    def _before_update(self, record: dict, values: dict) -> None:
+        """Hook called with the values of an update before they are written"""
+        pass
+
+    async def delete(self, id: UUID, commit: bool = True) -> None:
+        self._get_record(id)
+        self.table.delete(id)
+        return None
+
+
+class ProjectMemoryRepository(AbstractMemoryRepository):
+    indexed_filter_fields = ("status", "parent_project_id")
+
+    @property
+    def table(self) -> MemoryTable:
+        return self.store.projects
+
+    async def create(self, data: BaseSchemaModel, commit: bool = True) -> dict:
+        parent_project_id = self.values_from_schema(data).get("parent_project_id")
+        if parent_project_id is not None:
+            self._get_record(parent_project_id)
+        return await super().create(data, commit=commit)
+
+    def _before_update(self, record: dict, values: dict) -> None:
+        parent_project_id = values.get("parent_project_id")
+        if parent_project_id not in (None, record["parent_project_id"]):
+            self._get_record(parent_project_id)
+
+    async def delete(self, id: UUID, commit: bool = True) -> None:
+        """Projects still referenced by tasks or child projects are refused like
+        the foreign keys of the database do"""
+        self._get_record(id)
+        if self.store.tasks.keys_where(project_id=id) or self.table.keys_where(
+            parent_project_id=id
+        ):
+            raise TasklyRepositoryException(
+                error_message=f"Project {id} still has tasks or child projects",
+                status_code=409,
+            )
+        self.table.delete(id)
+        return None
+
+
+class TaskfiltersMemoryRepository(AbstractMemoryRepository):
+    @property
+    def table(self) -> MemoryTable:
+        return self.store.taskfilters
+
+    def values_from_schema(self, schema: BaseSchemaModel) -> dict:
+        # Stored the same way as the rules column of the database repository
+        return schema.model_dump(exclude_none=True, mode="json", round_trip=True)
+
+
+class TaskMemoryRepository(AbstractMemoryRepository):
+    indexed_filter_fields = ("status", "project_id", "parent_task_id")
+
+    @property
+    def table(self) -> MemoryTable:
+        return self.store.tasks
+
+    def filter_target(self, model: Any, params: dict) -> tuple[Any, dict]:
+        """Soft deleted tasks are left out unless include_archived is set. Tasks
+        are never archived in memory"""
+        if params.pop("include_archived", False):
+            return model, params
+        return model, {**params, "exclude_deleted": True}
+
+    def _get_record(self, id: Any) -> dict:
+        """Soft deleted tasks are not found"""
+        record = self.table.get(id)
+        if record is None or record["deleted_at"] is not None:
+            raise _not_found(id)
+        return record
+
+    async def create(self, data: BaseSchemaModel, commit: bool = True) -> dict:
+        values = self.values_from_schema(data)
+        self._check_fields(values)
+        record = self.table.new_record(values)
+        self._check_parents(record["project_id"], record["parent_task_id"])
+        record["position"] = key_between(
+            self._last_position(record["project_id"], record["parent_task_id"]), None
+        )
+        self.table.insert(record)
+        self._refresh_project_rollups({record["project_id"]})
+        return dict(record)
+
+    def _check_parents(self, project_id: UUID, parent_task_id: UUID) -> None:
+        """Parents must exist in the tables of the tenant, like the database
+        repository checks"""
+        if parent_task_id is not None:
+            self._get_record(parent_task_id)
+        if project_id is not None and self.store.projects.get(project_id) is None:
+            raise _not_found(project_id)
+
+    def _before_update(self, record: dict, values: dict) -> None:
+        """Tasks moved to another sibling list are placed at its end"""
+        project_id = values.get("project_id", record["project_id"])
+        parent_task_id = values.get("parent_task_id", record["parent_task_id"])
+        if (project_id, parent_task_id) != (
+            record["project_id"],
+            record["parent_task_id"],
+        ):
+            self._check_parents(project_id, parent_task_id)
+            values["position"] = key_between(
+                self._last_position(project_id, parent_task_id), None
+            )
+
+    async def update(
+        self,
+        id: UUID,
+        data: BaseSchemaModel,
+        commit: bool = True,
+        expected_version: int = None,
+    ) -> dict:
+        previous_project_id = self._get_record(id)["project_id"]
+        updated = await super().update(
+            id=id, data=data, commit=commit, expected_version=expected_version
+        )
+        self._refresh_project_rollups({previous_project_id, updated["project_id"]})
+        return updated
+
+    async def delete(self, id: UUID, commit: bool = True) -> None:
+        """Soft deletes a task and all of its subtasks"""
+        self._get_record(id)
+        self._delete_subtrees([id])
+        return None
+
+    async def move(
+        self,
+        id: UUID,
+        before_id: UUID = None,
+        after_id: UUID = None,
+        commit: bool = True,
+    ) -> dict:
+        record = self._get_record(id)
+        neighbour_ids = [i for i in (before_id, after_id) if i is not None]
+        for neighbour_id in neighbour_ids:
+            neighbour = self._get_record(neighbour_id)
+            if neighbour_id == id or (
+                neighbour["project_id"] != record["project_id"]
+                or neighbour["parent_task_id"] != record["parent_task_id"]
+            ):
+                raise TasklyRepositoryException(
+                    error_message=f"Task {neighbour_id} is not a sibling of task {id}",
+                    status_code=422,
+                )
+
+        lower = self.table.get(after_id)["position"] if after_id is not None else None
+        upper = (
+            self.table.get(before_id)["position"] if before_id is not None else None
+        )
+        positions = [
+            sibling["position"]
+            for sibling in self._siblings(record["project_id"], record["parent_task_id"])
+            if sibling["id"] != id
+        ]
+        if after_id is None:
+            lower = max((p for p in positions if p < upper), default=None)
+        elif before_id is None:
+            upper = min((p for p in positions if p > lower), default=None)
+        elif lower >= upper:
+            raise TasklyRepositoryException(
+                error_message=f"Task {after_id} must be ordered before task {before_id}",
+                status_code=422,
+            )
+        elif min((p for p in positions if p > lower), default=None) != upper:
+            raise TasklyRepositoryException(
+                error_message=f"Task {before_id} must directly follow task {after_id}",
+                status_code=422,
+            )
+        self.table.update(
+            id,
+            self._update_values(record, {"position": key_between(lower, upper)}),
+        )
+        return dict(record)
+
+    async def rebalance_positions(
+        self,
+        project_id: UUID = None,
+        parent_task_id: UUID = None,
+        commit: bool = True,
+    ) -> None:
+        self._rebalance_positions(project_id=project_id, parent_task_id=parent_task_id)
+
+    async def move_subtree(
+        self,
+        id: UUID,
+        project_id: UUID = None,
+        parent_task_id: UUID = None,
+        commit: bool = True,
+    ) -> dict:
+        record = self._get_record(id)
+        subtree_ids = self._subtree_ids([id])
+        if parent_task_id is not None:
+            parent = self._get_record(parent_task_id)
+            if parent_task_id in subtree_ids:
+                raise TasklyRepositoryException(
+                    error_message=f"Task {parent_task_id} is part of the subtree of task {id}",
+                    status_code=422,
+                )
+            if project_id is None:
+                project_id = parent["project_id"]
+        if project_id is not None and self.store.projects.get(project_id) is None:
+            raise _not_found(project_id)
+        if project_id is None and parent_task_id is None:
+            raise TasklyRepositoryException(
+                error_message="Tasks requires either a project_id or parent_task_id",
+                status_code=422,
+            )
+
+        affected_project_ids = {
+            self.table.get(task_id)["project_id"] for task_id in subtree_ids
+        } | {project_id}
+        last_position = max(
+            (
+                sibling["position"]
+                for sibling in self._siblings(project_id, parent_task_id)
+                if sibling["id"] != id
+            ),
+            default=None,
+        )
+        for task_id in subtree_ids:
+            task = self.table.get(task_id)
+            self.table.update(
+                task_id, {"project_id": project_id, "version": task["version"] + 1}
+            )
+        self.table.update(
+            id,
+            {
+                "parent_task_id": parent_task_id,
+                "position": key_between(last_position, None),
+            },
+        )
+        # Subtasks of one parent that were linked to different projects now share
+        # a sibling list so their positions can clash
+        for parent_id in subtree_ids:
+            positions = [
+                child["position"] for child in self.table.where(parent_task_id=parent_id)
+            ]
+            if len(positions) != len(set(positions)):
+                self._rebalance_positions(
+                    project_id=project_id, parent_task_id=parent_id
+                )
+        self._refresh_project_rollups(affected_project_ids)
+        return dict(record)
+
+    async def complete_subtree(self, id: UUID, commit: bool = True) -> dict:
+        record = self._get_record(id)
+        affected_project_ids = set()
+        for task_id in self._subtree_ids([id]):
+            task = self.table.get(task_id)
+            if (
+                task["status"] is not TaskAndProjectStatuses.completed
+                and task["deleted_at"] is None
+            ):
+                self.table.update(
+                    task_id,
+                    {
+                        "status": TaskAndProjectStatuses.completed,
+                        "version": task["version"] + 1,
+                    },
+                )
+                affected_project_ids.add(task["project_id"])
+        self._refresh_project_rollups(affected_project_ids)
+        return dict(record)
+
+    async def bulk_update(
+        self,
+        values: dict,
+        filter_params: CommonSearchFieldsSchema = None,
+        rules: CompiledFilterRules = None,
+        dry_run: bool = False,
+        commit: bool = True,
+    ) -> dict:
+        matches = self._search(filter_params=filter_params, rules=rules)
+        previous_project_ids = {task["project_id"] for task in matches} - {None}
+        if dry_run:
+            return _bulk_result(
+                matched=len(matches), projects=len(previous_project_ids), dry_run=True
+            )
+        for task in matches:
+            self.table.update(task["id"], {**values, "version": task["version"] + 1})
+        affected_project_ids = {task["project_id"] for task in matches} - {None}
+        self._refresh_project_rollups(previous_project_ids | affected_project_ids)
+        return _bulk_result(
+            matched=len(matches),
+            projects=len(affected_project_ids),
+            dry_run=False,
+        )
+
+    async def bulk_delete(
+        self,
+        filter_params: CommonSearchFieldsSchema = None,
+        rules: CompiledFilterRules = None,
+        dry_run: bool = False,
+        commit: bool = True,
+    ) -> dict:
+        root_ids = [
+            task["id"]
+            for task in self._search(filter_params=filter_params, rules=rules)
+        ]
+        if dry_run:
+            subtree = [
+                task
+                for task in map(self.table.get, self._subtree_ids(root_ids))
+                if task["deleted_at"] is None
+            ]
+            projects = {task["project_id"] for task in subtree}
+            return _bulk_result(
+                matched=len(root_ids),
+                tasks=len(subtree),
+                projects=len(projects - {None}),
+                dry_run=True,
+            )
+        deleted, affected_project_ids = self._delete_subtrees(root_ids)
+        return _bulk_result(
+            matched=len(root_ids),
+            tasks=deleted,
+            projects=len(affected_project_ids),
+            dry_run=False,
+        )
+
+    async def get_filter_tasks(
+        self,
+        filter_id: UUID,
+        rules: CompiledFilterRules,
+        materialized: bool,
+        limit: int = 50,
+        offset: int = 0,
+    ) -> list[dict]:
+        """Materialized filters have no stored membership in memory so the rules are
+        always evaluated"""
+        matches = sorted(
+            self._search(rules=rules),
+            key=lambda task: (task["created_at"], task["id"]),
+        )
+        return [dict(task) for task in matches[offset : offset + limit]]
+
+    async def get_subtree(
+        self,
+        id: UUID,
+        depth: int,
+        ordering: str = "position",
+        limit: int = 50,
+        offset: int = 0,
+        max_nodes: int = 1000,
+    ) -> tuple[dict, list[dict]]:
+        root = dict(self._get_record(id))
+        return root, self._subtree_levels(id, depth, ordering, limit, offset)[
+            :max_nodes
+        ]
+
+    async def stream_subtree(
+        self,
+        id: UUID,
+        depth: int,
+        ordering: str = "position",
+        limit: int = 50,
+        offset: int = 0,
+        max_nodes: int = 100_000,
+    ) -> AsyncIterator[dict]:
+        task = self.table.get(id)
+        if task is None or task["deleted_at"] is not None:
+            return
+        for subtask in self._subtree_levels(id, depth, ordering, limit, offset)[
+            :max_nodes
+        ]:
+            yield subtask
+
+    def _subtree_levels(
+        self, root_id: UUID, depth: int, ordering: str, limit: int, offset: int
+    ) -> list[dict]:
+        """Subtasks with their depth in the order of the database subtree query:
+        level by level, sorted by `ordering` then id within a level"""
+
+        def sort_key(task: dict) -> tuple:
+            # Missing deadlines sort last like NULLS LAST
+            return (task[ordering] is None, task[ordering], str(task["id"]))
+
+        level = sorted(self._subtasks(root_id), key=sort_key)
+        level = level[offset : offset + limit]
+        subtasks = []
+        for level_depth in range(1, depth + 1):
+            if not level:
+                break
+            subtasks.extend({**task, "depth": level_depth} for task in level)
+            level = sorted(
+                (child for task in level for child in self._subtasks(task["id"])),
+                key=sort_key,
+            )
+        return subtasks
+
+    async def get_stats(
+        self,
+        filter_params: CommonSearchFieldsSchema = None,
+        rules: CompiledFilterRules = None,
+    ) -> dict:
+        now = datetime.now(tz=timezone.utc)
+        stats = {
+            "total": 0,
+            "by_status": {task_status: 0 for task_status in TaskAndProjectStatuses},
+            "by_deadline": {bucket: 0 for bucket in DEADLINE_BUCKETS},
+            "by_project": [],
+        }
+        by_project = defaultdict(int)
+        for task in self._search(filter_params=filter_params, rules=rules, now=now):
+            stats["total"] += 1
+            stats["by_status"][task["status"]] += 1
+            stats["by_deadline"][_deadline_bucket(task, now=now)] += 1
+            by_project[task["project_id"]] += 1
+        stats["by_project"] = [
+            {"project_id": project_id, "count": count}
+            for project_id, count in by_project.items()
+        ]
+        return stats
+
+    def _search(
+        self,
+        filter_params: CommonSearchFieldsSchema = None,
+        rules: CompiledFilterRules = None,
+        now: datetime = None,
+    ) -> list[dict]:
+        """Tasks matching the common search fields (pagination and other non filter
+        fields are ignored) and saved filter rules"""
+        filterset_class = get_filterset(Tasks)
+        params = {}
+        if filter_params is not None:
+            params = filter_params.model_dump(
+                exclude_none=True, exclude=_NON_FILTER_FIELDS
+            )
+        matches = [
+            task
+            for task in self._candidates(filter_fields(filterset_class, params))
+            if task["deleted_at"] is None
+            and record_matches(task, filterset_class, params)
+        ]
+        if rules is not None:
+            if now is None:
+                now = datetime.now(tz=timezone.utc)
+            project_ids = self._project_ids_resolver()
+            matches = [
+                task
+                for task in matches
+                if rules_match(task, rules, now=now, project_ids=project_ids)
+            ]
+        return matches
+
+    def _project_ids_resolver(self):
+        """Resolves the project names of parent project rules to project ids. Ids
+        are resolved once per rule"""
+        resolved = {}
+
+        def project_ids(project_filter: ParentProjectFilter) -> set[UUID]:
+            key = id(project_filter)
+            if key not in resolved:
+                projects = self.store.projects
+                ids = set()
+                for name in project_filter.project_names:
+                    ids |= projects.keys_where(name=name)
+                if project_filter.include_child_projects:
+                    # Walk down the project tree so child projects match too
+                    pending = list(ids)
+                    while pending:
+                        children = projects.keys_where(
+                            parent_project_id=pending.pop()
+                        )
+                        pending.extend(children - ids)
+                        ids |= children
+                resolved[key] = ids
+            return resolved[key]
+
+        return project_ids
+
+    def _subtasks(self, parent_task_id: UUID) -> list[dict]:
+        return [
+            task
+            for task in self.table.where(parent_task_id=parent_task_id)
+            if task["deleted_at"] is None
+        ]
+
+    def _siblings(self, project_id: UUID, parent_task_id: UUID) -> list[dict]:
+        return self.table.where(project_id=project_id, parent_task_id=parent_task_id)
+
+    def _last_position(self, project_id: UUID, parent_task_id: UUID) -> str | None:
+        return max(
+            (task["position"] for task in self._siblings(project_id, parent_task_id)),
+            default=None,
+        )
+
+    def _rebalance_positions(
+        self, project_id: UUID = None, parent_task_id: UUID = None
+    ) -> None:
+        # The order of the siblings is unchanged so versions are not bumped
+        siblings = sorted(
+            self._siblings(project_id, parent_task_id),
+            key=lambda task: (task["position"], str(task["id"])),
+        )
+        for task, position in zip(
+            siblings, keys_between(None, None, len(siblings))
+        ):
+            self.table.update(task["id"], {"position": position})
+
+    def _subtree_ids(self, root_ids: Iterable[UUID]) -> set[UUID]:
+        """Ids of the root tasks and all of their subtasks"""
+        subtree_ids = set(root_ids)
+        pending = list(subtree_ids)
+        while pending:
+            children = self.table.keys_where(parent_task_id=pending.pop())
+            pending.extend(children - subtree_ids)
+            subtree_ids |= children
+        return subtree_ids
+
+    def _delete_subtrees(self, root_ids: Iterable[UUID]) -> tuple[int, set[UUID]]:
+        """Soft deletes the root tasks with all of their subtasks. Returns the
+        number of deleted tasks and the affected project ids"""
+        deleted_at = datetime.now(tz=timezone.utc)
+        deleted = [
+            self.table.update(
+                task["id"],
+                self._update_values(task, {"deleted_at": deleted_at}),
+            )
+            for task in map(self.table.get, self._subtree_ids(root_ids))
+            if task["deleted_at"] is None
+        ]
+        affected_project_ids = {task["project_id"] for task in deleted} - {None}
+        self._refresh_project_rollups(affected_project_ids)
+        return len(deleted), affected_project_ids
+
+    def _refresh_project_rollups(self, project_ids: Iterable[UUID]) -> None:
+        """Recalculates the task rollups of the projects from their tasks. Like the
+        database rollups the project versions are not bumped"""
+        for project_id in set(project_ids) - {None}:
+            if self.store.projects.get(project_id) is None:
+                continue
+            tasks = [
+                task
+                for task in self.table.where(project_id=project_id)
+                if task["deleted_at"] is None
+            ]
+            open_deadlines = [
+                task["deadline_date"]
+                for task in tasks
+                if task["status"] is not TaskAndProjectStatuses.completed
+                and task["deadline_date"] is not None
+            ]
+            self.store.projects.update(
+                project_id,
+                {
+                    "total_tasks": len(tasks),
+                    "completed_tasks": sum(
+                        task["status"] is TaskAndProjectStatuses.completed
+                        for task in tasks
+                    ),
+                    "next_deadline": min(open_deadlines, default=None),
+                },
+            )
+
+
+def _deadline_bucket(task: dict, now: datetime) -> str:
+    if task["status"] is TaskAndProjectStatuses.completed:
+        return "completed"
+    if task["deadline_date"] is None:
+        return "no_deadline"
+    if task["deadline_date"] < now:
+        return "overdue"
+    if task["deadline_date"] < now + timedelta(days=7):
+        return "due_this_week"
+    return "later"
+
+
+class IdempotencyKeyMemoryRepository:
+    """In memory counterpart of IdempotencyKeyRepository"""
+
+    def __init__(self, store: InMemoryStore):
+        self.store = store
+
+    async def reserve(
+        self, key: str, request_hash: str, ttl_seconds: int
+    ) -> StoredResponse | None:
+        now = datetime.now(tz=timezone.utc)
+        table = self.store.idempotency_keys
+        stored = table.get(key)
+        if stored is not None and stored["expires_at"] > now:
+            return StoredResponse(
+                stored["request_hash"],
+                stored["status_code"],
+                stored["response_headers"],
+                stored["response_body"],
+            )
+        if stored is not None:
+            table.delete(key)
+        table.insert(
+            table.new_record(
+                {
+                    "key": key,
+                    "request_hash": request_hash,
+                    "expires_at": now + timedelta(seconds=ttl_seconds),
+                }
+            )
+        )
+        return None
+
+    async def save_response(
+        self, key: str, status_code: int, headers: list[tuple[str, str]], body: bytes
+    ) -> None:
+        if self.store.idempotency_keys.get(key) is not None:
+            self.store.idempotency_keys.update(
+                key,
+                {
+                    "status_code": status_code,
+                    "response_headers": list(headers),
+                    "response_body": body,
+                },
+            )
+
+    async def release(self, key: str) -> None:
+        if self.store.idempotency_keys.get(key) is not None:
+            self.store.idempotency_keys.delete(key)
+
+    async def purge_expired(self) -> int:
+        now = datetime.now(tz=timezone.utc)
+        table = self.store.idempotency_keys
+        expired = [
+            key for key, record in table.records.items() if record["expires_at"] <= now
+        ]
+        for key in expired:
+            table.delete(key)
+        return len(expired)
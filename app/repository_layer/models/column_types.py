@@ -0,0 +1,29 @@
+"""Column types that work on both supported databases, Postgres and SQLite"""
+
+from datetime import datetime, timezone
+
+from sqlalchemy import JSON, TIMESTAMP
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.types import TypeDecorator
+
+# JSONB on Postgres and JSON stored as text on SQLite
+PortableJSON = JSON().with_variant(JSONB(), "postgresql")
+
+
+class AwareDateTime(TypeDecorator):
+    """Timezone aware timestamp. Postgres stores it as timestamptz. SQLite has no
+    timezone support so values are stored in UTC, which also keeps the stored text
+    in time order, and read back as UTC aware datetimes"""
+
+    impl = TIMESTAMP(timezone=True)
+    cache_ok = True
+
+    def process_bind_param(self, value: datetime | None, dialect) -> datetime | None:
+        if value is not None and dialect.name == "sqlite" and value.tzinfo is not None:
+            return value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
+    def process_result_value(self, value: datetime | None, dialect) -> datetime | None:
+        if value is not None and value.tzinfo is None:
+            return value.replace(tzinfo=timezone.utc)
+        return value
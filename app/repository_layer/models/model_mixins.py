@@ -2,14 +2,21 @@ from datetime import datetime, timezone, timedelta
 from uuid import UUID, uuid4
 
 import sqlalchemy
-from sqlalchemy import TIMESTAMP, Interval, Enum
-from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import Interval, Enum
+from sqlalchemy.orm import Mapped, mapped_column, declared_attr
+
+from app.core_layer.tenancy import tenant_for_insert
+from app.repository_layer.models.column_types import AwareDateTime
 from app.repository_layer.models.enumerations import (
     TaskAndProjectStatuses,
     RepeatIntervalType,
 )
 
 
+def _utc_now() -> datetime:
+    return datetime.now(tz=timezone.utc)
+
+
 class HasCommonFields:
     """Defines common fields for all database_manager models
     Note the SearchRepository class depends on these"""
@@ -17,34 +24,45 @@ class HasCommonFields:
     name = sqlalchemy.Column(sqlalchemy.String, nullable=False)
     id: Mapped[UUID] = mapped_column(primary_key=True, default=uuid4)
     created_at: Mapped[datetime] = mapped_column(
-        TIMESTAMP(timezone=True), default=datetime.now(tz=timezone.utc), nullable=False
+        AwareDateTime, default=_utc_now, nullable=False
     )
     updated_at: Mapped[datetime] = mapped_column(
-        TIMESTAMP(timezone=True),
-        default=datetime.now(tz=timezone.utc),
-        onupdate=datetime.now(tz=timezone.utc),
+        AwareDateTime,
+        default=_utc_now,
+        onupdate=_utc_now,
         nullable=False,
     )
 
 
+class HasTenant:
+    """Tenant owning the row. Set from the request creating the row and used to
+    scope every query of a request to its tenant, see tenancy.py"""
+
+    tenant_id: Mapped[UUID] = mapped_column(nullable=False, default=tenant_for_insert)
+
+
+class HasVersion:
+    """Optimistic concurrency control. SQL Alchemy increments the version in every
+    UPDATE it issues for the row and only updates the row if it still has the
+    version that was loaded, raising StaleDataError otherwise"""
+
+    version: Mapped[int] = mapped_column(nullable=False, default=1, server_default="1")
+
+    @declared_attr.directive
+    def __mapper_args__(cls) -> dict:
+        return {"version_id_col": cls.version}
+
+
 class HasRepeatFields:
     repeat_interval_type: Mapped[RepeatIntervalType] = mapped_column(nullable=True)
     repeat_interval: Mapped[timedelta] = mapped_column(Interval, nullable=True)
-    repeat_start: Mapped[datetime] = mapped_column(
-        TIMESTAMP(timezone=True),
-    )
-    repeat_end: Mapped[datetime] = mapped_column(
-        TIMESTAMP(timezone=True),
-    )
+    repeat_start: Mapped[datetime] = mapped_column(AwareDateTime)
+    repeat_end: Mapped[datetime] = mapped_column(AwareDateTime)
 
 
 class HasOptionalStartAndDeadlineDates:
-    deadline_date: Mapped[datetime] = mapped_column(
-        TIMESTAMP(timezone=True), nullable=True
-    )
-    start_date: Mapped[datetime] = mapped_column(
-        TIMESTAMP(timezone=True), nullable=True
-    )
+    deadline_date: Mapped[datetime] = mapped_column(AwareDateTime, nullable=True)
+    start_date: Mapped[datetime] = mapped_column(AwareDateTime, nullable=True)
 
 
 class HasOptionalDescription:
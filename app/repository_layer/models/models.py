@@ -1,9 +1,21 @@
-from uuid import UUID
+from datetime import datetime
+from uuid import UUID, uuid4
 
 import sqlalchemy
-from sqlalchemy import ForeignKey, CheckConstraint
+from sqlalchemy import (
+    DDL,
+    select,
+    union_all,
+    event,
+    ForeignKey,
+    CheckConstraint,
+    Index,
+    String,
+    UniqueConstraint,
+)
 from sqlalchemy.orm import (
     Mapped,
+    aliased,
     mapped_column,
     relationship,
     DeclarativeBase,
@@ -18,9 +30,11 @@ from app.repository_layer.models.model_mixins import (
     HasStatus,
     HasOptionalDescription,
     HasRepeatFields,
+    HasTenant,
+    HasVersion,
 )
+from app.repository_layer.models.column_types import AwareDateTime, PortableJSON
 from app.repository_layer.models.enumerations import ProjectTypes
-from sqlalchemy.dialects.postgresql import JSONB
 
 
 class DatabaseBaseModel(DeclarativeBase, ReprMixin, SerializeMixin):
@@ -43,6 +57,8 @@ class Projects(
     HasOptionalDescription,
     HasOptionalStartAndDeadlineDates,
     HasRepeatFields,
+    HasTenant,
+    HasVersion,
     DatabaseBaseModel,
 ):
     """Represents a project which can contain child projects or tasks.
@@ -59,7 +75,24 @@ class Projects(
     # Relationships
     child_project = relationship("Projects")
     parent_project_id = sqlalchemy.Column(
-        sqlalchemy.UUID, sqlalchemy.ForeignKey("projects.id")
+        sqlalchemy.Uuid, sqlalchemy.ForeignKey("projects.id")
+    )
+
+    # Task rollups - maintained by the task repository see project_rollups.py
+    total_tasks: Mapped[int] = mapped_column(
+        nullable=False, default=0, server_default="0"
+    )
+    completed_tasks: Mapped[int] = mapped_column(
+        nullable=False, default=0, server_default="0"
+    )
+    next_deadline: Mapped[datetime] = mapped_column(AwareDateTime, nullable=True)
+
+    # Indexes lead with the tenant as every query of a request is scoped to it
+    __table_args__ = (
+        Index(
+            "ix_projects_tenant_id_parent_project_id", "tenant_id", "parent_project_id"
+        ),
+        Index("ix_projects_tenant_id_status", "tenant_id", "status"),
     )
 
     # Used for pretty printing with errors
@@ -72,35 +105,242 @@ class Tasks(
     HasStatus,
     HasOptionalStartAndDeadlineDates,
     HasRepeatFields,
+    HasTenant,
+    HasVersion,
     DatabaseBaseModel,
 ):
     __tablename__ = "tasks"
 
     # Fields - Note several fields are inherited as mixin
     project_id = sqlalchemy.Column(
-        sqlalchemy.UUID, sqlalchemy.ForeignKey("projects.id"), nullable=True
+        sqlalchemy.Uuid, sqlalchemy.ForeignKey("projects.id"), nullable=True
     )
     parent_task_id: Mapped[UUID] = mapped_column(ForeignKey("tasks.id"), nullable=True)
+    # Fractional index key ordering tasks within the same project/parent task.
+    # Keys must sort by byte value hence C collation. See util_fractional_index.py
+    position: Mapped[str] = mapped_column(
+        String().with_variant(String(collation="C"), "postgresql"), nullable=False
+    )
+    # Set when the task is deleted. Deleted tasks are left out of every read and
+    # moved to archived_tasks by python -m app.commands.archive_tasks
+    deleted_at: Mapped[datetime] = mapped_column(AwareDateTime, nullable=True)
     child_task = relationship("Tasks")
     parent_project = relationship("Projects")
 
-    # Define indexes and constraints
+    # Define indexes and constraints. With TASK_PARTITIONING the migrations
+    # partition the table on created_at and replace the keys, see task_partitions.py
+    # Indexes used by requests lead with the tenant as their queries are scoped to it
     __table_args__ = (
+        # One of the two must be not null
         CheckConstraint("coalesce(project_id , parent_task_id) is not null"),
-    )  # One of the two must be not null
+        # Used to list the tasks of a project and recalculate its next deadline rollup
+        Index(
+            "ix_tasks_tenant_id_project_id_deadline_date",
+            "tenant_id",
+            "project_id",
+            "deadline_date",
+        ),
+        # Used to list and walk subtasks in sibling order
+        Index(
+            "ix_tasks_tenant_id_parent_task_id_position",
+            "tenant_id",
+            "parent_task_id",
+            "position",
+        ),
+        # Used to filter tasks by status and deadline
+        Index(
+            "ix_tasks_tenant_id_status_deadline_date",
+            "tenant_id",
+            "status",
+            "deadline_date",
+        ),
+        # Used to find the deleted tasks to archive across all tenants
+        Index("ix_tasks_deleted_at", "deleted_at"),
+        # Deferred so a list of siblings can be rebalanced in one transaction.
+        # SQLite can not defer unique constraints so it is only created on Postgres
+        UniqueConstraint(
+            "project_id",
+            "parent_task_id",
+            "position",
+            name="uq_tasks_sibling_position",
+            postgresql_nulls_not_distinct=True,
+            deferrable=True,
+            initially="DEFERRED",
+        ).ddl_if(dialect="postgresql"),
+    )
 
     # Used for pretty printing with errors
     __repr_attrs__ = ["name"]  # we want to display name in repr string
 
 
+class ArchivedTasks(
+    HasCommonFields,
+    HasOptionalDescription,
+    HasStatus,
+    HasOptionalStartAndDeadlineDates,
+    HasRepeatFields,
+    HasTenant,
+    HasVersion,
+    DatabaseBaseModel,
+):
+    """Tasks completed or deleted long ago, moved out of the tasks table so its
+    indexes only cover tasks in use. Same columns as Tasks without the foreign keys
+    as the parent task or project may be gone. See task_archive.py"""
+
+    __tablename__ = "archived_tasks"
+
+    project_id: Mapped[UUID] = mapped_column(nullable=True, index=True)
+    parent_task_id: Mapped[UUID] = mapped_column(nullable=True, index=True)
+    position: Mapped[str] = mapped_column(
+        String().with_variant(String(collation="C"), "postgresql"), nullable=False
+    )
+    deleted_at: Mapped[datetime] = mapped_column(AwareDateTime, nullable=True)
+    archived_at: Mapped[datetime] = mapped_column(AwareDateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_archived_tasks_tenant_id_project_id", "tenant_id", "project_id"),
+    )
+    __repr_attrs__ = ["name"]
+
+
+# Tasks together with the archived tasks, selected as Tasks instances. Used to list
+# tasks with include_archived
+TasksIncludingArchived = aliased(
+    Tasks,
+    union_all(
+        select(Tasks.__table__),
+        select(*(ArchivedTasks.__table__.c[column.key] for column in Tasks.__table__.c)),
+    ).subquery("tasks_including_archived"),
+    name="TasksIncludingArchived",
+)
+
+
 class Taskfilters(
     HasCommonFields,
+    HasTenant,
+    HasVersion,
     DatabaseBaseModel,
 ):
     __tablename__ = "taskfilters"
 
     # Fields - Note several fields are inherited as mixin
-    rules = sqlalchemy.Column(JSONB, nullable=False)
+    rules = sqlalchemy.Column(PortableJSON, nullable=False)
+    # Materialized filters keep their matching task ids in taskfilter_members.
+    # See filter_memberships.py
+    materialized: Mapped[bool] = mapped_column(
+        nullable=False, default=False, server_default=sqlalchemy.false()
+    )
+
+    __table_args__ = (Index("ix_taskfilters_tenant_id_name", "tenant_id", "name"),)
 
     # Used for pretty printing with errors
     __repr_attrs__ = ["name"]  # we want to display name in repr string
+
+
+class TaskfilterMembers(DatabaseBaseModel):
+    """Tasks matching a materialized saved filter"""
+
+    __tablename__ = "taskfilter_members"
+
+    filter_id: Mapped[UUID] = mapped_column(
+        ForeignKey("taskfilters.id", ondelete="CASCADE"), primary_key=True
+    )
+    task_id: Mapped[UUID] = mapped_column(
+        ForeignKey("tasks.id", ondelete="CASCADE"), primary_key=True, index=True
+    )
+
+    __repr_attrs__ = ["filter_id", "task_id"]
+
+
+class IdempotencyKeys(DatabaseBaseModel):
+    """Stored response of a request sent with an Idempotency-Key header so retries
+    of the request get the same response without running it again. A row without
+    a status code is a request that is still in progress. See IdempotencyMiddleware
+    """
+
+    __tablename__ = "idempotency_keys"
+
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)
+    # SHA-256 of the method, path, query string and body of the request
+    request_hash: Mapped[str] = mapped_column(String(64), nullable=False)
+    status_code: Mapped[int] = mapped_column(nullable=True)
+    # Headers of the response as [name, value] pairs, replayed with the body
+    response_headers: Mapped[list] = mapped_column(PortableJSON, nullable=True)
+    response_body: Mapped[bytes] = mapped_column(
+        sqlalchemy.LargeBinary, nullable=True
+    )
+    expires_at: Mapped[datetime] = mapped_column(
+        AwareDateTime, nullable=False, index=True
+    )
+
+    __repr_attrs__ = ["key"]
+
+
+class AuditLog(HasTenant, DatabaseBaseModel):
+    """Field level changes made to a record. Rows are written in batches by
+    AuditWriter and kept after the record itself is deleted"""
+
+    __tablename__ = "audit_log"
+
+    id: Mapped[UUID] = mapped_column(primary_key=True, default=uuid4)
+    # Table name of the changed record e.g. tasks
+    entity_type: Mapped[str] = mapped_column(String(50), nullable=False)
+    entity_id: Mapped[UUID] = mapped_column(nullable=False)
+    action: Mapped[str] = mapped_column(String(10), nullable=False)
+    # Field name to [old value, new value]. Created records have no old values and
+    # deleted records no new values
+    changes: Mapped[dict] = mapped_column(PortableJSON, nullable=False)
+    changed_at: Mapped[datetime] = mapped_column(AwareDateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_audit_log_entity_id_changed_at", "entity_id", "changed_at"),
+    )
+    __repr_attrs__ = ["entity_type", "entity_id", "action"]
+
+
+class OutboxEvents(DatabaseBaseModel):
+    """Changes waiting to be delivered to downstream systems. Written in the same
+    transaction as the change and deleted once delivered. See outbox.py"""
+
+    __tablename__ = "outbox_events"
+
+    # Increasing id so events are delivered in the order they were written
+    id: Mapped[int] = mapped_column(
+        sqlalchemy.BigInteger().with_variant(sqlalchemy.Integer, "sqlite"),
+        primary_key=True,
+        autoincrement=True,
+    )
+    # e.g. tasks.update
+    event_type: Mapped[str] = mapped_column(String(50), nullable=False)
+    entity_id: Mapped[UUID] = mapped_column(nullable=False)
+    # The record after the change or before it for deletes
+    payload: Mapped[dict] = mapped_column(PortableJSON, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(AwareDateTime, nullable=False)
+
+    __repr_attrs__ = ["id", "event_type", "entity_id"]
+
+
+# Full text search vector over name and description. Added with DDL rather than
+# mapped on the models so it is never loaded with the rows. Queried through
+# app.repository_layer.util_full_text_search
+SEARCH_VECTOR_EXPRESSION = (
+    "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'B')"
+)
+for _table in (Projects.__table__, Tasks.__table__):
+    event.listen(
+        _table,
+        "after_create",
+        DDL(
+            "ALTER TABLE %(table)s ADD COLUMN search_vector tsvector "
+            f"GENERATED ALWAYS AS ({SEARCH_VECTOR_EXPRESSION}) STORED"
+        ).execute_if(dialect="postgresql"),
+    )
+    event.listen(
+        _table,
+        "after_create",
+        DDL(
+            "CREATE INDEX ix_%(table)s_search_vector ON %(table)s "
+            "USING gin (search_vector)"
+        ).execute_if(dialect="postgresql"),
+    )
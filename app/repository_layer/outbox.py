@@ -0,0 +1,194 @@
+"""Transactional outbox delivering record changes to downstream systems.
+
+Repositories add an outbox event with add_outbox_event in the same transaction as
+the change so an event exists if and only if the change was committed. Set based
+statements add one event per changed row with add_outbox_events. The relay
+(python -m app.commands.relay_outbox) reads the oldest events in batches with
+SELECT ... FOR UPDATE SKIP LOCKED, hands them to a sink and deletes them in the
+same transaction. Several relays can run side by side as each one skips the
+batches locked by the others. Delivery is at least once: a relay that fails after
+the sink accepted a batch delivers it again, so sinks should ignore repeated event
+ids. SQLite has no row locks so run a single relay against it.
+
+Only written when OUTBOX_ENABLED is set. Enable it together with a running relay
+as undelivered events stay in the table."""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any
+
+from pydantic_core import to_jsonable_python
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core_layer.config import settings
+from app.repository_layer.audit_database_repository import column_values
+from app.repository_layer.models.models import DatabaseBaseModel, OutboxEvents
+from app.repository_layer.outbox_sinks import OutboxSink
+
+logger = logging.getLogger(__name__)
+
+
+async def add_outbox_event(
+    session: AsyncSession,
+    model: DatabaseBaseModel,
+    action: str,
+    payload: dict[str, Any] = None,
+) -> None:
+    """Adds an event for a created, updated or deleted record to the session.
+    Flushes the session first so the payload has the values written by the change.
+    Caller is responsible for commit.
+    Args:
+        session: Session the record was changed in
+        model: The changed record
+        action: create, update or delete
+        payload: Column values of the record. Defaults to the current values, pass
+            the values read before the change for deletes
+    """
+    if not settings.OUTBOX_ENABLED:
+        return
+    if payload is None:
+        await session.flush()
+        payload = column_values(model)
+    session.add(
+        OutboxEvents(
+            event_type=f"{model.__tablename__}.{action}",
+            entity_id=model.id,
+            payload=to_jsonable_python(payload),
+            created_at=datetime.now(tz=timezone.utc),
+        )
+    )
+
+
+async def add_outbox_events(
+    session: AsyncSession, entity_type: str, action: str, payloads: list[dict]
+) -> None:
+    """Adds an event for every record changed by one set based statement with a
+    single multi-row INSERT. Caller is responsible for commit.
+    Args:
+        session: Session the records were changed in
+        entity_type: Table name of the records e.g. tasks
+        action: create, update or delete
+        payloads: Column values of each changed record, e.g. from RETURNING
+    """
+    if not settings.OUTBOX_ENABLED or not payloads:
+        return
+    created_at = datetime.now(tz=timezone.utc)
+    await session.execute(
+        insert(OutboxEvents),
+        [
+            {
+                "event_type": f"{entity_type}.{action}",
+                "entity_id": payload["id"],
+                "payload": to_jsonable_python(payload),
+                "created_at": created_at,
+            }
+            for payload in payloads
+        ],
+    )
+
+
+@dataclass
+class RelayMetrics:
+    """Counters of one relay since it started"""
+
+    delivered: int = 0
+    batches: int = 0
+    failed_batches: int = 0
+    # Seconds between writing the oldest event of the last batch and delivering it
+    lag_seconds: float = 0.0
+    started_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def events_per_second(self) -> float:
+        elapsed = time.monotonic() - self.started_at
+        return self.delivered / elapsed if elapsed > 0 else 0.0
+
+
+class OutboxRelay:
+    """Moves outbox events to a sink in batches"""
+
+    def __init__(
+        self, session_factory: async_sessionmaker, sink: OutboxSink, batch_size: int
+    ):
+        self.session_factory = session_factory
+        self.sink = sink
+        self.batch_size = batch_size
+        self.metrics = RelayMetrics()
+
+    async def relay_batch(self) -> int:
+        """Delivers the oldest batch of events not locked by another relay.
+        Events stay in the outbox if the sink fails.
+        Returns:
+            Number of events delivered
+        """
+        async with self.session_factory() as session:
+            events = (
+                await session.scalars(
+                    select(OutboxEvents)
+                    .order_by(OutboxEvents.id)
+                    .limit(self.batch_size)
+                    .with_for_update(skip_locked=True)
+                )
+            ).all()
+            if not events:
+                return 0
+            oldest_created_at = events[0].created_at
+            event_ids = [event.id for event in events]
+            try:
+                await self.sink.send(
+                    [
+                        {
+                            "id": event.id,
+                            "event_type": event.event_type,
+                            "entity_id": str(event.entity_id),
+                            "payload": event.payload,
+                            "created_at": event.created_at.isoformat(),
+                        }
+                        for event in events
+                    ]
+                )
+            except Exception:
+                self.metrics.failed_batches += 1
+                await session.rollback()
+                raise
+            await session.execute(
+                delete(OutboxEvents).where(OutboxEvents.id.in_(event_ids))
+            )
+            await session.commit()
+        self.metrics.delivered += len(event_ids)
+        self.metrics.batches += 1
+        self.metrics.lag_seconds = (
+            datetime.now(tz=timezone.utc) - oldest_created_at
+        ).total_seconds()
+        return len(event_ids)
+
+    async def pending(self) -> tuple[int, float]:
+        """Number of undelivered events and the age in seconds of the oldest one"""
+        async with self.session_factory() as session:
+            count, oldest = (
+                await session.execute(
+                    select(func.count(), func.min(OutboxEvents.created_at))
+                )
+            ).one()
+        if oldest is None:
+            return 0, 0.0
+        return count, (datetime.now(tz=timezone.utc) - oldest).total_seconds()
+
+    async def run(self, poll_interval_seconds: float, stop: asyncio.Event) -> None:
+        """Relays batches until `stop` is set. Waits for new events when the
+        outbox is empty and backs off after a failed batch"""
+        while not stop.is_set():
+            try:
+                delivered = await self.relay_batch()
+            except Exception:
+                logger.exception("Failed to deliver outbox events")
+                delivered = 0
+            if delivered < self.batch_size:
+                try:
+                    await asyncio.wait_for(stop.wait(), poll_interval_seconds)
+                except TimeoutError:
+                    pass
@@ -0,0 +1,49 @@
+"""Destinations the outbox relay delivers events to. A sink receives a batch of
+events as JSON compatible dictionaries and raises if the batch was not accepted,
+in which case the relay delivers it again later."""
+
+import asyncio
+import json
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+
+class OutboxSink(ABC):
+    @abstractmethod
+    async def send(self, events: list[dict]) -> None:
+        pass
+
+
+class FileSink(OutboxSink):
+    """Appends events to a file as newline delimited JSON. A stand in for the
+    downstream systems in development and tests"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+
+    async def send(self, events: list[dict]) -> None:
+        lines = "".join(json.dumps(event) + "\n" for event in events)
+        await asyncio.to_thread(self._append, lines)
+
+    def _append(self, lines: str) -> None:
+        with self.path.open("a", encoding="utf-8") as file:
+            file.write(lines)
+
+
+class WebhookSink(OutboxSink):
+    """POSTs each batch as a JSON array to a URL. Any status other than 2xx fails
+    the batch. Needs httpx"""
+
+    def __init__(self, url: str, timeout_seconds: float):
+        # Imported here so httpx is only needed when the webhook sink is used
+        import httpx
+
+        self.url = url
+        self._client = httpx.AsyncClient(timeout=timeout_seconds)
+
+    async def send(self, events: list[dict]) -> None:
+        response = await self._client.post(self.url, json=events)
+        response.raise_for_status()
+
+    async def close(self) -> None:
+        await self._client.aclose()
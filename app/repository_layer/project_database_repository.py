@@ -1,12 +1,18 @@
 from uuid import UUID
 
 from pydantic import BaseModel as BaseSchemaModel
-from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
 from app.repository_layer.abstract_database_repository import (
     AbstractDatabaseRepository,
     CrudActions,
 )
+from app.repository_layer.exceptions_repository import TasklyRepositoryException
+from app.repository_layer.filter_memberships import (
+    apply_filter_memberships,
+    changed_fields,
+    record_project_tree_change,
+)
 from app.repository_layer.models.models import DatabaseBaseModel, Projects
 
 
@@ -56,5 +62,30 @@ class ProjectDatabaseRepository(AbstractDatabaseRepository):
         model: DatabaseBaseModel = None,
         request_data: BaseSchemaModel = None,
         request_id: UUID = None,
+        changes: dict = None,
     ) -> BaseSchemaModel:
         pass
+
+    async def pre_commit_processing(
+        self,
+        session: AsyncSession,
+        request_action: CrudActions,
+        model: DatabaseBaseModel,
+    ) -> None:
+        """Saved filters match tasks by project name and project tree so renamed or
+        moved projects rebuild the materialized filters that use them"""
+        changed = changed_fields(model) if request_action is CrudActions.UPDATE else set()
+        # The foreign key still accepts parent projects of another tenant
+        if (
+            request_action is CrudActions.CREATE or "parent_project_id" in changed
+        ) and model.parent_project_id is not None:
+            with session.no_autoflush:
+                parent = await session.get(Projects, model.parent_project_id)
+            if parent is None:
+                raise TasklyRepositoryException(
+                    error_message=f"Resource not found with id:{model.parent_project_id}",
+                    status_code=404,
+                )
+        if changed & {"name", "parent_project_id"}:
+            record_project_tree_change(session)
+            await apply_filter_memberships(session)
@@ -0,0 +1,151 @@
+"""Keeps the denormalized task rollup columns on Projects in step with task changes.
+
+Task changes are queued on the session with record_task_change and applied in one
+batch by apply_project_rollups just before the transaction commits. Only tasks that
+are directly linked to a project (project_id set) and not soft deleted are counted."""
+
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterable, NamedTuple
+from uuid import UUID
+
+from sqlalchemy import bindparam, func, select, update, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.repository_layer.models.enumerations import TaskAndProjectStatuses
+from app.repository_layer.models.models import Projects, Tasks
+
+_PENDING_ROLLUPS_KEY = "pending_project_rollups"
+
+
+class TaskRollupState(NamedTuple):
+    """The task fields the project rollups depend on"""
+
+    project_id: UUID | None
+    status: TaskAndProjectStatuses
+    deadline_date: datetime | None
+
+    @property
+    def is_completed(self) -> bool:
+        return self.status is TaskAndProjectStatuses.completed
+
+    @property
+    def has_open_deadline(self) -> bool:
+        return self.deadline_date is not None and not self.is_completed
+
+
+@dataclass
+class _ProjectRollupDelta:
+    total_tasks: int = 0
+    completed_tasks: int = 0
+    next_deadline_changed: bool = False
+
+
+def record_task_change(
+    session: AsyncSession,
+    before: TaskRollupState | None,
+    after: TaskRollupState | None,
+) -> None:
+    """Queues the rollup changes caused by a single task change on the session.
+    Args:
+        session: Session the task change is made in
+        before: State of the task before the change. None for created tasks
+        after: State of the task after the change. None for deleted tasks
+    """
+    if before == after:
+        return
+    pending = session.info.setdefault(
+        _PENDING_ROLLUPS_KEY, defaultdict(_ProjectRollupDelta)
+    )
+    if before is not None and before.project_id is not None:
+        delta = pending[before.project_id]
+        delta.total_tasks -= 1
+        delta.completed_tasks -= int(before.is_completed)
+        delta.next_deadline_changed |= before.has_open_deadline
+    if after is not None and after.project_id is not None:
+        delta = pending[after.project_id]
+        delta.total_tasks += 1
+        delta.completed_tasks += int(after.is_completed)
+        delta.next_deadline_changed |= after.has_open_deadline
+
+
+async def apply_project_rollups(session: AsyncSession) -> None:
+    """Applies all rollup changes queued on the session. Count changes are written
+    with a single executemany UPDATE and next deadlines are recalculated for the
+    affected projects only."""
+    pending = session.info.pop(_PENDING_ROLLUPS_KEY, None) or {}
+    projects = Projects.__table__
+    count_deltas = [
+        {
+            "project_pk": project_id,
+            "total_delta": delta.total_tasks,
+            "completed_delta": delta.completed_tasks,
+        }
+        for project_id, delta in pending.items()
+        if delta.total_tasks or delta.completed_tasks
+    ]
+    if count_deltas:
+        await session.execute(
+            update(projects)
+            .where(projects.c.id == bindparam("project_pk"))
+            .values(
+                total_tasks=projects.c.total_tasks + bindparam("total_delta"),
+                completed_tasks=projects.c.completed_tasks
+                + bindparam("completed_delta"),
+            ),
+            count_deltas,
+        )
+
+    deadline_project_ids = [
+        project_id
+        for project_id, delta in pending.items()
+        if delta.next_deadline_changed
+    ]
+    if deadline_project_ids:
+        await session.execute(
+            update(projects)
+            .where(projects.c.id.in_(deadline_project_ids))
+            .values(next_deadline=_next_deadline_subquery(projects))
+        )
+
+
+async def refresh_project_rollups(
+    session: AsyncSession, project_ids: Iterable[UUID] = None
+) -> None:
+    """Recalculates the rollups from the tasks table.
+    Args:
+        session: Session to run the update in. Caller is responsible for commit
+        project_ids: Projects to recalculate. Recalculates all projects if None
+    """
+    projects = Projects.__table__
+    statement = update(projects).values(
+        total_tasks=select(func.count(Tasks.id))
+        .where(Tasks.project_id == projects.c.id, Tasks.deleted_at.is_(None))
+        .scalar_subquery(),
+        completed_tasks=select(func.count(Tasks.id))
+        .where(
+            Tasks.project_id == projects.c.id,
+            Tasks.status == TaskAndProjectStatuses.completed,
+            Tasks.deleted_at.is_(None),
+        )
+        .scalar_subquery(),
+        next_deadline=_next_deadline_subquery(projects),
+    )
+    if project_ids is not None:
+        statement = statement.where(projects.c.id.in_(list(project_ids)))
+    await session.execute(statement)
+
+
+def _next_deadline_subquery(projects):
+    return (
+        select(func.min(Tasks.deadline_date))
+        .where(
+            and_(
+                Tasks.project_id == projects.c.id,
+                Tasks.status != TaskAndProjectStatuses.completed,
+                Tasks.deleted_at.is_(None),
+            )
+        )
+        .scalar_subquery()
+    )
@@ -0,0 +1,123 @@
+from typing import Iterable
+
+from sqlalchemy import func, literal, select, true, union_all
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.repository_layer.abstract_database_repository import READ_ONLY_SESSION_KEY
+from app.repository_layer.exceptions_repository import TasklyRepositoryException
+from app.repository_layer.models.models import Projects, Tasks
+from app.repository_layer.util_full_text_search import (
+    highlight,
+    prefix_tsquery,
+    search_vector,
+)
+
+# Result type name for each searchable model
+SEARCHABLE_MODELS = {"project": Projects, "task": Tasks}
+# Rows of a searchable model that can be returned. Soft deleted tasks are not
+_SEARCHABLE_ROWS = {Tasks: Tasks.deleted_at.is_(None)}
+
+
+class SearchDatabaseRepository:
+    """Ranked full text search across the searchable models"""
+
+    def __init__(self, session_factory: async_sessionmaker):
+        self._session_factory = session_factory
+
+    @property
+    def session_factory(self) -> async_sessionmaker:
+        return self._session_factory
+
+    async def search(
+        self,
+        text: str,
+        types: Iterable[str] = None,
+        limit: int = 50,
+        offset: int = 0,
+    ) -> dict:
+        """
+        Searches name and description of the searchable models in a single query.
+        Matches from every model are merged and ordered by rank. Highlights are only
+        generated for the returned page.
+
+        Args:
+            text: Words to search for. The last word is matched as a prefix
+            types: Result types to search. Searches every type if None
+            limit: Maximum number of results to return
+            offset: Number of ranked results to skip
+        Raises:
+            TasklyRepositoryException on SQLite, which has no full text search (501)
+        Returns:
+            Dictionary with the total number of matches and the page of results
+        """
+        async with self.session_factory(info={READ_ONLY_SESSION_KEY: True}) as session:
+            if session.get_bind().dialect.name != "postgresql":
+                raise TasklyRepositoryException(
+                    error_message="Search is only available with the Postgres backend",
+                    status_code=501,
+                )
+            query = prefix_tsquery(text)
+            if types is None:
+                types = SEARCHABLE_MODELS.keys()
+
+            matches = union_all(
+                *[
+                    select(
+                        literal(result_type).label("type"),
+                        model.id,
+                        model.name,
+                        model.description,
+                        func.ts_rank_cd(search_vector(model.__table__), query).label(
+                            "rank"
+                        ),
+                    ).where(
+                        search_vector(model.__table__).bool_op("@@")(query),
+                        _SEARCHABLE_ROWS.get(model, true()),
+                    )
+                    for result_type, model in SEARCHABLE_MODELS.items()
+                    if result_type in types
+                ]
+            ).subquery("matches")
+            page = (
+                select(matches, func.count().over().label("total"))
+                .order_by(matches.c.rank.desc(), matches.c.name, matches.c.id)
+                .limit(limit)
+                .offset(offset)
+                .subquery("page")
+            )
+            document = func.concat_ws(" ", page.c.name, page.c.description)
+            rows = (
+                await session.execute(
+                    select(
+                        page.c.type,
+                        page.c.id,
+                        page.c.name,
+                        page.c.description,
+                        page.c.rank,
+                        page.c.total,
+                        highlight(document, query).label("highlight"),
+                    ).order_by(page.c.rank.desc(), page.c.name, page.c.id)
+                )
+            ).all()
+            if rows:
+                total = rows[0].total
+            elif offset:
+                # Pages past the last one have no row carrying the window count
+                total = await session.scalar(select(func.count()).select_from(matches))
+            else:
+                total = 0
+
+            return {
+                "total": total,
+                "results": [
+                    {
+                        "type": row.type,
+                        "id": row.id,
+                        "name": row.name,
+                        "description": row.description,
+                        "rank": row.rank,
+                        "highlight": row.highlight,
+                    }
+                    for row in rows
+                ],
+            }
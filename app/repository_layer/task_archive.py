@@ -0,0 +1,96 @@
+"""Moves tasks completed or deleted long ago from tasks to archived_tasks.
+
+Tasks that are completed and unchanged since the cutoff, or were deleted before it,
+are copied to archived_tasks and deleted from tasks in batches, one transaction per
+batch, so the indexes of the tasks table only grow with the tasks in use. Subtasks
+are archived before their parent task: a task is only archived once it has no
+subtasks left in the tasks table, so a completed task with open subtasks stays.
+The project rollups only count the tasks table and are recalculated for the
+projects of each batch.
+
+Run with python -m app.commands.archive_tasks. Batches are selected with
+SELECT ... FOR UPDATE SKIP LOCKED so runs on Postgres can overlap."""
+
+from datetime import datetime, timezone
+
+from sqlalchemy import and_, delete, exists, insert, literal, or_, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import aliased
+
+from app.repository_layer.models.column_types import AwareDateTime
+from app.repository_layer.models.enumerations import TaskAndProjectStatuses
+from app.repository_layer.models.models import (
+    ArchivedTasks,
+    TaskfilterMembers,
+    Tasks,
+)
+from app.repository_layer.project_rollups import refresh_project_rollups
+
+
+class TaskArchiver:
+    """Archives tasks in batches"""
+
+    def __init__(self, session_factory: async_sessionmaker, batch_size: int):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+
+    async def archive_batch(self, cutoff: datetime) -> int:
+        """Archives up to batch_size tasks completed or deleted before `cutoff`
+        that have no subtasks in the tasks table.
+        Returns:
+            Number of archived tasks
+        """
+        subtasks = aliased(Tasks)
+        tasks = Tasks.__table__
+        async with self.session_factory() as session:
+            rows = (
+                await session.execute(
+                    select(Tasks.id, Tasks.project_id)
+                    .where(
+                        or_(
+                            Tasks.deleted_at < cutoff,
+                            and_(
+                                Tasks.status == TaskAndProjectStatuses.completed,
+                                Tasks.updated_at < cutoff,
+                            ),
+                        ),
+                        ~exists().where(subtasks.parent_task_id == Tasks.id),
+                    )
+                    .limit(self.batch_size)
+                    .with_for_update(skip_locked=True)
+                )
+            ).all()
+            if not rows:
+                return 0
+            task_ids = [row.id for row in rows]
+            columns = [column.key for column in tasks.c]
+            await session.execute(
+                insert(ArchivedTasks.__table__).from_select(
+                    [*columns, "archived_at"],
+                    select(
+                        *tasks.c,
+                        literal(datetime.now(tz=timezone.utc), AwareDateTime()),
+                    ).where(tasks.c.id.in_(task_ids)),
+                )
+            )
+            await session.execute(
+                delete(TaskfilterMembers).where(TaskfilterMembers.task_id.in_(task_ids))
+            )
+            await session.execute(delete(tasks).where(tasks.c.id.in_(task_ids)))
+            project_ids = {row.project_id for row in rows} - {None}
+            if project_ids:
+                await refresh_project_rollups(session, project_ids=project_ids)
+            await session.commit()
+        return len(task_ids)
+
+    async def archive(self, cutoff: datetime) -> int:
+        """Archives batches until no task completed or deleted before `cutoff` is
+        left. Parent tasks are picked up once their subtasks were archived by an
+        earlier batch.
+        Returns:
+            Number of archived tasks
+        """
+        archived = 0
+        while batch := await self.archive_batch(cutoff=cutoff):
+            archived += batch
+        return archived
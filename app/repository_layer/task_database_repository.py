@@ -1,18 +1,96 @@
-from uuid import UUID
+from datetime import datetime, timezone, timedelta
+from typing import Any, AsyncIterator, Iterable
+from uuid import UUID, uuid4
 
 from pydantic import BaseModel as BaseSchemaModel
-from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy import (
+    and_,
+    bindparam,
+    case,
+    delete,
+    func,
+    inspect,
+    literal,
+    null,
+    select,
+    tuple_,
+    type_coerce,
+    union_all,
+    update,
+)
+from sqlalchemy.sql import ColumnElement, Select
+from sqlalchemy.sql.expression import CTE, CompoundSelect, Subquery
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
 from app.repository_layer.abstract_database_repository import (
     AbstractDatabaseRepository,
     CrudActions,
 )
-from app.repository_layer.models.models import DatabaseBaseModel, Tasks
+from app.repository_layer.audit_database_repository import (
+    AuditWriter,
+    diff_values,
+)
+from app.repository_layer.exceptions_repository import TasklyRepositoryException
+from app.repository_layer.filter_memberships import (
+    apply_filter_memberships,
+    changed_fields,
+    record_task_changes,
+)
+from app.repository_layer.models.enumerations import TaskAndProjectStatuses
+from app.repository_layer.models.models import (
+    DatabaseBaseModel,
+    Projects,
+    TaskfilterMembers,
+    Tasks,
+    TasksIncludingArchived,
+)
+from app.repository_layer.outbox import add_outbox_events
+from app.repository_layer.project_rollups import (
+    TaskRollupState,
+    apply_project_rollups,
+    record_task_change,
+    refresh_project_rollups,
+)
+from app.repository_layer.util_compiled_filter_rules import (
+    ALL_RULE_FIELDS,
+    CompiledFilterRules,
+)
+from app.repository_layer.util_fractional_index import key_between, keys_between
+from app.repository_layer.util_search_manager import get_filterset
+from app.service_layer.schemas.common_field_search_schema import (
+    CommonSearchFieldsSchema,
+)
+
+# Fields of the search schemas that do not filter the tasks
+_NON_FILTER_FIELDS = {
+    "page",
+    "itemsPerPage",
+    "pagination",
+    "ordering",
+    "filter_id",
+    "dry_run",
+    "include_archived",
+}
+
+DEADLINE_BUCKETS = ("completed", "no_deadline", "overdue", "due_this_week", "later")
+
+# Bit masks returned by GROUPING(status, project_id, deadline_bucket). A set bit means
+# the column was rolled up for that row so the mask identifies the grouping set.
+_GROUPED_BY_STATUS = 0b011
+_GROUPED_BY_PROJECT = 0b101
+_GROUPED_BY_DEADLINE = 0b110
+_GROUPED_BY_NOTHING = 0b111
+
+# Session info key of the audit changes of set based statements waiting for commit
+_PENDING_AUDIT_KEY = "pending_task_audit"
 
 
 class TaskDatabaseRepository(AbstractDatabaseRepository):
-    def __init__(self, session_factory: async_sessionmaker):
+    def __init__(
+        self, session_factory: async_sessionmaker, audit_writer: AuditWriter = None
+    ):
         self._session_factory = session_factory
+        self.audit_writer = audit_writer
 
     async def create_model_obj_from_schema(
         self, schema: BaseSchemaModel
@@ -49,11 +127,1036 @@ class TaskDatabaseRepository(AbstractDatabaseRepository):
     def session_factory(self) -> async_sessionmaker:
         return self._session_factory
 
+    def filter_target(self, model: Any, params: dict) -> tuple[Any, dict]:
+        """Soft deleted tasks are left out unless include_archived is set, which
+        lists the tasks in use, the deleted tasks and the archived tasks together"""
+        if params.pop("include_archived", False):
+            return TasksIncludingArchived, params
+        return model, {**params, "exclude_deleted": True}
+
+    async def _get_by_id(
+        self, id: Any, session: AsyncSession, at_least_one_required=True
+    ) -> DatabaseBaseModel:
+        """Soft deleted tasks are not found"""
+        model = await super()._get_by_id(
+            id=id, session=session, at_least_one_required=False
+        )
+        if model is not None and model.deleted_at is not None:
+            model = None
+        if model is None and at_least_one_required:
+            raise TasklyRepositoryException(
+                error_message=f"Resource not found with id:{id}", status_code=404
+            )
+        return model
+
     async def post_processing(
         self,
         request_action: CrudActions,
         model: DatabaseBaseModel = None,
         request_data: BaseSchemaModel = None,
         request_id: UUID = None,
+        changes: dict = None,
     ) -> BaseSchemaModel:
-        pass
+        """Queues the changes of the task for its history"""
+        if changes:
+            await self.audit_writer.record(
+                entity_type=Tasks.__tablename__,
+                entity_id=model.id if model is not None else request_id,
+                action=request_action.value,
+                changes=changes,
+            )
+
+    async def pre_commit_processing(
+        self,
+        session: AsyncSession,
+        request_action: CrudActions,
+        model: DatabaseBaseModel,
+    ) -> None:
+        """Positions new and reparented tasks at the end of their sibling list and
+        keeps the project task rollups and materialized filters in step with the
+        task change"""
+        # Read before any query below autoflushes the change
+        changed = changed_fields(model) if request_action is CrudActions.UPDATE else set()
+        if request_action is CrudActions.CREATE or (
+            request_action is CrudActions.UPDATE
+            and _sibling_group_changed(model=model)
+        ):
+            # The model is pending so it must not be flushed before it has a position
+            with session.no_autoflush:
+                # The foreign keys still accept parents that were soft deleted or
+                # belong to another tenant
+                if model.parent_task_id is not None:
+                    parent = (
+                        await session.execute(
+                            select(Tasks.deleted_at).where(Tasks.id == model.parent_task_id)
+                        )
+                    ).first()
+                    if parent is None or parent.deleted_at is not None:
+                        raise TasklyRepositoryException(
+                            error_message=f"Resource not found with id:{model.parent_task_id}",
+                            status_code=404,
+                        )
+                if (
+                    model.project_id is not None
+                    and await session.get(Projects, model.project_id) is None
+                ):
+                    raise TasklyRepositoryException(
+                        error_message=f"Resource not found with id:{model.project_id}",
+                        status_code=404,
+                    )
+                last_position = await session.scalar(
+                    select(func.max(Tasks.position)).where(
+                        _sibling_clause(
+                            project_id=model.project_id,
+                            parent_task_id=model.parent_task_id,
+                        )
+                    )
+                )
+            model.position = key_between(last_position, None)
+
+        before = after = None
+        if request_action in (CrudActions.UPDATE, CrudActions.DELETE):
+            before = _committed_rollup_state(model)
+        if request_action in (CrudActions.CREATE, CrudActions.UPDATE):
+            after = TaskRollupState(
+                project_id=model.project_id,
+                status=model.status,
+                deadline_date=model.deadline_date,
+            )
+        record_task_change(session=session, before=before, after=after)
+        await apply_project_rollups(session)
+
+        if request_action is CrudActions.CREATE:
+            # Assigned now rather than on flush so the change can be queued
+            if model.id is None:
+                model.id = uuid4()
+            record_task_changes(session, task_ids=[model.id], fields=ALL_RULE_FIELDS)
+        elif request_action is CrudActions.UPDATE:
+            record_task_changes(session, task_ids=[model.id], fields=changed)
+        await apply_filter_memberships(session)
+
+    async def move(
+        self,
+        id: UUID,
+        before_id: UUID = None,
+        after_id: UUID = None,
+        commit: bool = True,
+    ) -> dict:
+        """
+        Moves a task within its sibling list by giving it a new fractional position.
+        Only the moved task is written.
+
+        Args:
+            id: Id of the task to move
+            before_id: Sibling the task is placed directly before
+            after_id: Sibling the task is placed directly after
+            commit: If `True`, commits the transaction immediately. Default is `True`.
+        Raises:
+            TasklyRepositoryException if a sibling does not exist, is not a sibling
+            or, when both are given, the siblings are not next to each other
+        Returns:
+            Dictionary of the moved task
+        """
+        async with self.session_factory() as session:
+            model = await self._get_by_id(session=session, id=id)
+            siblings = _sibling_clause(
+                project_id=model.project_id, parent_task_id=model.parent_task_id
+            )
+
+            neighbour_ids = [i for i in (before_id, after_id) if i is not None]
+            neighbours = {
+                row.id: row
+                for row in await session.execute(
+                    select(
+                        Tasks.id, Tasks.project_id, Tasks.parent_task_id, Tasks.position
+                    ).where(Tasks.id.in_(neighbour_ids), Tasks.deleted_at.is_(None))
+                )
+            }
+            for neighbour_id in neighbour_ids:
+                neighbour = neighbours.get(neighbour_id)
+                if neighbour is None:
+                    raise TasklyRepositoryException(
+                        error_message=f"Resource not found with id:{neighbour_id}",
+                        status_code=404,
+                    )
+                if neighbour_id == id or (
+                    neighbour.project_id != model.project_id
+                    or neighbour.parent_task_id != model.parent_task_id
+                ):
+                    raise TasklyRepositoryException(
+                        error_message=f"Task {neighbour_id} is not a sibling of task "
+                        f"{id}",
+                        status_code=422,
+                    )
+
+            lower = neighbours[after_id].position if after_id is not None else None
+            upper = neighbours[before_id].position if before_id is not None else None
+            if after_id is None:
+                lower = await session.scalar(
+                    select(func.max(Tasks.position)).where(
+                        siblings, Tasks.position < upper, Tasks.id != id
+                    )
+                )
+            elif before_id is None:
+                upper = await session.scalar(
+                    select(func.min(Tasks.position)).where(
+                        siblings, Tasks.position > lower, Tasks.id != id
+                    )
+                )
+            elif lower >= upper:
+                raise TasklyRepositoryException(
+                    error_message=f"Task {after_id} must be ordered before task {before_id}",
+                    status_code=422,
+                )
+            elif (
+                await session.scalar(
+                    select(func.min(Tasks.position)).where(
+                        siblings, Tasks.position > lower, Tasks.id != id
+                    )
+                )
+                != upper
+            ):
+                # A key between them would equal the key of a sibling in between
+                raise TasklyRepositoryException(
+                    error_message=f"Task {before_id} must directly follow task {after_id}",
+                    status_code=422,
+                )
+
+            model.position = key_between(lower, upper)
+            record_task_changes(session, task_ids=[id], fields={"position"})
+            await apply_filter_memberships(session)
+            if commit:
+                await session.commit()
+            else:
+                await session.flush()
+            await session.refresh(model)
+            return await self.dump_model_to_dict(model)
+
+    async def rebalance_positions(
+        self,
+        project_id: UUID = None,
+        parent_task_id: UUID = None,
+        commit: bool = True,
+    ) -> None:
+        """
+        Rewrites the positions of a sibling list with short evenly spaced keys
+        keeping the current order. Used when repeated moves made keys long.
+
+        Args:
+            project_id: Project of the sibling list
+            parent_task_id: Parent task of the sibling list
+            commit: If `True`, commits the transaction immediately. Default is `True`.
+        """
+        async with self.session_factory() as session:
+            await self._rebalance_positions(
+                session=session, project_id=project_id, parent_task_id=parent_task_id
+            )
+            if commit:
+                await session.commit()
+            else:
+                await session.flush()
+
+    async def move_subtree(
+        self,
+        id: UUID,
+        project_id: UUID = None,
+        parent_task_id: UUID = None,
+        commit: bool = True,
+    ) -> dict:
+        """
+        Moves a task and all of its subtasks to another project and/or parent task.
+        Every task in the subtree is linked to the new project using one set based
+        UPDATE. The moved task is placed at the end of its new sibling list.
+
+        Args:
+            id: Id of the root task of the subtree
+            project_id: Project to move the subtree to. Defaults to the project of
+                the new parent task
+            parent_task_id: New parent task. None makes the task a top level task
+            commit: If `True`, commits the transaction immediately. Default is `True`.
+        Raises:
+            TasklyRepositoryException if the project or parent task does not exist or
+            the parent task is part of the moved subtree
+        Returns:
+            Dictionary of the moved root task
+        """
+        async with self.session_factory() as session:
+            model = await self._get_by_id(session=session, id=id)
+            subtree = _subtree_cte(roots=Tasks.id == id)
+
+            if parent_task_id is not None:
+                parent = await self._get_by_id(session=session, id=parent_task_id)
+                if await session.scalar(
+                    select(subtree.c.id).where(subtree.c.id == parent_task_id)
+                ):
+                    raise TasklyRepositoryException(
+                        error_message=f"Task {parent_task_id} is part of the subtree of task {id}",
+                        status_code=422,
+                    )
+                if project_id is None:
+                    project_id = parent.project_id
+            if (
+                project_id is not None
+                and await session.get(Projects, project_id) is None
+            ):
+                raise TasklyRepositoryException(
+                    error_message=f"Resource not found with id:{project_id}",
+                    status_code=404,
+                )
+            if project_id is None and parent_task_id is None:
+                raise TasklyRepositoryException(
+                    error_message="Tasks requires either a project_id or "
+                    "parent_task_id",
+                    status_code=422,
+                )
+
+            affected_project_ids = set(
+                await session.scalars(select(subtree.c.project_id).distinct())
+            )
+            affected_project_ids.add(project_id)
+            last_position = await session.scalar(
+                select(func.max(Tasks.position)).where(
+                    _sibling_clause(
+                        project_id=project_id, parent_task_id=parent_task_id
+                    ),
+                    Tasks.id != id,
+                )
+            )
+
+            before = await self._values_before(
+                session,
+                ids=select(subtree.c.id),
+                fields=("project_id", "parent_task_id", "position"),
+            )
+            tasks = Tasks.__table__
+            moved = {
+                row.id: row
+                for row in await session.execute(
+                    update(tasks)
+                    .where(tasks.c.id.in_(select(subtree.c.id)))
+                    .values(project_id=project_id, version=tasks.c.version + 1)
+                    .returning(*tasks.c)
+                )
+            }
+            moved[id] = (
+                await session.execute(
+                    update(tasks)
+                    .where(tasks.c.id == id)
+                    .values(
+                        parent_task_id=parent_task_id,
+                        position=key_between(last_position, None),
+                    )
+                    .returning(*tasks.c)
+                )
+            ).one()
+            # Subtasks of one parent that were linked to different projects now share
+            # a sibling list so their positions can clash
+            clashing_parent_ids = (
+                await session.scalars(
+                    select(Tasks.parent_task_id)
+                    .distinct()
+                    .where(Tasks.parent_task_id.in_(select(subtree.c.id)))
+                    .group_by(Tasks.parent_task_id, Tasks.position)
+                    .having(func.count(Tasks.id) > 1)
+                )
+            ).all()
+            for clashing_parent_id in clashing_parent_ids:
+                await self._rebalance_positions(
+                    session=session,
+                    project_id=project_id,
+                    parent_task_id=clashing_parent_id,
+                )
+
+            affected_project_ids.discard(None)
+            await refresh_project_rollups(session, project_ids=affected_project_ids)
+            record_task_changes(session, task_ids=moved, fields={"project_id"})
+            await apply_filter_memberships(session)
+            await self._record_set_change(
+                session,
+                action=CrudActions.UPDATE,
+                rows=moved.values(),
+                before=before,
+            )
+            if commit:
+                await session.commit()
+            else:
+                await session.flush()
+            await self._audit_set_changes(session)
+            await session.refresh(model)
+            return await self.dump_model_to_dict(model)
+
+    async def complete_subtree(self, id: UUID, commit: bool = True) -> dict:
+        """
+        Marks a task and all of its subtasks as completed using one set based UPDATE.
+
+        Args:
+            id: Id of the root task of the subtree
+            commit: If `True`, commits the transaction immediately. Default is `True`.
+        Raises:
+            TasklyRepositoryException if the task does not exist
+        Returns:
+            Dictionary of the completed root task
+        """
+        async with self.session_factory() as session:
+            model = await self._get_by_id(session=session, id=id)
+            subtree = _subtree_cte(roots=Tasks.id == id)
+
+            before = await self._values_before(
+                session, ids=select(subtree.c.id), fields=("status",)
+            )
+            tasks = Tasks.__table__
+            completed = (
+                await session.execute(
+                    update(tasks)
+                    .where(
+                        tasks.c.id.in_(select(subtree.c.id)),
+                        tasks.c.status != TaskAndProjectStatuses.completed,
+                        tasks.c.deleted_at.is_(None),
+                    )
+                    .values(
+                        status=TaskAndProjectStatuses.completed,
+                        version=tasks.c.version + 1,
+                    )
+                    .returning(*tasks.c)
+                )
+            ).all()
+            affected_project_ids = {row.project_id for row in completed} - {None}
+            if affected_project_ids:
+                await refresh_project_rollups(session, project_ids=affected_project_ids)
+            record_task_changes(
+                session, task_ids=[row.id for row in completed], fields={"status"}
+            )
+            await apply_filter_memberships(session)
+            await self._record_set_change(
+                session, action=CrudActions.UPDATE, rows=completed, before=before
+            )
+            if commit:
+                await session.commit()
+            else:
+                await session.flush()
+            await self._audit_set_changes(session)
+            await session.refresh(model)
+            return await self.dump_model_to_dict(model)
+
+    async def delete(
+        self,
+        id: UUID,
+        commit: bool = True,
+    ) -> None:
+        """
+        Soft deletes a task and all of its subtasks using one set based UPDATE of
+        deleted_at. Deleted tasks are moved to the archive later, see task_archive.py
+
+        Args:
+            id: UUID of the root task of the subtree to delete
+            commit: If `True`, commits the transaction immediately. Default is `True`.
+        Raises:
+            TasklyRepositoryException if the task does not exist
+        Returns:
+            None
+        """
+        async with self.session_factory() as session:
+            await self._get_by_id(session=session, id=id)
+            await self.validate(request_id=id, request_action=CrudActions.DELETE)
+            await self._delete_subtrees(session=session, roots=Tasks.id == id)
+            if commit:
+                await session.commit()
+            else:
+                await session.flush()
+            await self._audit_set_changes(session)
+            return None
+
+    async def bulk_update(
+        self,
+        values: dict,
+        filter_params: CommonSearchFieldsSchema = None,
+        rules: CompiledFilterRules = None,
+        dry_run: bool = False,
+        commit: bool = True,
+    ) -> dict:
+        """
+        Updates every task matching the search fields and saved filter rules with a
+        single set based UPDATE.
+
+        Args:
+            values: Column values to set on the matching tasks
+            filter_params: Common search fields selecting the tasks. Pagination is ignored
+            rules: Saved filter rules selecting the tasks
+            dry_run: If `True`, only counts the tasks that would be updated
+            commit: If `True`, commits the transaction immediately. Default is `True`.
+        Returns:
+            Dictionary with the matched task count and an upper bound on rows touched
+            including the project rollup rows
+        """
+        async with self.session_factory() as session:
+            matches = self._search_clause(
+                session=session, filter_params=filter_params, rules=rules
+            )
+            if dry_run:
+                counts = (
+                    await session.execute(
+                        select(
+                            func.count(Tasks.id).label("matched"),
+                            func.count(Tasks.project_id.distinct()).label("projects"),
+                        ).where(matches)
+                    )
+                ).one()
+                return _bulk_result(
+                    matched=counts.matched, projects=counts.projects, dry_run=True
+                )
+
+            before = await self._values_before(
+                session, ids=select(Tasks.id).where(matches), fields=values
+            )
+            tasks = Tasks.__table__
+            updated = (
+                await session.execute(
+                    update(tasks)
+                    .where(tasks.c.id.in_(select(Tasks.id).where(matches)))
+                    .values(**values, version=tasks.c.version + 1)
+                    .returning(*tasks.c)
+                )
+            ).all()
+            affected_project_ids = {row.project_id for row in updated} - {None}
+            if affected_project_ids:
+                await refresh_project_rollups(session, project_ids=affected_project_ids)
+            record_task_changes(
+                session, task_ids=[row.id for row in updated], fields=values
+            )
+            await apply_filter_memberships(session)
+            await self._record_set_change(
+                session, action=CrudActions.UPDATE, rows=updated, before=before
+            )
+            if commit:
+                await session.commit()
+            else:
+                await session.flush()
+            await self._audit_set_changes(session)
+            return _bulk_result(
+                matched=len(updated),
+                projects=len(affected_project_ids),
+                dry_run=False,
+            )
+
+    async def bulk_delete(
+        self,
+        filter_params: CommonSearchFieldsSchema = None,
+        rules: CompiledFilterRules = None,
+        dry_run: bool = False,
+        commit: bool = True,
+    ) -> dict:
+        """
+        Soft deletes every task matching the search fields and saved filter rules
+        along with their subtasks using a single set based UPDATE.
+
+        Args:
+            filter_params: Common search fields selecting the tasks. Pagination is ignored
+            rules: Saved filter rules selecting the tasks
+            dry_run: If `True`, only counts the tasks that would be deleted
+            commit: If `True`, commits the transaction immediately. Default is `True`.
+        Returns:
+            Dictionary with the matched task count and an upper bound on rows touched
+            including subtasks and the project rollup rows
+        """
+        async with self.session_factory() as session:
+            matches = self._search_clause(
+                session=session, filter_params=filter_params, rules=rules
+            )
+            matched = await session.scalar(select(func.count(Tasks.id)).where(matches))
+            if dry_run:
+                subtree = _subtree_cte(roots=matches)
+                counts = (
+                    await session.execute(
+                        select(
+                            func.count().label("tasks"),
+                            func.count(subtree.c.project_id.distinct()).label(
+                                "projects"
+                            ),
+                        ).where(subtree.c.deleted_at.is_(None))
+                    )
+                ).one()
+                return _bulk_result(
+                    matched=matched,
+                    tasks=counts.tasks,
+                    projects=counts.projects,
+                    dry_run=True,
+                )
+
+            deleted, affected_project_ids = await self._delete_subtrees(
+                session=session, roots=matches
+            )
+            if commit:
+                await session.commit()
+            else:
+                await session.flush()
+            await self._audit_set_changes(session)
+            return _bulk_result(
+                matched=matched,
+                tasks=deleted,
+                projects=len(affected_project_ids),
+                dry_run=False,
+            )
+
+    async def get_subtree(
+        self,
+        id: UUID,
+        depth: int,
+        ordering: str = "position",
+        limit: int = 50,
+        offset: int = 0,
+        max_nodes: int = 1000,
+    ) -> tuple[dict, list[dict]]:
+        """
+        Returns a task and its subtasks down to `depth` levels read with one
+        recursive CTE. Subtasks are ordered level by level and by `ordering` within
+        a level so the parent of every subtask comes before it, even when the result
+        is cut off at `max_nodes`.
+
+        Args:
+            id: Id of the root task
+            depth: Number of levels of subtasks to return
+            ordering: Name of the field subtasks are sorted by within a level
+            limit: Maximum number of direct subtasks of the root task
+            offset: Number of direct subtasks of the root task to skip
+            max_nodes: Maximum number of subtasks to return
+        Raises:
+            TasklyRepositoryException if the task does not exist
+        Returns:
+            Dictionary of the root task and the list of subtask dictionaries, each
+            with its depth below the root task
+        """
+        async with self._read_session() as session:
+            model = await self._get_by_id(session=session, id=id)
+            query = _subtree_levels_query(
+                root_id=id, depth=depth, ordering=ordering, limit=limit, offset=offset
+            )
+            rows = await session.execute(query.limit(max_nodes))
+            subtasks = [
+                {**await self.dump_model_to_dict(task), "depth": task_depth}
+                for task, task_depth in rows
+            ]
+            return await self.dump_model_to_dict(model), subtasks
+
+    async def stream_subtree(
+        self,
+        id: UUID,
+        depth: int,
+        ordering: str = "position",
+        limit: int = 50,
+        offset: int = 0,
+        max_nodes: int = 100_000,
+    ) -> AsyncIterator[dict]:
+        """
+        Same subtasks as get_subtree read through a server side cursor and yielded
+        one at a time so large trees are never held in memory. The root task is
+        not included and a missing root task yields no subtasks.
+        """
+        async with self._read_session() as session:
+            query = _subtree_levels_query(
+                root_id=id, depth=depth, ordering=ordering, limit=limit, offset=offset
+            )
+            rows = await session.stream(query.limit(max_nodes))
+            async for task, task_depth in rows:
+                yield {**await self.dump_model_to_dict(task), "depth": task_depth}
+
+    async def get_filter_tasks(
+        self,
+        filter_id: UUID,
+        rules: CompiledFilterRules,
+        materialized: bool,
+        limit: int = 50,
+        offset: int = 0,
+    ) -> list[dict]:
+        """
+        Returns the tasks matching a saved filter ordered by creation. Materialized
+        filters are read by joining their membership, other filters evaluate the
+        rules against every task.
+
+        Args:
+            filter_id: Id of the saved filter
+            rules: Rules of the saved filter
+            materialized: If the filter keeps its matching tasks in taskfilter_members
+            limit: Maximum number of tasks to return
+            offset: Number of tasks to skip
+        Returns:
+            List of task dictionaries
+        """
+        async with self._read_session() as session:
+            query = select(Tasks).where(Tasks.deleted_at.is_(None))
+            if materialized:
+                query = query.join(
+                    TaskfilterMembers,
+                    and_(
+                        TaskfilterMembers.task_id == Tasks.id,
+                        TaskfilterMembers.filter_id == filter_id,
+                    ),
+                )
+            if not materialized or rules.has_relative_dates:
+                query = query.where(rules.clause())
+            models = await session.scalars(
+                query.order_by(Tasks.created_at, Tasks.id).limit(limit).offset(offset)
+            )
+            return [await self.dump_model_to_dict(model) for model in models]
+
+    def _search_clause(
+        self,
+        session: AsyncSession,
+        filter_params: CommonSearchFieldsSchema = None,
+        rules: CompiledFilterRules = None,
+        now: datetime = None,
+    ) -> ColumnElement[bool]:
+        """Where clause for Tasks combining the common search fields (pagination and
+        other non filter fields are ignored) with saved filter rules. Soft deleted
+        tasks never match"""
+        clauses = [Tasks.deleted_at.is_(None)]
+        if filter_params is not None:
+            filterset = get_filterset(Tasks)(session=session, query=select(Tasks))
+            query = filterset.filter_query(
+                filter_params.model_dump(exclude_none=True, exclude=_NON_FILTER_FIELDS)
+            )
+            if query.whereclause is not None:
+                clauses.append(query.whereclause)
+        if rules is not None:
+            clauses.append(rules.clause(now=now))
+        return and_(*clauses)
+
+    async def _delete_subtrees(
+        self, session: AsyncSession, roots: ColumnElement[bool]
+    ) -> tuple[int, set[UUID]]:
+        """Soft deletes the tasks matching `roots` with all of their subtasks,
+        removes them from the materialized filters and recalculates the rollups of
+        the affected projects. Every deleted task gets an outbox event and its
+        audit changes are queued on the session, see _record_set_change.
+        Returns the number of deleted tasks and the affected project ids"""
+        subtree = _subtree_cte(roots=roots)
+        before = await self._values_before(
+            session, ids=select(subtree.c.id), fields=("deleted_at",)
+        )
+        tasks = Tasks.__table__
+        deleted = (
+            await session.execute(
+                update(tasks)
+                .where(
+                    tasks.c.id.in_(select(subtree.c.id)),
+                    tasks.c.deleted_at.is_(None),
+                )
+                .values(
+                    deleted_at=datetime.now(tz=timezone.utc),
+                    version=tasks.c.version + 1,
+                )
+                .returning(*tasks.c)
+            )
+        ).all()
+        deleted_project_ids = [row.project_id for row in deleted]
+        await session.execute(
+            delete(TaskfilterMembers).where(
+                TaskfilterMembers.task_id.in_(select(subtree.c.id))
+            )
+        )
+        affected_project_ids = set(deleted_project_ids) - {None}
+        if affected_project_ids:
+            await refresh_project_rollups(session, project_ids=affected_project_ids)
+        await self._record_set_change(
+            session, action=CrudActions.DELETE, rows=deleted, before=before
+        )
+        return len(deleted), affected_project_ids
+
+    async def _values_before(
+        self, session: AsyncSession, ids: Select, fields: Iterable[str]
+    ) -> dict[UUID, dict] | None:
+        """Values of `fields` of the tasks selected by `ids` before a set based
+        change, keyed on task id. Only read when auditing"""
+        if self.audit_writer is None:
+            return None
+        tasks = Tasks.__table__
+        rows = await session.execute(
+            select(tasks.c.id, *(tasks.c[field] for field in fields)).where(
+                tasks.c.id.in_(ids)
+            )
+        )
+        return {row.id: row._asdict() for row in rows}
+
+    async def _record_set_change(
+        self,
+        session: AsyncSession,
+        action: CrudActions,
+        rows: Iterable,
+        before: dict[UUID, dict] | None,
+    ) -> None:
+        """Adds an outbox event for every task changed by a set based statement in
+        the transaction of the change. The audit changes, the `before` values from
+        _values_before against the same columns of the RETURNING rows, are queued
+        on the session until the change is committed, see _audit_set_changes
+        Args:
+            session: Session the tasks were changed in
+            action: update or delete
+            rows: Rows returned by the statement with all task columns
+            before: Values read by _values_before. None when not auditing
+        """
+        payloads = [row._asdict() for row in rows]
+        await add_outbox_events(
+            session,
+            entity_type=Tasks.__tablename__,
+            action=action.value,
+            payloads=payloads,
+        )
+        if before is None:
+            return
+        pending = session.info.setdefault(_PENDING_AUDIT_KEY, [])
+        for after in payloads:
+            values_before = before.get(after["id"], {})
+            changes = diff_values(
+                values_before, {field: after[field] for field in values_before}
+            )
+            pending.append((action, after["id"], changes))
+
+    async def _audit_set_changes(self, session: AsyncSession) -> None:
+        """Queues the audit changes recorded by _record_set_change for the task
+        history. Called once the change is committed"""
+        for action, task_id, changes in session.info.pop(_PENDING_AUDIT_KEY, []):
+            await self.post_processing(
+                request_action=action, request_id=task_id, changes=changes
+            )
+
+    async def _rebalance_positions(
+        self,
+        session: AsyncSession,
+        project_id: UUID = None,
+        parent_task_id: UUID = None,
+    ) -> None:
+        sibling_ids = (
+            await session.scalars(
+                select(Tasks.id)
+                .where(
+                    _sibling_clause(project_id=project_id, parent_task_id=parent_task_id)
+                )
+                .order_by(Tasks.position, Tasks.id)
+                .with_for_update()
+            )
+        ).all()
+        if sibling_ids:
+            tasks = Tasks.__table__
+            # Sibling positions are unique but the constraint is deferred to commit.
+            # The order of the siblings is unchanged so neither the versions nor
+            # updated_at, which saved filters may match on, are changed
+            await session.execute(
+                update(tasks)
+                .where(tasks.c.id == bindparam("task_pk"))
+                .values(
+                    position=bindparam("new_position"), updated_at=tasks.c.updated_at
+                ),
+                [
+                    {"task_pk": task_id, "new_position": position}
+                    for task_id, position in zip(
+                        sibling_ids, keys_between(None, None, len(sibling_ids))
+                    )
+                ],
+            )
+
+    async def get_stats(
+        self,
+        filter_params: CommonSearchFieldsSchema = None,
+        rules: CompiledFilterRules = None,
+    ) -> dict:
+        """
+        Counts tasks per status, per project and per deadline bucket in a single
+        GROUP BY GROUPING SETS query so the response size does not depend on the
+        number of matching tasks.
+
+        Args:
+            filter_params: Optional common search fields to scope the counts.
+                Pagination is ignored.
+            rules: Optional saved filter rules to scope the counts
+        Returns:
+            Dictionary with total, by_status, by_project and by_deadline counts
+        """
+        async with self._read_session() as session:
+            now = datetime.now(tz=timezone.utc)
+
+            query = select(Tasks).where(
+                self._search_clause(
+                    session=session, filter_params=filter_params, rules=rules, now=now
+                )
+            )
+
+            deadline_bucket = case(
+                (Tasks.status == TaskAndProjectStatuses.completed, "completed"),
+                (Tasks.deadline_date.is_(None), "no_deadline"),
+                (Tasks.deadline_date < now, "overdue"),
+                (Tasks.deadline_date < now + timedelta(days=7), "due_this_week"),
+                else_="later",
+            ).label("deadline_bucket")
+            tasks = query.with_only_columns(
+                Tasks.status, Tasks.project_id, deadline_bucket
+            ).subquery()
+
+            if session.get_bind().dialect.name == "postgresql":
+                stats_query = select(
+                    func.grouping(
+                        tasks.c.status, tasks.c.project_id, tasks.c.deadline_bucket
+                    ).label("grouping"),
+                    tasks.c.status,
+                    tasks.c.project_id,
+                    tasks.c.deadline_bucket,
+                    func.count().label("count"),
+                ).group_by(
+                    func.grouping_sets(
+                        tasks.c.status, tasks.c.project_id, tasks.c.deadline_bucket, tuple_()
+                    )
+                )
+            else:
+                stats_query = _grouping_sets_union(tasks)
+            rows = (await session.execute(stats_query)).all()
+
+            stats = {
+                "total": 0,
+                "by_status": {task_status: 0 for task_status in TaskAndProjectStatuses},
+                "by_deadline": {bucket: 0 for bucket in DEADLINE_BUCKETS},
+                "by_project": [],
+            }
+            for row in rows:
+                if row.grouping == _GROUPED_BY_STATUS:
+                    stats["by_status"][row.status] = row.count
+                elif row.grouping == _GROUPED_BY_PROJECT:
+                    stats["by_project"].append(
+                        {"project_id": row.project_id, "count": row.count}
+                    )
+                elif row.grouping == _GROUPED_BY_DEADLINE:
+                    stats["by_deadline"][row.deadline_bucket] = row.count
+                elif row.grouping == _GROUPED_BY_NOTHING:
+                    stats["total"] = row.count
+            return stats
+
+
+def _grouping_sets_union(tasks: Subquery) -> CompoundSelect:
+    """Same rows as the GROUPING SETS query for databases without grouping sets
+    e.g. SQLite. One GROUP BY per grouping set joined with UNION ALL, each labelled
+    with the mask GROUPING() would return"""
+    grouping_sets = (
+        (_GROUPED_BY_STATUS, tasks.c.status),
+        (_GROUPED_BY_PROJECT, tasks.c.project_id),
+        (_GROUPED_BY_DEADLINE, tasks.c.deadline_bucket),
+        (_GROUPED_BY_NOTHING, None),
+    )
+    selects = []
+    for mask, grouped_column in grouping_sets:
+        # Columns outside the grouping set are NULL like rolled up columns
+        columns = [
+            column
+            if column is grouped_column
+            else type_coerce(null(), column.type).label(column.name)
+            for column in (tasks.c.status, tasks.c.project_id, tasks.c.deadline_bucket)
+        ]
+        query = select(
+            literal(mask).label("grouping"), *columns, func.count().label("count")
+        ).select_from(tasks)
+        if grouped_column is not None:
+            query = query.group_by(grouped_column)
+        selects.append(query)
+    return union_all(*selects)
+
+
+def _bulk_result(
+    matched: int, projects: int, dry_run: bool, tasks: int = None
+) -> dict:
+    """`tasks` is the number of task rows touched when it differs from `matched`
+    e.g. subtasks removed by a cascading delete"""
+    if tasks is None:
+        tasks = matched
+    return {"matched": matched, "rows_touched": tasks + projects, "dry_run": dry_run}
+
+
+def _sibling_clause(project_id: UUID, parent_task_id: UUID) -> ColumnElement[bool]:
+    """Tasks sharing the same project and parent task. Uses IS NULL rather than
+    IS NOT DISTINCT FROM so the sibling position index can be used"""
+    return (
+        Tasks.project_id.is_(None) if project_id is None else Tasks.project_id == project_id
+    ) & (
+        Tasks.parent_task_id.is_(None)
+        if parent_task_id is None
+        else Tasks.parent_task_id == parent_task_id
+    )
+
+
+def _subtree_cte(roots: ColumnElement[bool]) -> CTE:
+    """Recursive CTE with the ids, projects and deletion times of the tasks
+    matching `roots` and all of their subtasks. UNION rather than UNION ALL so
+    overlapping subtrees are only returned once and a corrupt parent cycle can not
+    recurse forever"""
+    subtree = select(Tasks.id, Tasks.project_id, Tasks.deleted_at).where(roots).cte(
+        name="subtree", recursive=True
+    )
+    return subtree.union(
+        select(Tasks.id, Tasks.project_id, Tasks.deleted_at).where(
+            Tasks.parent_task_id == subtree.c.id
+        )
+    )
+
+
+# Fields subtasks can be ordered by within a level of GET /tasks/{id}/subtree
+SUBTREE_ORDERINGS = {
+    "position": (Tasks.position,),
+    "name": (Tasks.name,),
+    "created_at": (Tasks.created_at,),
+    "deadline_date": (Tasks.deadline_date.asc().nulls_last(),),
+}
+
+
+def _subtree_levels_query(
+    root_id: UUID, depth: int, ordering: str, limit: int, offset: int
+) -> Select:
+    """Subtasks of a task with their depth. The recursion starts from one page of
+    direct subtasks and stops at `depth` levels, which also bounds a corrupt parent
+    cycle. Rows are ordered by depth then `ordering` with the id as tie breaker."""
+    order_by = (*SUBTREE_ORDERINGS[ordering], Tasks.id)
+    # Wrapped in a subquery as SQLite does not allow LIMIT in the first part of a
+    # recursive CTE
+    first_level = (
+        select(Tasks.id, literal(1).label("depth"))
+        .where(Tasks.parent_task_id == root_id, Tasks.deleted_at.is_(None))
+        .order_by(*order_by)
+        .limit(limit)
+        .offset(offset)
+        .subquery()
+    )
+    levels = select(first_level.c.id, first_level.c.depth).cte(
+        name="subtree_levels", recursive=True
+    )
+    levels = levels.union_all(
+        select(Tasks.id, levels.c.depth + 1).where(
+            Tasks.parent_task_id == levels.c.id,
+            levels.c.depth < depth,
+            Tasks.deleted_at.is_(None),
+        )
+    )
+    return (
+        select(Tasks, levels.c.depth)
+        .join(levels, Tasks.id == levels.c.id)
+        .order_by(levels.c.depth, *order_by)
+    )
+
+
+def _sibling_group_changed(model: Tasks) -> bool:
+    attributes = inspect(model).attrs
+    return (
+        attributes.project_id.history.has_changes()
+        or attributes.parent_task_id.history.has_changes()
+    )
+
+
+def _committed_rollup_state(model: Tasks) -> TaskRollupState:
+    """Returns the rollup fields as they were loaded from the database, ignoring
+    any pending changes made to the model"""
+    attributes = inspect(model).attrs
+
+    def committed_value(key):
+        history = attributes[key].history
+        if history.deleted:
+            return history.deleted[0]
+        return attributes[key].value
+
+    return TaskRollupState(
+        project_id=committed_value("project_id"),
+        status=committed_value("status"),
+        deadline_date=committed_value("deadline_date"),
+    )
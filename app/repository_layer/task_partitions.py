@@ -0,0 +1,104 @@
+"""Optional native Postgres range partitioning of the tasks table on created_at.
+
+Enabled by setting TASK_PARTITIONING before running the migrations, which then
+rebuild tasks as a partitioned table with one partition per TASK_PARTITION_MONTHS
+months from the oldest task to TASK_PARTITIONS_AHEAD partitions ahead, plus
+tasks_default for anything outside them. New partitions must exist before tasks
+are created in their range: schedule python -m app.commands.maintain_task_partitions
+e.g. daily. Do not change TASK_PARTITION_MONTHS once partitioned as new ranges
+would overlap the existing ones.
+
+Postgres requires every unique constraint of a partitioned table to include the
+partition key. The primary key becomes (id, created_at) so foreign keys can no
+longer reference tasks.id: parent_task_id and taskfilter_members.task_id are kept
+consistent by the repositories rather than the database, and the sibling position
+constraint becomes a plain index.
+
+Filters comparing created_at with a value prune the partitions. Saved filter rules
+on updated_at also prune as updated_at is never before created_at, see
+util_filter_rules.py. Reads by id probe the primary key index of every partition."""
+
+from datetime import datetime, timezone
+
+from sqlalchemy import Connection, text
+
+PARTITIONED_TABLE = "tasks"
+DEFAULT_PARTITION = "tasks_default"
+
+
+def partition_start(value: datetime, months: int) -> datetime:
+    """Start of the partition containing `value`. Partitions start on the first of
+    a month, every `months` months counted from January of year 1"""
+    value = value.astimezone(timezone.utc)
+    month_index = (value.year * 12 + value.month - 1) // months * months
+    return datetime(month_index // 12, month_index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def add_months(value: datetime, months: int) -> datetime:
+    """First of the month `months` months after the month of `value`. Partition
+    bounds are month starts and later days do not exist in every month"""
+    month_index = value.year * 12 + value.month - 1 + months
+    return value.replace(year=month_index // 12, month=month_index % 12 + 1, day=1)
+
+
+def partition_ranges(
+    start: datetime, end: datetime, months: int
+) -> list[tuple[str, datetime, datetime]]:
+    """Name, lower bound (inclusive) and upper bound (exclusive) of the partitions
+    covering `start` to `end`"""
+    ranges = []
+    lower = partition_start(start, months=months)
+    while lower <= end:
+        upper = add_months(lower, months)
+        ranges.append((f"{PARTITIONED_TABLE}_p{lower:%Y_%m}", lower, upper))
+        lower = upper
+    return ranges
+
+
+def is_partitioned(connection: Connection) -> bool:
+    return bool(
+        connection.scalar(
+            text(
+                "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table "
+                "WHERE partrelid = to_regclass(:table))"
+            ),
+            {"table": PARTITIONED_TABLE},
+        )
+    )
+
+
+def create_partitions(
+    connection: Connection,
+    start: datetime,
+    end: datetime,
+    months: int,
+    parent: str = PARTITIONED_TABLE,
+) -> list[str]:
+    """Creates the missing partitions of `parent` covering `start` to `end`.
+    Creating a partition fails if tasks_default already holds rows in its range.
+    Caller is responsible for commit.
+    Returns:
+        Names of the created partitions
+    """
+    existing = set(
+        connection.scalars(
+            text(
+                "SELECT child.relname FROM pg_inherits "
+                "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+                "WHERE pg_inherits.inhparent = to_regclass(:parent)"
+            ),
+            {"parent": parent},
+        )
+    )
+    created = []
+    for name, lower, upper in partition_ranges(start, end, months=months):
+        if name in existing:
+            continue
+        connection.execute(
+            text(
+                f"CREATE TABLE {name} PARTITION OF {parent} "
+                f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+            )
+        )
+        created.append(name)
+    return created
@@ -2,9 +2,15 @@ import json
 from uuid import UUID
 
 from pydantic import BaseModel as BaseSchemaModel
-from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
+from app.repository_layer.filter_memberships import (
+    changed_fields,
+    clear_filter_membership,
+    rebuild_filter_membership,
+)
 from app.repository_layer.models.models import DatabaseBaseModel, Taskfilters
+from app.repository_layer.util_compiled_filter_rules import compile_filter_rules
 from .abstract_database_repository import AbstractDatabaseRepository, CrudActions
 from ..service_layer.schemas.taskfilter_schemas import TaskFilterResponse
 
@@ -71,5 +77,32 @@ class TaskfiltersDatabaseRepository(AbstractDatabaseRepository):
         model: DatabaseBaseModel = None,
         request_data: BaseSchemaModel = None,
         request_id: UUID = None,
+        changes: dict = None,
     ) -> BaseSchemaModel:
         pass
+
+    async def pre_commit_processing(
+        self,
+        session: AsyncSession,
+        request_action: CrudActions,
+        model: DatabaseBaseModel,
+    ) -> None:
+        """Rebuilds the task membership of materialized filters when they are
+        created or their rules change. Deleted filters lose their membership by the
+        foreign key cascade"""
+        if request_action is CrudActions.CREATE:
+            rebuild = model.materialized
+        elif request_action is CrudActions.UPDATE:
+            changed = changed_fields(model) & {"rules", "materialized"}
+            if changed and not model.materialized:
+                await clear_filter_membership(session, filter_id=model.id)
+            rebuild = bool(changed) and model.materialized
+        else:
+            rebuild = False
+        if rebuild:
+            # The filter row must exist before its members are inserted
+            await session.flush()
+            # Not cached as the version is only bumped when the change is committed
+            await rebuild_filter_membership(
+                session, filter_id=model.id, rules=compile_filter_rules(model.rules)
+            )
@@ -0,0 +1,128 @@
+"""Compiles the rules of saved Taskfilters once and caches them.
+
+Rules are stored as JSON and validating them means discriminating a union of date
+filter types for every date field of every rule. Compiling parses and validates the
+rules once into an immutable object that also holds what is derived from them, e.g.
+the where clause when it does not depend on the current time. Compiled rules are
+cached per filter id and version so a changed filter is compiled again."""
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any
+from uuid import UUID
+
+from pydantic import TypeAdapter
+from sqlalchemy.sql import ColumnElement
+
+from app.core_layer.config import settings
+from app.repository_layer.util_filter_rules import (
+    DATE_RULE_FIELDS,
+    build_filter_rules_clause,
+)
+from app.service_layer.schemas.taskfilter_mixins import DateFilterRelative
+from app.service_layer.schemas.taskfilter_schemas import FilterRules
+
+# Task columns read by each kind of rule
+RULE_FIELDS = {
+    "status": {"status"},
+    **{field_name: {field_name} for field_name in DATE_RULE_FIELDS},
+    "parent_project": {"project_id"},
+}
+# Every task column a rule can read
+ALL_RULE_FIELDS = frozenset().union(*RULE_FIELDS.values())
+
+_rules_adapter = TypeAdapter(list[FilterRules])
+
+
+@dataclass(frozen=True)
+class CompiledFilterRules:
+    """Validated rules of a saved filter and the values derived from them"""
+
+    rules: tuple[FilterRules, ...]
+    # Task columns the rules read
+    referenced_fields: frozenset[str]
+    # Rules with relative dates match different tasks as time passes
+    has_relative_dates: bool
+    # Rules matching by project name and project tree
+    has_parent_project_rules: bool
+    # Where clause without the relative date conditions. Matches a superset of
+    # the tasks if has_relative_dates
+    static_clause: ColumnElement[bool] = field(repr=False)
+
+    def clause(self, now: datetime = None) -> ColumnElement[bool]:
+        """Where clause for Tasks matching the rules. Relative dates are resolved
+        against `now`"""
+        if not self.has_relative_dates:
+            return self.static_clause
+        return build_filter_rules_clause(rules=list(self.rules), now=now)
+
+
+def compile_filter_rules(rules: Any) -> CompiledFilterRules:
+    """
+    Compiles filter rules without caching them.
+    Args:
+        rules: Rules as a JSON string, a list of dictionaries as stored in the
+            rules column or a list of FilterRules
+    Raises:
+        pydantic.ValidationError if the rules are invalid
+    """
+    if isinstance(rules, str):
+        rules = _rules_adapter.validate_json(rules)
+    else:
+        rules = _rules_adapter.validate_python(rules)
+    referenced_fields = set()
+    for rule in rules:
+        for rule_name, columns in RULE_FIELDS.items():
+            if getattr(rule, rule_name) is not None:
+                referenced_fields |= columns
+    return CompiledFilterRules(
+        rules=tuple(rules),
+        referenced_fields=frozenset(referenced_fields),
+        has_relative_dates=any(
+            isinstance(getattr(rule, field_name), DateFilterRelative)
+            for rule in rules
+            for field_name in DATE_RULE_FIELDS
+        ),
+        has_parent_project_rules=any(rule.parent_project is not None for rule in rules),
+        static_clause=build_filter_rules_clause(
+            rules=rules, include_relative_dates=False
+        ),
+    )
+
+
+class FilterRulesCache:
+    """Least recently used cache of compiled rules keyed on filter id and version"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._compiled: OrderedDict[tuple[UUID, int], CompiledFilterRules] = (
+            OrderedDict()
+        )
+
+    def get(self, filter_id: UUID, version: int, rules: Any) -> CompiledFilterRules:
+        """
+        Returns the compiled rules of a filter, compiling them on a cache miss.
+        Args:
+            filter_id: Id of the saved filter
+            version: Version of the saved filter the rules were read from
+            rules: Rules as stored in the rules column. Only read on a cache miss
+        """
+        key = (filter_id, version)
+        compiled = self._compiled.get(key)
+        if compiled is not None:
+            self._compiled.move_to_end(key)
+            return compiled
+        compiled = compile_filter_rules(rules)
+        self._compiled[key] = compiled
+        if len(self._compiled) > self.maxsize:
+            self._compiled.popitem(last=False)
+        return compiled
+
+    def clear(self) -> None:
+        self._compiled.clear()
+
+
+compiled_filter_rules_cache = FilterRulesCache(
+    maxsize=settings.FILTER_RULES_CACHE_SIZE
+)
@@ -0,0 +1,118 @@
+"""Translates saved Taskfilters rules into SQL Alchemy where clauses on Tasks"""
+
+import operator
+from datetime import datetime, timezone
+
+from sqlalchemy import and_, or_, select, true
+from sqlalchemy.sql import ColumnElement
+
+from app.repository_layer.models.enumerations import TaskAndProjectStatuses
+from app.repository_layer.models.models import Projects, Tasks
+from app.service_layer.schemas.taskfilter_mixins import (
+    DateFilter,
+    DateFilterRelative,
+    DateRangeFilter,
+    ParentProjectFilter,
+    StatusFilter,
+)
+from app.service_layer.schemas.taskfilter_schemas import FilterRules
+
+DATE_RULE_FIELDS = ("start_date", "deadline_date", "created_at", "updated_at")
+
+_DATE_OPERATORS = {
+    "lt": operator.lt,
+    "le": operator.le,
+    "gt": operator.gt,
+    "ge": operator.ge,
+    "eq": operator.eq,
+}
+
+
+def build_filter_rules_clause(
+    rules: list[FilterRules],
+    now: datetime = None,
+    include_relative_dates: bool = True,
+) -> ColumnElement[bool]:
+    """Returns a where clause for Tasks matching the saved filter rules.
+    Conditions inside a single FilterRules entry are AND'ed together and the
+    entries of the list are OR'ed. Relative dates are resolved against `now`.
+    Without relative dates the clause matches a superset of the tasks that does
+    not change as time passes."""
+    if not rules:
+        return true()
+    if now is None:
+        now = datetime.now(tz=timezone.utc)
+    return or_(
+        *[
+            _build_rule_clause(
+                rule=rule, now=now, include_relative_dates=include_relative_dates
+            )
+            for rule in rules
+        ]
+    )
+
+
+def _build_rule_clause(
+    rule: FilterRules, now: datetime, include_relative_dates: bool
+) -> ColumnElement[bool]:
+    clauses = []
+    if rule.status is not None:
+        clauses.append(_build_status_clause(rule.status))
+    for field_name in DATE_RULE_FIELDS:
+        date_filter = getattr(rule, field_name)
+        if date_filter is None or (
+            isinstance(date_filter, DateFilterRelative) and not include_relative_dates
+        ):
+            continue
+        clauses.append(_build_date_clause(date_filter, now=now))
+    if rule.parent_project is not None:
+        clauses.append(_build_parent_project_clause(rule.parent_project))
+    return and_(true(), *clauses)
+
+
+def _build_status_clause(status_filter: StatusFilter) -> ColumnElement[bool]:
+    statuses = [TaskAndProjectStatuses(value) for value in status_filter.value]
+    if status_filter.operator == "in":
+        return Tasks.status.in_(statuses)
+    return Tasks.status.not_in(statuses)
+
+
+def _build_date_clause(
+    date_filter: DateFilter | DateRangeFilter | DateFilterRelative, now: datetime
+) -> ColumnElement[bool]:
+    column = getattr(Tasks, date_filter.field)
+    if isinstance(date_filter, DateRangeFilter):
+        clause = column.between(date_filter.start_date, date_filter.end_date)
+        upper_bound = date_filter.end_date
+    else:
+        if isinstance(date_filter, DateFilterRelative):
+            value = now + date_filter.timedelta
+        else:
+            value = date_filter.value
+        clause = _DATE_OPERATORS[date_filter.operator](column, value)
+        upper_bound = value if date_filter.operator in ("lt", "le", "eq") else None
+    if date_filter.field == "updated_at" and upper_bound is not None:
+        # Tasks are never updated before they are created. The redundant bound
+        # lets Postgres prune the created_at partitions, see task_partitions.py
+        clause = and_(clause, Tasks.created_at <= upper_bound)
+    return clause
+
+
+def _build_parent_project_clause(
+    project_filter: ParentProjectFilter,
+) -> ColumnElement[bool]:
+    project_ids = select(Projects.id).where(
+        Projects.name.in_(project_filter.project_names)
+    )
+    if project_filter.include_child_projects:
+        # Walk down the project tree so child projects of the named projects match too
+        project_tree = project_ids.cte(recursive=True)
+        project_tree = project_tree.union(
+            select(Projects.id).where(Projects.parent_project_id == project_tree.c.id)
+        )
+        project_ids = select(project_tree.c.id)
+
+    if project_filter.operator == "in":
+        return Tasks.project_id.in_(project_ids)
+    # Tasks without a project are never "in" one of the named projects
+    return or_(Tasks.project_id.is_(None), Tasks.project_id.not_in(project_ids))
@@ -0,0 +1,186 @@
+"""Fractional indexing keys used to order sibling tasks.
+
+Keys are base 62 strings that sort correctly with plain byte comparison (the column
+must use the "C" collation). A new key can always be generated between any two keys
+so moving an item only rewrites the moved row. Keys are made of an integer part,
+whose first character encodes its length, followed by an optional fractional part.
+Appending to the end of a list increments the integer part so keys stay short.
+
+Based on https://observablehq.com/@dgreensp/implementing-fractional-indexing
+"""
+
+BASE_62_DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+INTEGER_ZERO = "a0"
+SMALLEST_INTEGER = "A" + "0" * 26
+
+
+def key_between(a: str | None, b: str | None) -> str:
+    """Returns a key that sorts after `a` and before `b`.
+    Args:
+        a: Lower bound key or None for the start of the list
+        b: Upper bound key or None for the end of the list
+    Raises:
+        ValueError if a key is invalid or `a` does not sort before `b`
+    """
+    if a is not None:
+        _validate_key(a)
+    if b is not None:
+        _validate_key(b)
+    if a is not None and b is not None and a >= b:
+        raise ValueError(f"Key {a} must sort before {b}")
+
+    if a is None:
+        if b is None:
+            return INTEGER_ZERO
+        integer_b = _integer_part(b)
+        fraction_b = b[len(integer_b) :]
+        if integer_b == SMALLEST_INTEGER:
+            return integer_b + _midpoint("", fraction_b)
+        if integer_b < b:
+            return integer_b
+        decremented = _decrement_integer(integer_b)
+        if decremented is None:
+            raise ValueError("Can not generate a key before the smallest key")
+        return decremented
+
+    integer_a = _integer_part(a)
+    fraction_a = a[len(integer_a) :]
+    if b is None:
+        incremented = _increment_integer(integer_a)
+        if incremented is None:
+            return integer_a + _midpoint(fraction_a, None)
+        return incremented
+
+    integer_b = _integer_part(b)
+    fraction_b = b[len(integer_b) :]
+    if integer_a == integer_b:
+        return integer_a + _midpoint(fraction_a, fraction_b)
+    incremented = _increment_integer(integer_a)
+    if incremented is None:
+        raise ValueError("Can not generate a key after the largest key")
+    if incremented < b:
+        return incremented
+    return integer_a + _midpoint(fraction_a, None)
+
+
+def keys_between(a: str | None, b: str | None, count: int) -> list[str]:
+    """Returns `count` ascending keys between `a` and `b`. Used when rebalancing a
+    list so keys generated from open ended bounds are as short as possible."""
+    if count <= 0:
+        return []
+    if b is None:
+        keys = []
+        key = a
+        for _ in range(count):
+            key = key_between(key, None)
+            keys.append(key)
+        return keys
+    if a is None:
+        keys = []
+        key = b
+        for _ in range(count):
+            key = key_between(None, key)
+            keys.append(key)
+        return list(reversed(keys))
+    middle = count // 2
+    middle_key = key_between(a, b)
+    return [
+        *keys_between(a, middle_key, middle),
+        middle_key,
+        *keys_between(middle_key, b, count - middle - 1),
+    ]
+
+
+def _midpoint(a: str, b: str | None) -> str:
+    """Midpoint of two fractional parts where "" is 0 and None is 1"""
+    zero = BASE_62_DIGITS[0]
+    if b is not None and a >= b:
+        raise ValueError(f"Key {a} must sort before {b}")
+    if a.endswith(zero) or (b is not None and b.endswith(zero)):
+        raise ValueError("Fractional part of a key can not end with zero")
+    if b:
+        # Keep the common prefix and find the midpoint of the remainder
+        prefix_length = 0
+        while prefix_length < len(b) and (
+            a[prefix_length] if prefix_length < len(a) else zero
+        ) == b[prefix_length]:
+            prefix_length += 1
+        if prefix_length > 0:
+            return b[:prefix_length] + _midpoint(
+                a[prefix_length:], b[prefix_length:]
+            )
+
+    digit_a = BASE_62_DIGITS.index(a[0]) if a else 0
+    digit_b = BASE_62_DIGITS.index(b[0]) if b is not None else len(BASE_62_DIGITS)
+    if digit_b - digit_a > 1:
+        return BASE_62_DIGITS[(digit_a + digit_b + 1) // 2]
+    if b is not None and len(b) > 1:
+        return b[0]
+    return BASE_62_DIGITS[digit_a] + _midpoint(a[1:], None)
+
+
+def _integer_length(head: str) -> int:
+    if "a" <= head <= "z":
+        return ord(head) - ord("a") + 2
+    if "A" <= head <= "Z":
+        return ord("Z") - ord(head) + 2
+    raise ValueError(f"Invalid key head {head}")
+
+
+def _integer_part(key: str) -> str:
+    integer_length = _integer_length(key[0])
+    if integer_length > len(key):
+        raise ValueError(f"Invalid key {key}")
+    return key[:integer_length]
+
+
+def _validate_key(key: str) -> None:
+    if not key or key == SMALLEST_INTEGER:
+        raise ValueError(f"Invalid key {key}")
+    integer = _integer_part(key)
+    if any(digit not in BASE_62_DIGITS for digit in key[1:]):
+        raise ValueError(f"Invalid key {key}")
+    if key[len(integer) :].endswith(BASE_62_DIGITS[0]):
+        raise ValueError(f"Invalid key {key}")
+
+
+def _increment_integer(integer: str) -> str | None:
+    head, digits = integer[0], list(integer[1:])
+    for index in reversed(range(len(digits))):
+        digit = BASE_62_DIGITS.index(digits[index]) + 1
+        if digit < len(BASE_62_DIGITS):
+            digits[index] = BASE_62_DIGITS[digit]
+            return head + "".join(digits)
+        digits[index] = BASE_62_DIGITS[0]
+    # Carried past the first digit so the integer part grows by one digit
+    if head == "Z":
+        return "a" + BASE_62_DIGITS[0]
+    if head == "z":
+        return None
+    new_head = chr(ord(head) + 1)
+    if new_head > "a":
+        digits.append(BASE_62_DIGITS[0])
+    else:
+        digits.pop()
+    return new_head + "".join(digits)
+
+
+def _decrement_integer(integer: str) -> str | None:
+    head, digits = integer[0], list(integer[1:])
+    for index in reversed(range(len(digits))):
+        digit = BASE_62_DIGITS.index(digits[index]) - 1
+        if digit >= 0:
+            digits[index] = BASE_62_DIGITS[digit]
+            return head + "".join(digits)
+        digits[index] = BASE_62_DIGITS[-1]
+    # Borrowed past the first digit so the integer part shrinks by one digit
+    if head == "a":
+        return "Z" + BASE_62_DIGITS[-1]
+    if head == "A":
+        return None
+    new_head = chr(ord(head) - 1)
+    if new_head < "Z":
+        digits.append(BASE_62_DIGITS[-1])
+    else:
+        digits.pop()
+    return new_head + "".join(digits)
@@ -0,0 +1,42 @@
+"""Helpers for querying the search_vector column of Projects and Tasks.
+
+The column is a stored generated tsvector over name (weight A) and description
+(weight B) with a GIN index. See SEARCH_VECTOR_EXPRESSION in models.py"""
+
+import re
+
+from sqlalchemy import ColumnElement, Table, func, literal, literal_column
+from sqlalchemy.dialects.postgresql import REGCONFIG, TSVECTOR
+
+SEARCH_CONFIG = "english"
+HIGHLIGHT_OPTIONS = "StartSel=<mark>, StopSel=</mark>, MaxWords=25, MinWords=10, MaxFragments=2"
+
+_SEARCH_TERM = re.compile(r"\w+")
+
+
+def search_vector(table: Table) -> ColumnElement:
+    return literal_column(f"{table.name}.search_vector", type_=TSVECTOR)
+
+
+def search_terms(text: str) -> list[str]:
+    """Words of the user input. Punctuation is dropped so it can never be parsed as
+    tsquery syntax"""
+    return _SEARCH_TERM.findall(text)
+
+
+def prefix_tsquery(text: str) -> ColumnElement:
+    """tsquery matching documents containing every word of `text` where the last
+    word may be a prefix e.g. "weekly rep" matches "weekly report"
+    """
+    terms = search_terms(text)
+    query_text = " & ".join([*terms[:-1], f"{terms[-1]}:*"]) if terms else ""
+    return func.to_tsquery(_search_config(), query_text)
+
+
+def highlight(document: ColumnElement, query: ColumnElement) -> ColumnElement:
+    """Fragments of `document` with the matching words wrapped in <mark> tags"""
+    return func.ts_headline(_search_config(), document, query, HIGHLIGHT_OPTIONS)
+
+
+def _search_config() -> ColumnElement:
+    return literal(SEARCH_CONFIG, type_=REGCONFIG)
@@ -0,0 +1,215 @@
+"""Applies filtersets and saved filter rules to records held in memory.
+
+The in memory repositories interpret the same filterset classes as the database
+repositories so both accept the same search fields with the same meaning. NULL
+handling follows Postgres: comparisons with a missing value never match, ascending
+order puts missing values last and descending order puts them first."""
+
+import operator
+import re
+from datetime import datetime
+from enum import Enum
+from typing import Any, Callable
+from uuid import UUID
+
+from sqlalchemy.sql import operators as sa_op
+from sqlalchemy_filterset import (
+    BaseFilterSet,
+    Filter,
+    IsNullFilter,
+    LimitOffsetFilter,
+    OrderingField,
+    OrderingFilter,
+    RangeFilter,
+)
+from sqlalchemy_filterset.constants import NullsPosition
+
+from app.repository_layer.models.enumerations import TaskAndProjectStatuses
+
+from app.repository_layer.util_compiled_filter_rules import CompiledFilterRules
+from app.repository_layer.util_filter_rules import DATE_RULE_FIELDS
+from app.service_layer.schemas.taskfilter_mixins import (
+    DateFilterRelative,
+    DateRangeFilter,
+    ParentProjectFilter,
+)
+from app.service_layer.schemas.taskfilter_schemas import FilterRules
+
+
+def _ilike(value: str, pattern: str) -> bool:
+    regex = "".join(
+        ".*" if char == "%" else "." if char == "_" else re.escape(char)
+        for char in pattern
+    )
+    return re.fullmatch(regex, value, flags=re.IGNORECASE | re.DOTALL) is not None
+
+
+_LOOKUPS: dict[Callable, Callable[[Any, Any], bool]] = {
+    operator.eq: operator.eq,
+    operator.ne: operator.ne,
+    operator.lt: operator.lt,
+    operator.le: operator.le,
+    operator.gt: operator.gt,
+    operator.ge: operator.ge,
+    sa_op.in_op: lambda value, values: value in values,
+    sa_op.not_in_op: lambda value, values: value not in values,
+    sa_op.ilike_op: _ilike,
+}
+
+
+def _compare(lookup_expr: Callable, value: Any, other: Any) -> bool:
+    if value is None:
+        return False
+    compare = _LOOKUPS.get(lookup_expr)
+    if compare is None:
+        raise NotImplementedError(f"Lookup {lookup_expr} is not supported in memory")
+    return compare(value, other)
+
+
+def filter_fields(filterset_class: type[BaseFilterSet], params: dict) -> dict:
+    """Params of `filterset_class` that select records. Unknown names, ordering
+    and pagination are left out"""
+    filters = filterset_class.get_filters()
+    return {
+        name: value
+        for name, value in params.items()
+        if isinstance(filters.get(name), (Filter, RangeFilter))
+    }
+
+
+def record_matches(
+    record: dict, filterset_class: type[BaseFilterSet], params: dict
+) -> bool:
+    """True if the record passes every filter of `filterset_class` in `params`"""
+    filters = filterset_class.get_filters()
+    for name, value in filter_fields(filterset_class, params).items():
+        filter_ = filters[name]
+        if isinstance(filter_, RangeFilter):
+            field_value = record[filter_.field.key]
+            left, right = value
+            if left is not None and not _compare(
+                filter_.left_lookup_expr, field_value, left
+            ):
+                return False
+            if right is not None and not _compare(
+                filter_.right_lookup_expr, field_value, right
+            ):
+                return False
+        elif isinstance(filter_, IsNullFilter):
+            if (record[filter_.field.key] is None) != value:
+                return False
+        elif not _compare(filter_.lookup_expr, record[filter_.field.key], value):
+            return False
+    return True
+
+
+def _sort_value(value: Any) -> Any:
+    # Enums sort in declaration order like Postgres enum types
+    if isinstance(value, Enum):
+        return list(type(value)).index(value)
+    return value
+
+
+def _ordering_key(
+    ordering_field: OrderingField, reverse: bool
+) -> Callable[[dict], tuple]:
+    key = ordering_field.field.key
+    nulls_first = (
+        reverse
+        if ordering_field.nulls is None
+        else ordering_field.nulls is NullsPosition.first
+    )
+    # Reversing the sort also reverses where missing values end up
+    none_rank = nulls_first == reverse
+
+    def ordering_key(record: dict) -> tuple:
+        value = record[key]
+        if value is None:
+            return (none_rank, 0)
+        return (not none_rank, _sort_value(value))
+
+    return ordering_key
+
+
+def order_and_paginate(
+    records: list[dict], filterset_class: type[BaseFilterSet], params: dict
+) -> list[dict]:
+    """Applies the ordering and pagination filters of `filterset_class` in `params`"""
+    for name, filter_ in filterset_class.get_filters().items():
+        if isinstance(filter_, OrderingFilter) and params.get(name):
+            # Sorts are stable so applying the least significant field first gives
+            # the combined order
+            for field_name in reversed(params[name]):
+                reverse = field_name.startswith("-")
+                ordering_field = filter_.fields.get(field_name.lstrip("-"))
+                if ordering_field is None:
+                    continue
+                records = sorted(
+                    records,
+                    key=_ordering_key(ordering_field, reverse=reverse),
+                    reverse=reverse,
+                )
+    for name, filter_ in filterset_class.get_filters().items():
+        if isinstance(filter_, LimitOffsetFilter) and params.get(name):
+            limit, offset = params[name]
+            records = records[offset : offset + limit]
+    return records
+
+
+def rules_match(
+    record: dict,
+    rules: CompiledFilterRules,
+    now: datetime,
+    project_ids: Callable[[ParentProjectFilter], set[UUID]],
+) -> bool:
+    """True if a task record matches saved filter rules. Entries of the rules are
+    OR'ed and the conditions of an entry AND'ed like build_filter_rules_clause.
+    Args:
+        record: Task record
+        rules: Compiled rules of the saved filter
+        now: Time relative dates are resolved against
+        project_ids: Returns the ids of the projects a parent project rule names
+    """
+    if not rules.rules:
+        return True
+    return any(_rule_matches(record, rule, now, project_ids) for rule in rules.rules)
+
+
+def _rule_matches(
+    record: dict,
+    rule: FilterRules,
+    now: datetime,
+    project_ids: Callable[[ParentProjectFilter], set[UUID]],
+) -> bool:
+    if rule.status is not None:
+        in_statuses = record["status"] in {
+            TaskAndProjectStatuses(value) for value in rule.status.value
+        }
+        if in_statuses != (rule.status.operator == "in"):
+            return False
+    for field_name in DATE_RULE_FIELDS:
+        date_filter = getattr(rule, field_name)
+        if date_filter is None:
+            continue
+        value = record[date_filter.field]
+        if isinstance(date_filter, DateRangeFilter):
+            if value is None or not (
+                date_filter.start_date <= value <= date_filter.end_date
+            ):
+                return False
+            continue
+        if isinstance(date_filter, DateFilterRelative):
+            other = now + date_filter.timedelta
+        else:
+            other = date_filter.value
+        if not _compare(getattr(operator, date_filter.operator), value, other):
+            return False
+    if rule.parent_project is not None:
+        project_id = record["project_id"]
+        in_projects = project_id is not None and project_id in project_ids(
+            rule.parent_project
+        )
+        if in_projects != (rule.parent_project.operator == "in"):
+            return False
+    return True
+
@@ -1,27 +1,109 @@
 """Defines filter operations allowed for a given request_data type"""
 
+from typing import Iterable
+
 from sqlalchemy.sql import operators as sa_op
 from sqlalchemy_filterset import (
+    BaseFilter,
     Filter,
     LimitOffsetFilter,
     OrderingFilter,
     OrderingField,
     AsyncFilterSet,
     InFilter,
+    IsNullFilter,
+    RangeFilter,
+)
+
+from app.repository_layer.models.models import (
+    DatabaseBaseModel,
+    Projects,
+    Taskfilters,
+    Tasks,
+    TasksIncludingArchived,
 )
 
-from app.repository_layer.models.models import Projects
+# Fields every model can be ordered by. See HasCommonFields
+COMMON_ORDERING_FIELDS = ("name", "created_at", "updated_at")
+TASK_ORDERING_FIELDS = ("status", "start_date", "deadline_date", "position")
+
+
+def build_filterset(
+    model: type[DatabaseBaseModel],
+    filters: dict[str, BaseFilter] = None,
+    ordering_fields: Iterable[str] = (),
+) -> type[AsyncFilterSet]:
+    """Creates a filterset class with the searches on common fields shared by all
+    models bound to the columns of `model`.
+    Args:
+        model: Model class the filters are bound to
+        filters: Model specific filters keyed on the search field name
+        ordering_fields: Model specific columns the results can be ordered by
+    """
+    attributes = {
+        "id": Filter(model.id, lookup_expr=sa_op.eq),
+        "ids": InFilter(model.id),
+        "name": Filter(model.name, lookup_expr=sa_op.ilike_op),
+        "pagination": LimitOffsetFilter(),
+        "ordering": OrderingFilter(
+            **{
+                field: OrderingField(getattr(model, field))
+                for field in (*COMMON_ORDERING_FIELDS, *ordering_fields)
+            }
+        ),
+        **(filters or {}),
+    }
+    return type(f"{model.__name__}SearchFieldManager", (AsyncFilterSet,), attributes)
+
 
+_FILTERSETS: dict[type[DatabaseBaseModel], type[AsyncFilterSet]] = {}
 
-class RepositoryCommonSearchFieldManager(AsyncFilterSet):
-    """Used to perform searches on common fields shared by all entities"""
 
-    id = Filter(Projects.id, lookup_expr=sa_op.eq)
-    ids = InFilter(Projects.id)
-    name = Filter(Projects.name, lookup_expr=sa_op.ilike_op)
-    pagination = LimitOffsetFilter()
-    ordering = OrderingFilter(
-        name=OrderingField(Projects.name),
-        created_at=OrderingField(Projects.created_at),
-        updated_at=OrderingField(Projects.updated_at),
+def _task_filters(model) -> dict[str, BaseFilter]:
+    """Task searches bound to the columns of Tasks or an alias of it"""
+    return {
+        "status": InFilter(model.status),
+        "project_id": Filter(model.project_id),
+        "parent_task_id": Filter(model.parent_task_id),
+        "start_date": RangeFilter(model.start_date),
+        "deadline_date": RangeFilter(model.deadline_date),
+    }
+
+
+def build_filtersets() -> None:
+    """Builds the filterset of every model. Called once at startup, list queries
+    then only create the statement"""
+    _FILTERSETS[Projects] = build_filterset(
+        Projects,
+        filters={
+            "status": InFilter(Projects.status),
+            "type": InFilter(Projects.type),
+            "parent_project_id": Filter(Projects.parent_project_id),
+            "start_date": RangeFilter(Projects.start_date),
+            "deadline_date": RangeFilter(Projects.deadline_date),
+        },
+        ordering_fields=("status", "start_date", "deadline_date"),
+    )
+    _FILTERSETS[Tasks] = build_filterset(
+        Tasks,
+        filters={
+            **_task_filters(Tasks),
+            # Set by the task repositories to leave out soft deleted tasks
+            "exclude_deleted": IsNullFilter(Tasks.deleted_at),
+        },
+        ordering_fields=TASK_ORDERING_FIELDS,
     )
+    _FILTERSETS[TasksIncludingArchived] = build_filterset(
+        TasksIncludingArchived,
+        filters=_task_filters(TasksIncludingArchived),
+        ordering_fields=TASK_ORDERING_FIELDS,
+    )
+    _FILTERSETS[Taskfilters] = build_filterset(Taskfilters)
+
+
+def get_filterset(model: type[DatabaseBaseModel]) -> type[AsyncFilterSet]:
+    """Returns the filterset built for the model class. Builds them on first use
+    when startup is lazy"""
+    if not _FILTERSETS:
+        build_filtersets()
+    return _FILTERSETS[model]
@@ -0,0 +1,112 @@
+"""Caches the select statements built by filtersets.
+
+Building a filter query means creating a filterset and a fresh Select for every
+request, which also makes SQL Alchemy generate a new cache key for it. Instead a
+template is built once per combination of filter fields present, with bound
+parameters in place of the filter values, and reused. Ordering changes the SQL
+itself so it is part of the cache key rather than a parameter, as are the values
+of filters rendered as IS NULL or IS TRUE and the open ends of ranges."""
+
+from collections import OrderedDict
+from typing import Any, Hashable
+
+from sqlalchemy import Select, bindparam, select
+from sqlalchemy.sql import operators as sa_op
+from sqlalchemy_filterset import (
+    BaseFilterSet,
+    BooleanFilter,
+    Filter,
+    IsNullFilter,
+    LimitOffsetFilter,
+    OrderingFilter,
+    RangeFilter,
+)
+
+from app.core_layer.config import settings
+
+_EXPANDING_LOOKUPS = (sa_op.in_op, sa_op.not_in_op)
+
+
+class FilterStatementCache:
+    """Least recently used cache of filter statement templates"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._templates: OrderedDict[Hashable, Select] = OrderedDict()
+
+    def get_statement(
+        self, filterset_class: type[BaseFilterSet], model: type, params: dict
+    ) -> tuple[Select, dict[str, Any]]:
+        """
+        Returns the statement filtering `model` with `params` and the values to
+        execute it with.
+        Args:
+            filterset_class: Filterset defining the filters available for the model
+            model: Model class selected by the statement
+            params: Filter values keyed on filter name. Unknown names are ignored
+        """
+        filters = filterset_class.get_filters()
+        key_fields = []
+        template_params = {}
+        bind_values = {}
+        for name in sorted(params):
+            filter_ = filters.get(name)
+            value = params[name]
+            if filter_ is None:
+                continue
+            if isinstance(filter_, OrderingFilter):
+                value = tuple(value)
+                key_fields.append((name, value))
+                template_params[name] = value
+            elif isinstance(filter_, (BooleanFilter, IsNullFilter)):
+                key_fields.append((name, value))
+                template_params[name] = value
+            elif isinstance(filter_, LimitOffsetFilter):
+                key_fields.append(name)
+                template_params[name] = (
+                    bindparam(f"{name}_limit"),
+                    bindparam(f"{name}_offset"),
+                )
+                bind_values[f"{name}_limit"], bind_values[f"{name}_offset"] = value
+            elif isinstance(filter_, RangeFilter):
+                bounds = []
+                for side, bound in zip(("from", "to"), value):
+                    if bound is None:
+                        bounds.append(None)
+                    else:
+                        bounds.append(bindparam(f"filter_{name}_{side}"))
+                        bind_values[f"filter_{name}_{side}"] = bound
+                key_fields.append((name, tuple(bound is None for bound in bounds)))
+                template_params[name] = tuple(bounds)
+            elif isinstance(filter_, Filter):
+                key_fields.append(name)
+                template_params[name] = bindparam(
+                    f"filter_{name}",
+                    expanding=filter_.lookup_expr in _EXPANDING_LOOKUPS,
+                )
+                bind_values[f"filter_{name}"] = value
+            else:
+                # Filters that inspect the value while building the query can not
+                # be templated so the statement is built without the cache
+                return filterset_class(None, select(model)).filter_query(params), {}
+
+        key = (filterset_class, model, tuple(key_fields))
+        statement = self._templates.get(key)
+        if statement is None:
+            statement = filterset_class(None, select(model)).filter_query(
+                template_params
+            )
+            self._templates[key] = statement
+            if len(self._templates) > self.maxsize:
+                self._templates.popitem(last=False)
+        else:
+            self._templates.move_to_end(key)
+        return statement, bind_values
+
+    def clear(self) -> None:
+        self._templates.clear()
+
+
+filter_statement_cache = FilterStatementCache(
+    maxsize=settings.FILTER_STATEMENT_CACHE_SIZE
+)
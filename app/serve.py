@@ -0,0 +1,39 @@
+"""Production entry point. Run with python -m app.serve
+
+Starts a pool of uvicorn worker processes sized to the CPU count (override with
+SERVER_WORKERS) using uvloop and httptools when they are installed. Each worker
+warms up its database pool and dependency container before accepting requests
+and drains in flight requests for up to SERVER_GRACEFUL_SHUTDOWN_SECONDS on
+SIGTERM or SIGINT."""
+
+import importlib.util
+import os
+
+import uvicorn
+
+from app.core_layer.config import settings
+
+
+def _installed(module_name: str) -> bool:
+    return importlib.util.find_spec(module_name) is not None
+
+
+def main() -> None:
+    workers = settings.server_workers
+    # Workers are new processes that load their own settings. Pass the worker count
+    # on so each sizes its connection pool from its share of the budget
+    os.environ["SERVER_WORKERS"] = str(workers)
+    uvicorn.run(
+        "app.main:app",
+        host=settings.SERVER_HOST,
+        port=settings.SERVER_PORT,
+        workers=workers,
+        loop="uvloop" if _installed("uvloop") else "asyncio",
+        http="httptools" if _installed("httptools") else "h11",
+        timeout_graceful_shutdown=settings.SERVER_GRACEFUL_SHUTDOWN_SECONDS,
+        proxy_headers=True,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,6 @@
 from typing import Union
 from uuid import UUID
 
-from app.service_layer.schemas.common_field_search_schema import (
-    CommonSearchFieldsSchema,
-)
 from app.repository_layer.abstract_database_repository import (
     AbstractDatabaseRepository,
 )
@@ -12,6 +9,7 @@ from app.service_layer.schemas.project_schemas import (
     ProjectResponse,
     ProjectCreate,
     ProjectUpdate,
+    ProjectSearchFieldsSchema,
 )
 from app.service_layer.service_exceptions import TasklyServiceException
 
@@ -79,6 +77,7 @@ class ProjectService:
         id: UUID,
         update_schema: ProjectUpdate,
         commit=True,
+        expected_version: int = None,
     ) -> ProjectResponse:
         """
         Updates an existing record or multiple records in the database_manager based on specified filters. This method allows for precise targeting of records to update.
@@ -88,6 +87,8 @@ class ProjectService:
         Args:
             update_schema: A Pydantic schema containing the update request_data.
             commit: If `True`, commits the transaction immediately. Default is `True`.
+            expected_version: Version the client last read. The update is rejected
+                with 412 if the resource has changed since
 
         Returns:
             The updated request_data in the type specified in return_type or None
@@ -102,6 +103,7 @@ class ProjectService:
             data=update_schema,
             commit=commit,
             id=id,
+            expected_version=expected_version,
         )
         return ProjectResponse.model_validate(res)
 
@@ -135,7 +137,7 @@ class ProjectService:
         return res
 
     async def get_multi(
-        self, filter_params: CommonSearchFieldsSchema
+        self, filter_params: ProjectSearchFieldsSchema
     ) -> list[ProjectResponse]:
         """
         Fetches multiple records based on filters, supporting sorting and pagination.
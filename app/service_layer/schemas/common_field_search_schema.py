@@ -1,16 +1,30 @@
-from typing import Annotated
+from typing import Annotated, Optional
 from uuid import UUID
 
-from pydantic import BaseModel, Field, computed_field, conint, PositiveInt
+from pydantic import (
+    AwareDatetime,
+    BaseModel,
+    Field,
+    computed_field,
+    conint,
+    PositiveInt,
+)
 
 
 class CommonSearchFieldsSchema(BaseModel):
     """Defines search fields common to all resources"""
 
     id: Annotated[UUID, Field(description="The ID of a specific project")] = None
-    ids: Annotated[tuple[UUID], Field(description="A list of Ids to return")] = None
+    ids: Annotated[tuple[UUID, ...], Field(description="A list of Ids to return")] = None
     name: Annotated[
-        UUID, Field(description="The name of project, case insensitive search")
+        str, Field(description="The name of project, case insensitive search")
+    ] = None
+
+    ordering: Annotated[
+        tuple[str, ...],
+        Field(
+            description="Fields to order by e.g. name or -created_at for descending"
+        ),
     ] = None
 
     page: int = Field(100, ge=1, le=1000, description="The page number to return")
@@ -22,3 +36,35 @@ class CommonSearchFieldsSchema(BaseModel):
         limit = self.itemsPerPage
         offset = (self.page - 1) * self.itemsPerPage
         return (limit, offset)
+
+
+class DateRangeSearchFieldsMixin:
+    """Start and deadline date range searches. Each range is passed to the
+    filterset as a (from, to) tuple where either end may be open"""
+
+    start_date_from: Annotated[
+        AwareDatetime, Field(description="Start date on or after")
+    ] = None
+    start_date_to: Annotated[
+        AwareDatetime, Field(description="Start date on or before")
+    ] = None
+    deadline_date_from: Annotated[
+        AwareDatetime, Field(description="Deadline on or after")
+    ] = None
+    deadline_date_to: Annotated[
+        AwareDatetime, Field(description="Deadline on or before")
+    ] = None
+
+    @computed_field
+    @property
+    def start_date(self) -> Optional[tuple]:
+        if self.start_date_from is None and self.start_date_to is None:
+            return None
+        return (self.start_date_from, self.start_date_to)
+
+    @computed_field
+    @property
+    def deadline_date(self) -> Optional[tuple]:
+        if self.deadline_date_from is None and self.deadline_date_to is None:
+            return None
+        return (self.deadline_date_from, self.deadline_date_to)
@@ -1,5 +1,17 @@
+from typing import Annotated
+from uuid import UUID
+
 from pydantic import BaseModel as BaseSchemaModel
-from pydantic import ConfigDict
+from pydantic import ConfigDict, Field
+
+from app.repository_layer.models.enumerations import (
+    ProjectTypes,
+    TaskAndProjectStatuses,
+)
+from app.service_layer.schemas.common_field_search_schema import (
+    CommonSearchFieldsSchema,
+    DateRangeSearchFieldsMixin,
+)
 
 from app.service_layer.schemas.schema_mixins import (
     HasId,
@@ -10,6 +22,8 @@ from app.service_layer.schemas.schema_mixins import (
     HasCreatedAndUpdateTimestamps,
     HasProjectType,
     HasRepeatFields,
+    HasProjectRollups,
+    HasVersion,
 )
 
 
@@ -23,6 +37,8 @@ class ProjectResponse(
     HasCreatedAndUpdateTimestamps,
     HasProjectType,
     HasRepeatFields,
+    HasProjectRollups,
+    HasVersion,
 ):
     """Schema returned to API consumers typically via a GET
     request or returned after update a resource"""
@@ -51,3 +67,18 @@ class ProjectUpdate(ProjectCreate):
 
 class ProjectDelete(BaseSchemaModel):
     pass
+
+
+class ProjectSearchFieldsSchema(CommonSearchFieldsSchema, DateRangeSearchFieldsMixin):
+    """Search fields for projects"""
+
+    status: Annotated[
+        tuple[TaskAndProjectStatuses, ...],
+        Field(description="Projects with any of these statuses"),
+    ] = None
+    type: Annotated[
+        tuple[ProjectTypes, ...], Field(description="Projects of any of these types")
+    ] = None
+    parent_project_id: Annotated[
+        UUID, Field(description="Child projects of this project")
+    ] = None
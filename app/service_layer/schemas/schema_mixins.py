@@ -9,6 +9,7 @@ from pydantic import (
     Field,
     model_validator,
     BaseModel,
+    computed_field,
 )
 
 from app.repository_layer.models.enumerations import (
@@ -49,6 +50,14 @@ class HasCreatedAndUpdateTimestamps:
     updated_at: AwareDatetime
 
 
+class HasVersion:
+    """Version of the resource. Incremented on every change and returned as the
+    ETag header. Send it back in If-Match to only update the version you read"""
+
+    model_config = ConfigDict(from_attributes=True)
+    version: int
+
+
 class HasRepeatFields:
     model_config = ConfigDict(from_attributes=True)
     repeat_interval_type: RepeatIntervalType = None
@@ -110,3 +119,22 @@ class HasProjectType:
         ProjectTypes,
         Field(description="See ProjectTypes type description for details"),
     ]
+
+
+class HasProjectRollups:
+    """Task rollups maintained by the repository layer when tasks change. Read only"""
+
+    model_config = ConfigDict(from_attributes=True)
+    total_tasks: int = 0
+    completed_tasks: int = 0
+    next_deadline: Annotated[
+        Optional[AwareDatetime],
+        Field(description="Earliest deadline of the open tasks in the project"),
+    ] = None
+
+    @computed_field
+    @property
+    def completion_percentage(self) -> float:
+        if not self.total_tasks:
+            return 0.0
+        return round(self.completed_tasks / self.total_tasks * 100, 1)
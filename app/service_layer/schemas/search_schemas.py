@@ -0,0 +1,70 @@
+from typing import Annotated, Literal, Optional
+from uuid import UUID
+
+from pydantic import (
+    BaseModel as BaseSchemaModel,
+    Field,
+    computed_field,
+    model_validator,
+)
+
+from app.repository_layer.util_full_text_search import search_terms
+from app.service_layer.service_exceptions import TasklyServiceValidationError
+
+SearchResultType = Literal["project", "task"]
+
+
+class SearchParams(BaseSchemaModel):
+    """Query parameters of a full text search"""
+
+    q: Annotated[
+        str,
+        Field(
+            min_length=1,
+            max_length=200,
+            description="Words to search for in names and descriptions. The last "
+            "word also matches as a prefix",
+        ),
+    ]
+    types: Annotated[
+        tuple[SearchResultType, ...],
+        Field(min_length=1, description="Result types to include. Defaults to all types"),
+    ] = None
+
+    page: int = Field(1, ge=1, le=1000, description="The page number to return")
+    itemsPerPage: int = Field(20, ge=1, le=100, description="Results per page")
+
+    @model_validator(mode="after")
+    def check_has_search_terms(self):
+        if not search_terms(self.q):
+            raise TasklyServiceValidationError(
+                "Search text must contain at least one word"
+            )
+        return self
+
+    @computed_field
+    @property
+    def pagination(self) -> tuple:
+        limit = self.itemsPerPage
+        offset = (self.page - 1) * self.itemsPerPage
+        return (limit, offset)
+
+
+class SearchResult(BaseSchemaModel):
+    type: SearchResultType
+    id: UUID
+    name: str
+    description: Optional[str] = None
+    rank: float
+    highlight: Annotated[
+        str,
+        Field(
+            description="Fragments of the name and description with matching words "
+            "wrapped in <mark> tags"
+        ),
+    ]
+
+
+class SearchResponse(BaseSchemaModel):
+    total: Annotated[int, Field(description="Number of matches across all pages")]
+    results: list[SearchResult]
@@ -1,14 +1,20 @@
-from typing import Annotated
+from datetime import datetime
+from typing import Annotated, Any, Literal, Optional
 from uuid import UUID
 
 from pydantic import (
     BaseModel as BaseSchemaModel,
     ConfigDict,
+    computed_field,
     model_validator,
     Field,
+    StringConstraints,
 )
 
-from app.repository_layer.models.enumerations import RepeatIntervalType
+from app.repository_layer.models.enumerations import (
+    RepeatIntervalType,
+    TaskAndProjectStatuses,
+)
 from app.service_layer.schemas.schema_mixins import (
     HasId,
     HasCreatedAndUpdateTimestamps,
@@ -16,6 +22,11 @@ from app.service_layer.schemas.schema_mixins import (
     HasNameAndOptionalDescription,
     HasTaskOrProjectStatus,
     HasRepeatFields,
+    HasVersion,
+)
+from app.service_layer.schemas.common_field_search_schema import (
+    CommonSearchFieldsSchema,
+    DateRangeSearchFieldsMixin,
 )
 from app.service_layer.service_exceptions import TasklyServiceValidationError
 
@@ -49,11 +60,26 @@ class TaskResponse(
     HasOptionalStartAndDeadlineDates,
     HasNameAndOptionalDescription,
     HasTaskOrProjectStatus,
+    HasVersion,
 ):
     """Schema returned to API consumers typically via a GET
     request or returned after update a resource"""
 
     model_config = ConfigDict(from_attributes=True)
+    position: Annotated[
+        str,
+        Field(
+            description="Sort key of the task among tasks with the same project and "
+            "parent task. Compare keys by byte value"
+        ),
+    ] = None
+    deleted_at: Annotated[
+        Optional[datetime],
+        Field(
+            description="When the task was deleted. Deleted tasks are only listed "
+            "with include_archived"
+        ),
+    ] = None
 
 
 class TaskCreate(
@@ -75,3 +101,237 @@ class TaskUpdate(TaskCreate):
 
 class TaskDelete(BaseSchemaModel):
     pass
+
+
+class TaskMove(BaseSchemaModel):
+    """Moves a task within the tasks sharing its project and parent task"""
+
+    before: Annotated[
+        UUID, Field(description="Place the task directly before this sibling task")
+    ] = None
+    after: Annotated[
+        UUID, Field(description="Place the task directly after this sibling task")
+    ] = None
+
+    @model_validator(mode="after")
+    def check_has_sibling(self):
+        if self.before is None and self.after is None:
+            raise TasklyServiceValidationError(
+                "One of before or after is required to move a task"
+            )
+        return self
+
+
+class TaskMoveSubtree(BaseSchemaModel):
+    """Moves a task and all of its subtasks to another project and/or parent task"""
+
+    project_id: Annotated[
+        UUID,
+        Field(
+            description="Project to move the subtree to. Defaults to the project of "
+            "the new parent task"
+        ),
+    ] = None
+    parent_task_id: Annotated[
+        UUID,
+        Field(description="New parent task. Omit to make the task a top level task"),
+    ] = None
+
+    @model_validator(mode="after")
+    def check_has_destination(self):
+        if self.project_id is None and self.parent_task_id is None:
+            raise TasklyServiceValidationError(
+                "One of project_id or parent_task_id is required to move a subtree"
+            )
+        return self
+
+
+class TaskSubtreeParams(BaseSchemaModel):
+    """Query parameters of GET /tasks/{id}/subtree. Pagination applies to the
+    direct subtasks of the task, each of which is returned with its own subtasks"""
+
+    depth: int = Field(3, ge=1, le=50, description="Levels of subtasks to return")
+    ordering: Literal["position", "name", "created_at", "deadline_date"] = Field(
+        "position", description="Field subtasks are sorted by within each level"
+    )
+    page: int = Field(1, ge=1, le=1000, description="The page number to return")
+    itemsPerPage: int = Field(
+        50, ge=1, le=200, description="Direct subtasks per page"
+    )
+    stream: bool = Field(
+        False,
+        description="Stream the task and its subtasks as newline delimited JSON, one "
+        "task per line with its depth, instead of one nested document",
+    )
+
+    @computed_field
+    @property
+    def pagination(self) -> tuple:
+        limit = self.itemsPerPage
+        offset = (self.page - 1) * self.itemsPerPage
+        return (limit, offset)
+
+
+class TaskSubtreeItem(TaskResponse):
+    """Task with its depth below the root task of a subtree. The root task has
+    depth 0"""
+
+    depth: int
+
+
+class TaskSubtreeNode(TaskSubtreeItem):
+    subtasks: list["TaskSubtreeNode"] = []
+
+
+class TaskSubtreeResponse(BaseSchemaModel):
+    task: TaskSubtreeNode
+    truncated: Annotated[
+        bool,
+        Field(
+            description="True if the subtree has more subtasks than the server "
+            "returns in one response. Lower the depth or page through the direct "
+            "subtasks to see the rest"
+        ),
+    ]
+
+
+class TaskHistoryParams(BaseSchemaModel):
+    """Query parameters listing the changes of a task"""
+
+    page: int = Field(1, ge=1, le=1000, description="The page number to return")
+    itemsPerPage: int = Field(50, ge=1, le=200, description="Changes per page")
+
+    @computed_field
+    @property
+    def pagination(self) -> tuple:
+        limit = self.itemsPerPage
+        offset = (self.page - 1) * self.itemsPerPage
+        return (limit, offset)
+
+
+class TaskHistoryEntry(BaseSchemaModel):
+    """One create, update or delete of a task"""
+
+    model_config = ConfigDict(from_attributes=True)
+    action: Literal["create", "update", "delete"]
+    changes: Annotated[
+        dict[str, tuple[Any, Any]],
+        Field(
+            description="Changed fields as field name to [old value, new value]. "
+            "Old values are null for creates and new values null for deletes"
+        ),
+    ]
+    changed_at: datetime
+
+
+class TaskSearchFieldsSchema(CommonSearchFieldsSchema, DateRangeSearchFieldsMixin):
+    """Search fields for tasks. Order by position to list tasks in their manual
+    sort order"""
+
+    status: Annotated[
+        tuple[TaskAndProjectStatuses, ...],
+        Field(description="Tasks with any of these statuses"),
+    ] = None
+    project_id: Annotated[
+        UUID, Field(description="Tasks directly linked to this project")
+    ] = None
+    parent_task_id: Annotated[
+        UUID, Field(description="Subtasks of this parent task")
+    ] = None
+
+
+class TaskListSearchFieldsSchema(TaskSearchFieldsSchema):
+    """Search fields listing tasks"""
+
+    include_archived: Annotated[
+        bool,
+        Field(
+            description="Also list deleted tasks and tasks moved to the archive "
+            "after they were completed or deleted"
+        ),
+    ] = False
+
+
+class TaskStatsSearchFieldsSchema(TaskSearchFieldsSchema):
+    """Search fields used to scope task counts"""
+
+    filter_id: Annotated[
+        UUID, Field(description="Id of a saved Taskfilters to scope the counts")
+    ] = None
+
+
+class TaskBulkSearchFieldsSchema(TaskStatsSearchFieldsSchema):
+    """Search fields selecting the tasks changed by a bulk update or delete"""
+
+    dry_run: Annotated[
+        bool,
+        Field(description="Only count the affected tasks without changing them"),
+    ] = False
+
+    @model_validator(mode="after")
+    def check_has_filter(self):
+        """Guards against changing every task by accident"""
+        if not self.model_dump(
+            exclude_none=True,
+            exclude={"page", "itemsPerPage", "pagination", "ordering", "dry_run"},
+        ):
+            raise TasklyServiceValidationError(
+                "Bulk changes require a search field or filter_id"
+            )
+        return self
+
+
+class TaskBulkUpdate(BaseSchemaModel, HasOptionalStartAndDeadlineDates):
+    """Fields that can be set on many tasks at once. Moving tasks between projects
+    or parent tasks is done per subtree with move-subtree"""
+
+    status: TaskAndProjectStatuses = None
+    description: Annotated[
+        str, StringConstraints(strip_whitespace=True, min_length=1)
+    ] = None
+
+    @model_validator(mode="after")
+    def check_has_values(self):
+        if not self.model_dump(exclude_none=True):
+            raise TasklyServiceValidationError(
+                "At least one field is required for a bulk update"
+            )
+        return self
+
+
+class TaskBulkResult(BaseSchemaModel):
+    matched: Annotated[int, Field(description="Number of tasks matching the search")]
+    rows_touched: Annotated[
+        int,
+        Field(
+            description="Upper bound on the rows written including deleted subtasks "
+            "and project rollups"
+        ),
+    ]
+    dry_run: bool
+
+
+class TaskProjectCount(BaseSchemaModel):
+    project_id: Annotated[
+        Optional[UUID],
+        Field(description="Null for subtasks that are not linked to a project"),
+    ] = None
+    count: int
+
+
+class TaskStatsResponse(BaseSchemaModel):
+    """Task counts used for badges. Only counts are returned, never the tasks"""
+
+    total: int
+    by_status: dict[TaskAndProjectStatuses, int]
+    by_deadline: Annotated[
+        dict[
+            Literal["completed", "no_deadline", "overdue", "due_this_week", "later"],
+            int,
+        ],
+        Field(
+            description="Open tasks bucketed by deadline. Due this week means within "
+            "the next 7 days. Completed tasks are counted in their own bucket"
+        ),
+    ]
+    by_project: list[TaskProjectCount]
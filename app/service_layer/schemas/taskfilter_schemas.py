@@ -2,6 +2,7 @@ from typing import Union, Annotated
 
 from pydantic import (
     BaseModel as BaseSchemaModel,
+    computed_field,
     StringConstraints,
     Field,
     BaseModel,
@@ -20,6 +21,7 @@ from .taskfilter_mixins import (
 from .schema_mixins import (
     HasId,
     HasCreatedAndUpdateTimestamps,
+    HasVersion,
 )
 
 
@@ -37,6 +39,14 @@ class TaskFilterCreate(BaseSchemaModel):
         str, StringConstraints(strip_whitespace=True, min_length=1, max_length=100)
     ]
     rules: Json[list[FilterRules]]
+    materialized: Annotated[
+        bool,
+        Field(
+            description="Keep the ids of the matching tasks up to date as tasks "
+            "change so listing the tasks of the filter is a single indexed join. "
+            "Use for filters that are read much more often than tasks change"
+        ),
+    ] = False
 
 
 class TaskFilterUpdate(TaskFilterCreate):
@@ -47,5 +57,22 @@ class TaskFilterResponse(
     TaskFilterCreate,
     HasCreatedAndUpdateTimestamps,
     HasId,
+    HasVersion,
 ):
-    pass
+    # Built from the compiled rules of the filter rather than parsing the stored
+    # JSON, see FilterService
+    rules: list[FilterRules]
+
+
+class TaskFilterTasksParams(BaseSchemaModel):
+    """Query parameters listing the tasks matching a saved filter"""
+
+    page: int = Field(1, ge=1, le=1000, description="The page number to return")
+    itemsPerPage: int = Field(50, ge=1, le=200, description="Tasks per page")
+
+    @computed_field
+    @property
+    def pagination(self) -> tuple:
+        limit = self.itemsPerPage
+        offset = (self.page - 1) * self.itemsPerPage
+        return (limit, offset)
@@ -0,0 +1,24 @@
+from app.repository_layer.search_database_repository import SearchDatabaseRepository
+from app.service_layer.schemas.search_schemas import SearchParams, SearchResponse
+
+
+class SearchService:
+    def __init__(self, repository: SearchDatabaseRepository):
+        self.repository = repository
+
+    async def search(self, search_params: SearchParams) -> SearchResponse:
+        """
+        Full text search across projects and tasks.
+        Args:
+            search_params: Search text, result types and pagination
+        Returns:
+            Ranked page of results and the total number of matches
+        """
+        limit, offset = search_params.pagination
+        res = await self.repository.search(
+            text=search_params.q,
+            types=search_params.types,
+            limit=limit,
+            offset=offset,
+        )
+        return SearchResponse.model_validate(res)
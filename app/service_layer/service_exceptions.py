@@ -1,8 +1,6 @@
 import http
 from typing import Any, Union
 
-import httpx
-
 from app.core_layer.exceptions import TasklyBaseException
 
 
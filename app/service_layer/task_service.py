@@ -1,30 +1,52 @@
-from typing import Union
+from typing import AsyncIterator, Union
 from uuid import UUID
 
-from app.service_layer.schemas.common_field_search_schema import (
-    CommonSearchFieldsSchema,
-)
+from app.core_layer.config import settings
 from app.repository_layer.abstract_database_repository import (
     AbstractDatabaseRepository,
 )
+from app.repository_layer.audit_database_repository import AuditLogRepository
 from app.repository_layer.exceptions_repository import TasklyRepositoryException
+from app.repository_layer.util_compiled_filter_rules import CompiledFilterRules
 from app.service_layer.schemas.task_schemas import (
     TaskResponse,
     TaskCreate,
     TaskUpdate,
+    TaskListSearchFieldsSchema,
+    TaskStatsResponse,
+    TaskStatsSearchFieldsSchema,
+    TaskMove,
+    TaskMoveSubtree,
+    TaskBulkSearchFieldsSchema,
+    TaskBulkUpdate,
+    TaskBulkResult,
+    TaskSubtreeParams,
+    TaskHistoryParams,
+    TaskHistoryEntry,
+    TaskSubtreeItem,
+    TaskSubtreeNode,
+    TaskSubtreeResponse,
 )
+from app.service_layer.schemas.taskfilter_schemas import TaskFilterTasksParams
 from app.service_layer.service_exceptions import TasklyServiceException
+from app.service_layer.taskfilter_service import FilterService
 
 
 class TaskService:
     def __init__(
         self,
         repository: AbstractDatabaseRepository,
+        filter_service: FilterService = None,
+        audit_repository: AuditLogRepository = None,
     ):
 
         self.repository = repository
+        self.filter_service = filter_service
+        self.audit_repository = audit_repository
 
-    async def _validate_update_or_create(self, data: Union[TaskUpdate, TaskCreate]):
+    async def _validate_update_or_create(
+        self, data: Union[TaskUpdate, TaskCreate], id: UUID = None
+    ):
         # Todo move validations for just task down a layer
         #  Keep cross model validations here
 
@@ -32,8 +54,8 @@ class TaskService:
         Note basic request_data type validations are already done by pydantic. This logic
         caters for specific business rules and relationships between domain entities"""
         if isinstance(data, TaskUpdate):
-            if not await self.get(id=data.id):
-                raise ValueError
+            # Raises a not found error if the task does not exist
+            await self.get(id=id)
         #     raise TasklyDataNotFound(id=data.id)
 
         # Unique task name for given parent (including null parent or root case)
@@ -91,6 +113,7 @@ class TaskService:
         id: UUID,
         update_schema: TaskUpdate,
         commit=True,
+        expected_version: int = None,
     ) -> TaskResponse:
         """
         Updates an existing record or multiple records in the database_manager based on specified filters. This method allows for precise targeting of records to update.
@@ -100,6 +123,8 @@ class TaskService:
         Args:
             update_schema: A Pydantic schema containing the update request_data.
             commit: If `True`, commits the transaction immediately. Default is `True`.
+            expected_version: Version the client last read. The update is rejected
+                with 412 if the resource has changed since
 
         Returns:
             The updated request_data in the type specified in return_type or None
@@ -108,12 +133,13 @@ class TaskService:
             TasklyDataNotFound: If no record matches the filters.
         """
 
-        await self._validate_update_or_create(data=update_schema)
+        await self._validate_update_or_create(data=update_schema, id=id)
 
         res = await self.repository.update(
             data=update_schema,
             commit=commit,
             id=id,
+            expected_version=expected_version,
         )
         return TaskResponse.model_validate(res)
 
@@ -123,7 +149,7 @@ class TaskService:
         commit: bool = False,
     ) -> None:
         """
-        Deletes a record or multiple records from the database_manager based on specified filters.
+        Deletes a task and all of its subtasks.
 
         For filtering details see [the Advanced Taskfilters documentation](../advanced/crud.md/#advanced-filters)
 
@@ -143,11 +169,16 @@ class TaskService:
             await user_crud.db_delete(_id=1)
 
         """
-        res = await self.repository.delete(commit=commit, id=id)
+        try:
+            res = await self.repository.delete(commit=commit, id=id)
+        except TasklyRepositoryException as e:
+            raise TasklyServiceException(
+                error_message=e.error_message, status_code=e.status_code
+            ) from e
         return res
 
     async def get_multi(
-        self, filter_params: CommonSearchFieldsSchema
+        self, filter_params: TaskListSearchFieldsSchema
     ) -> list[TaskResponse]:
         """
         Fetches multiple records based on filters, supporting sorting and pagination.
@@ -160,3 +191,250 @@ class TaskService:
         results = await self.repository.get_multi(filter_params=filter_params)
         result_schema = [TaskResponse.model_validate(item) for item in results]
         return result_schema
+
+    async def get_stats(
+        self, filter_params: TaskStatsSearchFieldsSchema
+    ) -> TaskStatsResponse:
+        """
+        Counts tasks per status, project and deadline bucket.
+
+        Args:
+            filter_params: parameters used to scope the counts including an optional
+                saved Taskfilters id. Pagination is ignored.
+        Returns:
+            Task counts
+        """
+        rules = await self._get_filter_rules(filter_id=filter_params.filter_id)
+        res = await self.repository.get_stats(filter_params=filter_params, rules=rules)
+        return TaskStatsResponse.model_validate(res)
+
+    async def move(self, id: UUID, move_schema: TaskMove) -> TaskResponse:
+        """
+        Moves a task before and/or after a sibling task. Only the moved task is written.
+        Args:
+            id: The UUID of the task to move
+            move_schema: The sibling tasks to place the task between
+        Returns:
+            The moved task
+        """
+        try:
+            res = await self.repository.move(
+                id=id, before_id=move_schema.before, after_id=move_schema.after
+            )
+        except TasklyRepositoryException as e:
+            raise TasklyServiceException(
+                error_message=e.error_message, status_code=e.status_code
+            ) from e
+        return TaskResponse.model_validate(res)
+
+    @staticmethod
+    def position_needs_rebalance(task: TaskResponse) -> bool:
+        """Repeated moves into the same gap make position keys grow"""
+        return len(task.position) > settings.TASK_POSITION_REBALANCE_LENGTH
+
+    async def rebalance_positions(
+        self, project_id: UUID = None, parent_task_id: UUID = None
+    ) -> None:
+        """
+        Rewrites the position keys of a sibling list keeping the current order.
+        Args:
+            project_id: Project of the sibling list
+            parent_task_id: Parent task of the sibling list
+        """
+        await self.repository.rebalance_positions(
+            project_id=project_id, parent_task_id=parent_task_id
+        )
+
+    async def move_subtree(
+        self, id: UUID, move_schema: TaskMoveSubtree
+    ) -> TaskResponse:
+        """
+        Moves a task and all of its subtasks to another project and/or parent task.
+        Args:
+            id: The UUID of the root task of the subtree
+            move_schema: The project and/or parent task to move the subtree to
+        Returns:
+            The moved root task
+        """
+        try:
+            res = await self.repository.move_subtree(
+                id=id,
+                project_id=move_schema.project_id,
+                parent_task_id=move_schema.parent_task_id,
+            )
+        except TasklyRepositoryException as e:
+            raise TasklyServiceException(
+                error_message=e.error_message, status_code=e.status_code
+            ) from e
+        return TaskResponse.model_validate(res)
+
+    async def complete_subtree(self, id: UUID) -> TaskResponse:
+        """
+        Marks a task and all of its subtasks as completed.
+        Args:
+            id: The UUID of the root task of the subtree
+        Returns:
+            The completed root task
+        """
+        try:
+            res = await self.repository.complete_subtree(id=id)
+        except TasklyRepositoryException as e:
+            raise TasklyServiceException(
+                error_message=e.error_message, status_code=e.status_code
+            ) from e
+        return TaskResponse.model_validate(res)
+
+    async def get_subtree(
+        self, id: UUID, params: TaskSubtreeParams
+    ) -> TaskSubtreeResponse:
+        """
+        Fetches a task with its subtasks nested below it.
+        Args:
+            id: The UUID of the root task
+            params: Depth, ordering and pagination of the direct subtasks
+        Returns:
+            The nested subtree. Cut off after TASK_SUBTREE_MAX_NODES subtasks
+        """
+        limit, offset = params.pagination
+        try:
+            root, subtasks = await self.repository.get_subtree(
+                id=id,
+                depth=params.depth,
+                ordering=params.ordering,
+                limit=limit,
+                offset=offset,
+                # One extra subtask tells if the subtree was cut off
+                max_nodes=settings.TASK_SUBTREE_MAX_NODES + 1,
+            )
+        except TasklyRepositoryException as e:
+            raise TasklyServiceException(
+                error_message=e.error_message, status_code=e.status_code
+            ) from e
+        truncated = len(subtasks) > settings.TASK_SUBTREE_MAX_NODES
+        root_node = TaskSubtreeNode.model_validate({**root, "depth": 0})
+        nodes = {root_node.id: root_node}
+        # Parents come before their subtasks so every parent is already placed
+        for subtask in subtasks[: settings.TASK_SUBTREE_MAX_NODES]:
+            node = TaskSubtreeNode.model_validate(subtask)
+            nodes[node.id] = node
+            nodes[node.parent_task_id].subtasks.append(node)
+        return TaskSubtreeResponse(task=root_node, truncated=truncated)
+
+    async def stream_subtree(
+        self, id: UUID, params: TaskSubtreeParams
+    ) -> AsyncIterator[TaskSubtreeItem]:
+        """
+        Streams a task followed by its subtasks level by level. Cut off after
+        TASK_SUBTREE_STREAM_MAX_NODES subtasks.
+        Args:
+            id: The UUID of the root task
+            params: Depth, ordering and pagination of the direct subtasks
+        Returns:
+            Iterator of the tasks with their depth below the root task
+        """
+        # Fetched before streaming so a missing task is reported with a status code
+        root = await self.get(id=id)
+        limit, offset = params.pagination
+        subtasks = self.repository.stream_subtree(
+            id=id,
+            depth=params.depth,
+            ordering=params.ordering,
+            limit=limit,
+            offset=offset,
+            max_nodes=settings.TASK_SUBTREE_STREAM_MAX_NODES,
+        )
+
+        async def items() -> AsyncIterator[TaskSubtreeItem]:
+            yield TaskSubtreeItem(**root.model_dump(), depth=0)
+            async for subtask in subtasks:
+                yield TaskSubtreeItem.model_validate(subtask)
+
+        return items()
+
+    async def get_history(
+        self, id: UUID, params: TaskHistoryParams
+    ) -> list[TaskHistoryEntry]:
+        """
+        Lists the changes of a task, newest first. Deleted tasks keep their history.
+        Changes are written in batches so the latest change can take up to
+        AUDIT_FLUSH_INTERVAL_MS to appear.
+        Args:
+            id: The UUID of the task
+            params: Pagination of the changes
+        Returns:
+            The changes of the task
+        """
+        limit, offset = params.pagination
+        results = await self.audit_repository.get_history(
+            entity_type="tasks", entity_id=id, limit=limit, offset=offset
+        )
+        return [TaskHistoryEntry.model_validate(item) for item in results]
+
+    async def bulk_update(
+        self, filter_params: TaskBulkSearchFieldsSchema, update_schema: TaskBulkUpdate
+    ) -> TaskBulkResult:
+        """
+        Updates every task matching the search fields or saved Taskfilters in one
+        statement.
+        Args:
+            filter_params: parameters selecting the tasks. Pagination is ignored
+            update_schema: The values to set on the matching tasks
+        Returns:
+            The number of matched tasks and an upper bound on rows touched
+        """
+        rules = await self._get_filter_rules(filter_id=filter_params.filter_id)
+        res = await self.repository.bulk_update(
+            values=update_schema.model_dump(exclude_none=True),
+            filter_params=filter_params,
+            rules=rules,
+            dry_run=filter_params.dry_run,
+        )
+        return TaskBulkResult.model_validate(res)
+
+    async def bulk_delete(
+        self, filter_params: TaskBulkSearchFieldsSchema
+    ) -> TaskBulkResult:
+        """
+        Deletes every task matching the search fields or saved Taskfilters along
+        with their subtasks in one statement.
+        Args:
+            filter_params: parameters selecting the tasks. Pagination is ignored
+        Returns:
+            The number of matched tasks and an upper bound on rows touched
+        """
+        rules = await self._get_filter_rules(filter_id=filter_params.filter_id)
+        res = await self.repository.bulk_delete(
+            filter_params=filter_params, rules=rules, dry_run=filter_params.dry_run
+        )
+        return TaskBulkResult.model_validate(res)
+
+    async def get_filter_tasks(
+        self, filter_id: UUID, params: TaskFilterTasksParams
+    ) -> list[TaskResponse]:
+        """
+        Lists the tasks matching a saved Taskfilters.
+        Args:
+            filter_id: Id of the saved filter
+            params: Pagination of the tasks
+        Returns:
+            The matching tasks ordered by creation
+        """
+        task_filter = await self.filter_service.get(id=filter_id)
+        limit, offset = params.pagination
+        results = await self.repository.get_filter_tasks(
+            filter_id=filter_id,
+            rules=self.filter_service.compiled_rules(task_filter),
+            materialized=task_filter.materialized,
+            limit=limit,
+            offset=offset,
+        )
+        return [TaskResponse.model_validate(item) for item in results]
+
+    async def _get_filter_rules(
+        self, filter_id: UUID = None
+    ) -> CompiledFilterRules | None:
+        """Compiled rules of a saved Taskfilters or None if no filter id is given"""
+        if filter_id is None:
+            return None
+        task_filter = await self.filter_service.get(id=filter_id)
+        return self.filter_service.compiled_rules(task_filter)
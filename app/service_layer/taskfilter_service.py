@@ -9,6 +9,10 @@ from app.service_layer.schemas.common_field_search_schema import (
     CommonSearchFieldsSchema,
 )
 from app.repository_layer.exceptions_repository import TasklyRepositoryException
+from app.repository_layer.util_compiled_filter_rules import (
+    CompiledFilterRules,
+    compiled_filter_rules_cache,
+)
 from app.service_layer.schemas.taskfilter_schemas import (
     TaskFilterResponse,
     TaskFilterUpdate,
@@ -65,7 +69,7 @@ class FilterService:
             data=create_schema,
             commit=commit,
         )
-        return TaskFilterResponse.model_validate(res)
+        return self._to_response(res)
 
     async def get(
         self,
@@ -85,13 +89,14 @@ class FilterService:
                 error_message=e.error_message, status_code=e.status_code
             ) from e
 
-        return TaskFilterResponse.model_validate(res)
+        return self._to_response(res)
 
     async def update(
         self,
         id: UUID,
         update_schema: TaskFilterUpdate,
         commit=True,
+        expected_version: int = None,
     ) -> TaskFilterResponse:
         """
         Updates an existing record or multiple records in the database_manager based on specified filters. This method allows for precise targeting of records to update.
@@ -102,6 +107,8 @@ class FilterService:
             id: The Id for the resource to update
             update_schema: A Pydantic schema containing the update request_data.
             commit: If `True`, commits the transaction immediately. Default is `True`.
+            expected_version: Version the client last read. The update is rejected
+                with 412 if the resource has changed since
 
         Returns:
             The updated request_data in the type specified in return_type or None
@@ -116,8 +123,9 @@ class FilterService:
             data=update_schema,
             commit=commit,
             id=id,
+            expected_version=expected_version,
         )
-        return TaskFilterResponse.model_validate(res)
+        return self._to_response(res)
 
     async def delete(
         self,
@@ -161,5 +169,22 @@ class FilterService:
         """
         results = await self.repository.get_multi(filter_params=filter_params)
 
-        result_schema = [TaskFilterResponse.model_validate(item) for item in results]
+        result_schema = [self._to_response(item) for item in results]
         return result_schema
+
+    @staticmethod
+    def compiled_rules(task_filter: TaskFilterResponse) -> CompiledFilterRules:
+        """Compiled rules of a filter. Cached per filter version"""
+        return compiled_filter_rules_cache.get(
+            filter_id=task_filter.id,
+            version=task_filter.version,
+            rules=task_filter.rules,
+        )
+
+    @staticmethod
+    def _to_response(res: dict) -> TaskFilterResponse:
+        # The stored rules are only parsed when the filter version is not cached
+        compiled = compiled_filter_rules_cache.get(
+            filter_id=res["id"], version=res["version"], rules=res["rules"]
+        )
+        return TaskFilterResponse.model_validate({**res, "rules": list(compiled.rules)})
@@ -0,0 +1,63 @@
+"""Fixtures of the behaviour tests.
+
+The database repositories run against a new SQLite database per test created from
+the models, the memory repositories against a new InMemoryStore. Neither Postgres
+nor a .env file is needed:
+
+    python -m pytest app/tests
+"""
+
+import os
+
+# Settings are read when the app modules are imported
+os.environ.setdefault("PROJECT_NAME", "taskly-tests")
+os.environ.setdefault("BACKEND_CORS_ORIGINS", "http://localhost")
+os.environ.setdefault("DATABASE_BACKEND", "sqlite")
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core_layer.database import _create_engine
+from app.repository_layer.memory_repository import (
+    InMemoryStore,
+    ProjectMemoryRepository,
+    TaskMemoryRepository,
+)
+from app.repository_layer.models.models import DatabaseBaseModel
+from app.repository_layer.project_database_repository import (
+    ProjectDatabaseRepository,
+)
+from app.repository_layer.task_database_repository import TaskDatabaseRepository
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def session_factory(tmp_path):
+    engine = _create_engine(f"sqlite+aiosqlite:///{tmp_path / 'taskly.db'}")
+    async with engine.begin() as connection:
+        await connection.run_sync(DatabaseBaseModel.metadata.create_all)
+    yield async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    await engine.dispose()
+
+
+@pytest.fixture
+def memory_store():
+    return InMemoryStore()
+
+
+@pytest.fixture(params=["database", "memory"])
+def repositories(request) -> tuple:
+    """Project and task repository of each backend. Tests using it check that both
+    backends behave the same"""
+    if request.param == "database":
+        session_factory = request.getfixturevalue("session_factory")
+        return (
+            ProjectDatabaseRepository(session_factory),
+            TaskDatabaseRepository(session_factory),
+        )
+    store = request.getfixturevalue("memory_store")
+    return ProjectMemoryRepository(store), TaskMemoryRepository(store)
@@ -0,0 +1,87 @@
+"""Tests that stopping the audit writer writes the queued history and returns"""
+
+import asyncio
+from uuid import uuid4
+
+import anyio
+import pytest
+from sqlalchemy import select
+
+from app.repository_layer.audit_database_repository import AuditWriter
+from app.repository_layer.models.models import AuditLog
+
+pytestmark = pytest.mark.anyio
+
+
+async def _record(writer: AuditWriter, count: int) -> set:
+    entity_ids = {uuid4() for _ in range(count)}
+    for entity_id in entity_ids:
+        await writer.record(
+            entity_type="tasks", entity_id=entity_id, action="update", changes={}
+        )
+    return entity_ids
+
+
+async def _written(session_factory) -> set:
+    async with session_factory() as session:
+        return set(await session.scalars(select(AuditLog.entity_id)))
+
+
+async def test_stop_writes_the_queued_events(session_factory):
+    writer = AuditWriter(
+        session_factory,
+        max_queue_size=100,
+        batch_size=2,
+        flush_interval_seconds=0.01,
+    )
+    entity_ids = await _record(writer, 5)
+
+    with anyio.fail_after(5):
+        await writer.stop()
+    assert await _written(session_factory) == entity_ids
+
+
+async def test_stop_does_not_wait_on_a_stopped_writer(session_factory):
+    writer = AuditWriter(
+        session_factory,
+        max_queue_size=100,
+        batch_size=2,
+        flush_interval_seconds=0.01,
+    )
+    entity_ids = await _record(writer, 3)
+    # The background writer went away before taking any of the events
+    writer._task.cancel()
+    await asyncio.sleep(0)
+    assert writer._task.done()
+
+    with anyio.fail_after(5):
+        await writer.stop()
+    assert await _written(session_factory) == entity_ids
+
+
+async def test_stop_writes_what_a_stuck_writer_left(session_factory, monkeypatch):
+    writer = AuditWriter(
+        session_factory,
+        max_queue_size=100,
+        batch_size=2,
+        flush_interval_seconds=0.01,
+        stop_timeout_seconds=0.1,
+    )
+    write = writer._write
+    stuck_events = []
+
+    async def write_stuck_once(events):
+        # The first batch hangs like a write to an unreachable database
+        if not stuck_events:
+            stuck_events.extend(events)
+            await asyncio.sleep(60)
+        await write(events)
+
+    monkeypatch.setattr(writer, "_write", write_stuck_once)
+    entity_ids = await _record(writer, 5)
+
+    with anyio.fail_after(5):
+        await writer.stop()
+    # Including the batch the background writer was stuck on
+    assert {event["entity_id"] for event in stuck_events} < entity_ids
+    assert await _written(session_factory) == entity_ids
@@ -0,0 +1,118 @@
+"""Tests that materialized saved filters stay in step with task changes"""
+
+import json
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import select, update
+
+from app.repository_layer.models.models import TaskfilterMembers, Tasks
+from app.repository_layer.project_database_repository import (
+    ProjectDatabaseRepository,
+)
+from app.repository_layer.task_database_repository import TaskDatabaseRepository
+from app.repository_layer.taskfilters_database_repository import (
+    TaskfiltersDatabaseRepository,
+)
+from app.service_layer.schemas.task_schemas import (
+    TaskBulkSearchFieldsSchema,
+    TaskUpdate,
+)
+from app.service_layer.schemas.taskfilter_schemas import TaskFilterCreate
+from app.tests.utils import project_create, task_create
+
+pytestmark = pytest.mark.anyio
+
+LAST_CHANGED = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+# Tasks not changed since 2021
+NOT_CHANGED_RULES = json.dumps(
+    [
+        {
+            "updated_at": {
+                "field": "updated_at",
+                "operator": "lt",
+                "value": "2021-01-01T00:00:00Z",
+            }
+        }
+    ]
+)
+
+
+async def _members(session_factory, filter_id) -> set:
+    async with session_factory() as session:
+        return set(
+            await session.scalars(
+                select(TaskfilterMembers.task_id).where(
+                    TaskfilterMembers.filter_id == filter_id
+                )
+            )
+        )
+
+
+@pytest.fixture
+def task_repo(session_factory):
+    return TaskDatabaseRepository(session_factory)
+
+
+@pytest.fixture
+async def projects(session_factory) -> list[dict]:
+    project_repo = ProjectDatabaseRepository(session_factory)
+    return [
+        await project_repo.create(project_create(name)) for name in ("home", "work")
+    ]
+
+
+@pytest.fixture
+async def tasks(session_factory, task_repo, projects) -> list[dict]:
+    """Two sibling tasks created and last changed in 2020"""
+    created = [
+        await task_repo.create(task_create(name, project_id=projects[0]["id"]))
+        for name in ("first", "second")
+    ]
+    async with session_factory() as session:
+        await session.execute(
+            update(Tasks).values(created_at=LAST_CHANGED, updated_at=LAST_CHANGED)
+        )
+        await session.commit()
+    return created
+
+
+@pytest.mark.parametrize(
+    "write",
+    [
+        "update",
+        "move",
+        "move_subtree",
+        "complete_subtree",
+        "bulk_update",
+    ],
+)
+async def test_updated_at_rules_follow_every_write(
+    session_factory, task_repo, projects, tasks, write
+):
+    taskfilter = await TaskfiltersDatabaseRepository(session_factory).create(
+        TaskFilterCreate(name="stale", rules=NOT_CHANGED_RULES, materialized=True)
+    )
+    first, second = tasks
+    assert await _members(session_factory, taskfilter["id"]) == {
+        first["id"],
+        second["id"],
+    }
+
+    if write == "update":
+        await task_repo.update(first["id"], TaskUpdate.model_construct(name="renamed"))
+    elif write == "move":
+        await task_repo.move(first["id"], after_id=second["id"])
+    elif write == "move_subtree":
+        await task_repo.move_subtree(first["id"], project_id=projects[1]["id"])
+    elif write == "complete_subtree":
+        await task_repo.complete_subtree(first["id"])
+    elif write == "bulk_update":
+        await task_repo.bulk_update(
+            {"description": "changed"},
+            filter_params=TaskBulkSearchFieldsSchema(ids=(first["id"],)),
+        )
+
+    # Only the changed task has a new updated_at
+    assert await _members(session_factory, taskfilter["id"]) == {second["id"]}
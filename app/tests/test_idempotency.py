@@ -0,0 +1,142 @@
+"""Tests that requests sent with an Idempotency-Key run once and their retries get
+the stored response. Every test runs against the database repository on SQLite
+and against the memory repository."""
+
+from uuid import uuid4
+
+import anyio
+import httpx
+import pytest
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+
+from app.core_layer.middleware import IdempotencyMiddleware
+from app.repository_layer.idempotency_database_repository import (
+    IdempotencyKeyRepository,
+)
+from app.repository_layer.memory_repository import IdempotencyKeyMemoryRepository
+from app.tests.utils import as_tenant
+
+pytestmark = pytest.mark.anyio
+
+
+class _Endpoint:
+    """App answering 201 with the number of the call and a matching ETag, or 500
+    on /fail. Calls wait for `release` while it is set"""
+
+    def __init__(self):
+        self.calls = 0
+        self.release: anyio.Event | None = None
+
+    async def __call__(self, scope, receive, send) -> None:
+        body = await Request(scope, receive).body()
+        self.calls += 1
+        if self.release is not None:
+            await self.release.wait()
+        status_code = 500 if scope["path"] == "/fail" else 201
+        await JSONResponse(
+            {"call": self.calls, "body": body.decode()},
+            status_code=status_code,
+            headers={"etag": f'"{self.calls}"'},
+        )(scope, receive, send)
+
+
+@pytest.fixture
+def endpoint() -> _Endpoint:
+    return _Endpoint()
+
+
+@pytest.fixture(params=["database", "memory"])
+def client(request, endpoint) -> httpx.AsyncClient:
+    if request.param == "database":
+        repository = IdempotencyKeyRepository(
+            request.getfixturevalue("session_factory")
+        )
+    else:
+        repository = IdempotencyKeyMemoryRepository(
+            request.getfixturevalue("memory_store")
+        )
+    app = IdempotencyMiddleware(
+        endpoint, repository_factory=lambda: repository, ttl_seconds=60
+    )
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://testserver"
+    )
+
+
+def _key() -> dict:
+    return {"idempotency-key": str(uuid4())}
+
+
+async def test_retries_get_the_stored_response(client, endpoint):
+    headers = _key()
+    first = await client.post("/tasks/", content="task", headers=headers)
+    retry = await client.post("/tasks/", content="task", headers=headers)
+
+    assert endpoint.calls == 1
+    assert IdempotencyMiddleware.REPLAYED_HEADER_NAME not in first.headers
+    assert retry.headers[IdempotencyMiddleware.REPLAYED_HEADER_NAME] == "true"
+    assert (retry.status_code, retry.json()) == (first.status_code, first.json())
+    for header in ("content-type", "etag"):
+        assert retry.headers[header] == first.headers[header]
+    # Other keys and requests without a key run
+    await client.post("/tasks/", content="task", headers=_key())
+    await client.post("/tasks/", content="task")
+    assert endpoint.calls == 3
+
+
+async def test_key_used_for_a_different_request_is_rejected(client, endpoint):
+    headers = _key()
+    await client.post("/tasks/", content="task", headers=headers)
+
+    for path, body in (("/tasks/", "other"), ("/projects/", "task")):
+        response = await client.post(path, content=body, headers=headers)
+        assert response.status_code == 422
+    assert endpoint.calls == 1
+
+
+async def test_retry_of_a_request_in_progress_is_rejected(client, endpoint):
+    headers = _key()
+    endpoint.release = anyio.Event()
+    responses = []
+
+    async def first_request():
+        responses.append(await client.post("/tasks/", content="task", headers=headers))
+
+    with anyio.fail_after(5):
+        async with anyio.create_task_group() as tasks:
+            tasks.start_soon(first_request)
+            while endpoint.calls < 1:
+                await anyio.sleep(0)
+            retry = await client.post("/tasks/", content="task", headers=headers)
+            assert retry.status_code == 409
+            assert "retry-after" in retry.headers
+            endpoint.release.set()
+
+    assert responses[0].status_code == 201
+    assert endpoint.calls == 1
+
+
+async def test_server_errors_release_the_key(client, endpoint):
+    headers = _key()
+    for calls in (1, 2):
+        response = await client.post("/fail", content="task", headers=headers)
+        assert response.status_code == 500
+        assert IdempotencyMiddleware.REPLAYED_HEADER_NAME not in response.headers
+        assert endpoint.calls == calls
+
+
+async def test_tenants_can_use_the_same_key(client, endpoint):
+    headers = _key()
+    with as_tenant(uuid4()):
+        first = await client.post("/tasks/", content="task", headers=headers)
+    with as_tenant(uuid4()):
+        other = await client.post("/tasks/", content="task", headers=headers)
+        assert IdempotencyMiddleware.REPLAYED_HEADER_NAME not in other.headers
+    with as_tenant(uuid4()):
+        # Nor is a different request sent with the key by another tenant rejected
+        response = await client.post("/tasks/", content="other", headers=headers)
+        assert response.status_code == 201
+
+    assert endpoint.calls == 3
+    assert first.json()["call"] != other.json()["call"]
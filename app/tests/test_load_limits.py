@@ -0,0 +1,161 @@
+"""Tests that the rate limit and load shedding middlewares reject requests over
+their limits with a Retry-After and let the others through"""
+
+from uuid import uuid4
+
+import anyio
+import httpx
+import pytest
+from fastapi import FastAPI
+from starlette.responses import PlainTextResponse
+
+from app.api.routes.task_routes import task_router
+from app.core_layer import rate_limiting
+from app.core_layer.database import DecayingAverage
+from app.core_layer.middleware import LoadSheddingMiddleware, RateLimitMiddleware
+from app.core_layer.rate_limiting import InMemoryTokenBuckets
+from app.tests.utils import as_tenant
+
+pytestmark = pytest.mark.anyio
+
+
+class _Clock:
+    """Stand in for the time module of the buckets so tests move time on"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> _Clock:
+    clock = _Clock()
+    monkeypatch.setattr(rate_limiting, "time", clock)
+    return clock
+
+
+def _client(app) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://testserver"
+    )
+
+
+def _rate_limited(burst: int, rate_per_second: float) -> RateLimitMiddleware:
+    """Rate limit in front of an app answering 200, with the routes of the API"""
+    api = FastAPI()
+    api.include_router(task_router)
+    return RateLimitMiddleware(
+        PlainTextResponse("ok"),
+        buckets=InMemoryTokenBuckets(rate_per_second=rate_per_second, burst=burst),
+        routes=api.routes,
+    )
+
+
+async def test_requests_over_the_burst_are_rejected(clock):
+    async with _client(_rate_limited(burst=3, rate_per_second=0.5)) as client:
+        for _ in range(3):
+            assert (await client.get(f"/tasks/{uuid4()}")).status_code == 200
+        response = await client.get(f"/tasks/{uuid4()}")
+    assert response.status_code == 429
+    # One token is missing and comes back in 2 seconds
+    assert response.headers["retry-after"] == "2"
+
+
+async def test_requests_take_the_cost_of_their_route(clock):
+    async with _client(_rate_limited(burst=20, rate_per_second=1)) as client:
+        for _ in range(2):
+            assert (await client.patch("/tasks/")).status_code == 200
+        response = await client.patch("/tasks/")
+        assert response.status_code == 429
+        assert response.headers["retry-after"] == "10"
+        # Routes without a cost take a single token
+        clock.now += 1
+        assert (await client.get(f"/tasks/{uuid4()}")).status_code == 200
+
+
+async def test_routes_costing_more_than_the_burst_are_still_served(clock):
+    async with _client(_rate_limited(burst=5, rate_per_second=1)) as client:
+        assert (await client.patch("/tasks/")).status_code == 200
+        assert (await client.patch("/tasks/")).headers["retry-after"] == "5"
+
+
+async def test_buckets_refill_over_time(clock):
+    async with _client(_rate_limited(burst=2, rate_per_second=4)) as client:
+        for _ in range(2):
+            assert (await client.get(f"/tasks/{uuid4()}")).status_code == 200
+        assert (await client.get(f"/tasks/{uuid4()}")).status_code == 429
+
+        clock.now += 0.25
+        assert (await client.get(f"/tasks/{uuid4()}")).status_code == 200
+        assert (await client.get(f"/tasks/{uuid4()}")).status_code == 429
+        # Never beyond the burst however long the tenant was idle
+        clock.now += 60
+        for _ in range(2):
+            assert (await client.get(f"/tasks/{uuid4()}")).status_code == 200
+        assert (await client.get(f"/tasks/{uuid4()}")).status_code == 429
+
+
+async def test_tenants_have_their_own_buckets(clock):
+    async with _client(_rate_limited(burst=1, rate_per_second=1)) as client:
+        with as_tenant(uuid4()):
+            assert (await client.get(f"/tasks/{uuid4()}")).status_code == 200
+            assert (await client.get(f"/tasks/{uuid4()}")).status_code == 429
+        with as_tenant(uuid4()):
+            assert (await client.get(f"/tasks/{uuid4()}")).status_code == 200
+
+
+async def test_requests_over_the_in_flight_limit_are_shed():
+    release = anyio.Event()
+
+    async def slow_app(scope, receive, send):
+        await release.wait()
+        await PlainTextResponse("ok")(scope, receive, send)
+
+    app = LoadSheddingMiddleware(
+        slow_app,
+        max_in_flight=2,
+        max_pool_wait_seconds=0,
+        retry_after_seconds=3,
+        pool_wait_seconds=DecayingAverage(half_life_seconds=2),
+    )
+    statuses = []
+
+    async def request(client):
+        statuses.append((await client.get("/")).status_code)
+
+    async with _client(app) as client:
+        with anyio.fail_after(5):
+            async with anyio.create_task_group() as tasks:
+                for _ in range(2):
+                    tasks.start_soon(request, client)
+                while app.in_flight < 2:
+                    await anyio.sleep(0)
+                response = await client.get("/")
+                assert response.status_code == 503
+                assert response.headers["retry-after"] == "3"
+                release.set()
+        assert statuses == [200, 200]
+        assert app.in_flight == 0
+        assert (await client.get("/")).status_code == 200
+
+
+async def test_requests_are_shed_while_the_pool_wait_is_high():
+    pool_wait_seconds = DecayingAverage(half_life_seconds=60, weight=1)
+    app = LoadSheddingMiddleware(
+        PlainTextResponse("ok"),
+        max_in_flight=0,
+        max_pool_wait_seconds=0.5,
+        retry_after_seconds=1,
+        pool_wait_seconds=pool_wait_seconds,
+    )
+    async with _client(app) as client:
+        pool_wait_seconds.observe(0.4)
+        assert (await client.get("/")).status_code == 200
+        pool_wait_seconds.observe(2)
+        response = await client.get("/")
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "1"
+        pool_wait_seconds.observe(0.1)
+        assert (await client.get("/")).status_code == 200
@@ -0,0 +1,202 @@
+"""Tests that the memory repositories answer searches like the database
+repositories so service level tests and benchmarks run against them stand for the
+database backend"""
+
+import json
+from datetime import datetime, timezone
+from uuid import uuid4
+
+import pytest
+
+from app.repository_layer.memory_repository import (
+    ProjectMemoryRepository,
+    TaskMemoryRepository,
+)
+from app.repository_layer.models.enumerations import TaskAndProjectStatuses
+from app.repository_layer.project_database_repository import (
+    ProjectDatabaseRepository,
+)
+from app.repository_layer.task_database_repository import TaskDatabaseRepository
+from app.repository_layer.util_compiled_filter_rules import compile_filter_rules
+from app.service_layer.schemas.task_schemas import (
+    TaskListSearchFieldsSchema,
+    TaskStatsSearchFieldsSchema,
+)
+from app.tests.utils import project_create, task_create
+
+pytestmark = pytest.mark.anyio
+
+NOT_STARTED = TaskAndProjectStatuses.not_started
+IN_PROGRESS = TaskAndProjectStatuses.in_progress
+COMPLETED = TaskAndProjectStatuses.completed
+
+# Name, project, parent task, status and deadline day in March 2030
+TASKS = [
+    ("write report", "work", None, IN_PROGRESS, 3),
+    ("review report", "work", None, NOT_STARTED, 10),
+    ("send invoices", "work", None, COMPLETED, 1),
+    ("plan sprint", "work", None, NOT_STARTED, None),
+    ("outline", None, "write report", COMPLETED, 2),
+    ("charts", None, "write report", NOT_STARTED, 5),
+    ("groceries", "home", None, NOT_STARTED, 4),
+    ("laundry", "home", None, IN_PROGRESS, None),
+    ("fix bike", "home", None, NOT_STARTED, 20),
+    ("tyres", None, "fix bike", IN_PROGRESS, 15),
+]
+
+
+def _march(day: int) -> datetime:
+    return datetime(2030, 3, day, tzinfo=timezone.utc)
+
+
+async def _seed(project_repo, task_repo) -> dict:
+    """Creates the TASKS. Returns the ids by project and task name"""
+    ids = {
+        name: (await project_repo.create(project_create(name)))["id"]
+        for name in ("work", "home")
+    }
+    for name, project, parent, task_status, deadline_day in TASKS:
+        task = await task_repo.create(
+            task_create(
+                name,
+                project_id=ids.get(project),
+                parent_task_id=ids.get(parent),
+                status=task_status,
+                deadline_date=_march(deadline_day) if deadline_day else None,
+            )
+        )
+        ids[name] = task["id"]
+    return ids
+
+
+# Search fields of each case. Ids are given by name and replaced by the ids of
+# the backend. Orderings by status or by columns with missing values are left out
+# as the memory repositories sort like Postgres, by enum declaration order with
+# NULLS LAST, while SQLite sorts enums by name and NULLs first
+SEARCHES = [
+    dict(ordering=("name",)),
+    dict(ordering=("-name",), itemsPerPage=3, page=2),
+    dict(project_id="home", ordering=("-position",), itemsPerPage=2, page=1),
+    dict(status=(IN_PROGRESS, COMPLETED), ordering=("name",)),
+    dict(project_id="work", ordering=("position",)),
+    dict(parent_task_id="write report", ordering=("-created_at",)),
+    dict(ids=("groceries", "tyres", "outline"), ordering=("name",)),
+    dict(name="%REPORT", ordering=("name",)),
+    dict(
+        deadline_date_from=_march(3),
+        deadline_date_to=_march(15),
+        ordering=("-deadline_date",),
+    ),
+    dict(
+        status=(NOT_STARTED,),
+        deadline_date_to=_march(10),
+        ordering=("deadline_date",),
+        itemsPerPage=2,
+        page=2,
+    ),
+]
+
+
+@pytest.fixture
+async def backends(session_factory, memory_store) -> list[tuple]:
+    """Task repository of each backend with the TASKS and their ids"""
+    backends = []
+    for project_repo, task_repo in (
+        (
+            ProjectDatabaseRepository(session_factory),
+            TaskDatabaseRepository(session_factory),
+        ),
+        (ProjectMemoryRepository(memory_store), TaskMemoryRepository(memory_store)),
+    ):
+        backends.append((task_repo, await _seed(project_repo, task_repo)))
+    return backends
+
+
+def _with_ids(fields: dict, ids: dict) -> dict:
+    fields = dict(fields)
+    for key in ("project_id", "parent_task_id"):
+        if key in fields:
+            fields[key] = ids[fields[key]]
+    if "ids" in fields:
+        fields["ids"] = tuple(ids[name] for name in fields["ids"])
+    return fields
+
+
+@pytest.mark.parametrize("fields", SEARCHES)
+async def test_backends_list_the_same_page(backends, fields):
+    pages = []
+    for task_repo, ids in backends:
+        tasks = await task_repo.get_multi(
+            TaskListSearchFieldsSchema(**{"page": 1, **_with_ids(fields, ids)})
+        )
+        pages.append([task["name"] for task in tasks])
+    database_page, memory_page = pages
+    assert database_page, "The search should match some tasks"
+    assert memory_page == database_page
+
+
+@pytest.mark.parametrize(
+    "fields",
+    [
+        dict(),
+        dict(project_id="home"),
+        dict(status=(NOT_STARTED,), deadline_date_from=_march(4)),
+    ],
+)
+async def test_backends_count_the_same_stats(backends, fields):
+    counts = []
+    for task_repo, ids in backends:
+        stats = await task_repo.get_stats(
+            TaskStatsSearchFieldsSchema(**_with_ids(fields, ids))
+        )
+        project_names = {ids[name]: name for name in ("work", "home")}
+        # Subtasks are not linked to a project
+        stats["by_project"] = sorted(
+            (project_names.get(row["project_id"], "subtasks"), row["count"])
+            for row in stats["by_project"]
+        )
+        counts.append(stats)
+    database_stats, memory_stats = counts
+    assert memory_stats == database_stats
+
+
+# Saved filter rules of each case. Rules in one dictionary must all match, the
+# dictionaries of a list are alternatives
+RULES = [
+    [{"status": {"field": "status", "operator": "notIn", "value": ["Completed"]}}],
+    [
+        {
+            "deadline_date": {
+                "field": "deadline_date",
+                "operator": "between",
+                "start_date": "2030-03-02T00:00:00Z",
+                "end_date": "2030-03-12T00:00:00Z",
+            },
+            "status": {"field": "status", "operator": "in", "value": ["Not started"]},
+        },
+        {"status": {"field": "status", "operator": "in", "value": ["Completed"]}},
+    ],
+    [
+        {
+            "parent_project": {
+                "operator": "in",
+                "project_names": ["home"],
+                "include_child_projects": False,
+            }
+        }
+    ],
+]
+
+
+@pytest.mark.parametrize("rules", RULES)
+async def test_backends_match_the_same_saved_filter_rules(backends, rules):
+    compiled_rules = compile_filter_rules(json.dumps(rules))
+    matches = []
+    for task_repo, _ in backends:
+        tasks = await task_repo.get_filter_tasks(
+            filter_id=uuid4(), rules=compiled_rules, materialized=False, limit=4
+        )
+        matches.append([task["name"] for task in tasks])
+    database_matches, memory_matches = matches
+    assert database_matches, "The rules should match some tasks"
+    assert memory_matches == database_matches
@@ -0,0 +1,27 @@
+"""Tests of the ETag and If-Match headers of the routes"""
+
+import pytest
+from fastapi import HTTPException
+
+from app.api.routes.utils import etag, parse_if_match
+
+
+@pytest.mark.parametrize(
+    "if_match, expected_version",
+    [
+        (None, None),
+        ("*", None),
+        ('"3"', 3),
+        ('W/"3"', 3),
+        (etag(12), 12),
+    ],
+)
+def test_if_match_gives_the_expected_version(if_match, expected_version):
+    assert parse_if_match(if_match) == expected_version
+
+
+@pytest.mark.parametrize("if_match", ['"abc"', '"1", "2"', '""'])
+def test_if_match_that_can_never_match_is_rejected(if_match):
+    with pytest.raises(HTTPException) as error:
+        parse_if_match(if_match)
+    assert error.value.status_code == 412
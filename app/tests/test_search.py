@@ -0,0 +1,14 @@
+"""Tests of the full text search that can run without Postgres"""
+
+import pytest
+
+from app.repository_layer.exceptions_repository import TasklyRepositoryException
+from app.repository_layer.search_database_repository import SearchDatabaseRepository
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_search_is_not_implemented_on_sqlite(session_factory):
+    with pytest.raises(TasklyRepositoryException) as error:
+        await SearchDatabaseRepository(session_factory).search(text="report")
+    assert error.value.status_code == 501
@@ -0,0 +1,125 @@
+"""Tests that the set based task writes leave the same history and outbox events as
+changing the tasks one by one"""
+
+import pytest
+from sqlalchemy import select
+
+from app.core_layer.config import settings
+from app.repository_layer.audit_database_repository import AuditWriter
+from app.repository_layer.models.models import AuditLog, OutboxEvents
+from app.repository_layer.project_database_repository import (
+    ProjectDatabaseRepository,
+)
+from app.repository_layer.task_database_repository import TaskDatabaseRepository
+from app.service_layer.schemas.task_schemas import TaskBulkSearchFieldsSchema
+from app.tests.utils import project_create, task_create
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def tasks(session_factory) -> dict:
+    """Projects home and work. Tasks root and other in home, subtask below root"""
+    project_repo = ProjectDatabaseRepository(session_factory)
+    task_repo = TaskDatabaseRepository(session_factory)
+    ids = {
+        name: (await project_repo.create(project_create(name)))["id"]
+        for name in ("home", "work")
+    }
+    ids["root"] = (
+        await task_repo.create(task_create("root", project_id=ids["home"]))
+    )["id"]
+    ids["subtask"] = (
+        await task_repo.create(task_create("subtask", parent_task_id=ids["root"]))
+    )["id"]
+    ids["other"] = (
+        await task_repo.create(task_create("other", project_id=ids["home"]))
+    )["id"]
+    return ids
+
+
+@pytest.fixture
+def audit_writer(session_factory) -> AuditWriter:
+    return AuditWriter(
+        session_factory,
+        max_queue_size=100,
+        batch_size=10,
+        flush_interval_seconds=0.01,
+    )
+
+
+@pytest.mark.parametrize(
+    "write, action, changed",
+    [
+        (
+            "complete_subtree",
+            "update",
+            {"root": {"status"}, "subtask": {"status"}},
+        ),
+        (
+            "move_subtree",
+            "update",
+            {"root": {"project_id"}, "subtask": {"project_id"}},
+        ),
+        (
+            "delete",
+            "delete",
+            {"root": {"deleted_at"}, "subtask": {"deleted_at"}},
+        ),
+        (
+            "bulk_update",
+            "update",
+            {"root": {"description"}, "other": {"description"}},
+        ),
+        (
+            "bulk_delete",
+            "delete",
+            {"root": {"deleted_at"}, "subtask": {"deleted_at"}},
+        ),
+    ],
+)
+async def test_set_based_writes_are_audited_and_published(
+    session_factory, tasks, audit_writer, monkeypatch, write, action, changed
+):
+    monkeypatch.setattr(settings, "OUTBOX_ENABLED", True)
+    task_repo = TaskDatabaseRepository(session_factory, audit_writer=audit_writer)
+
+    if write == "complete_subtree":
+        await task_repo.complete_subtree(tasks["root"])
+    elif write == "move_subtree":
+        await task_repo.move_subtree(tasks["root"], project_id=tasks["work"])
+    elif write == "delete":
+        await task_repo.delete(tasks["root"])
+    elif write == "bulk_update":
+        await task_repo.bulk_update(
+            {"description": "changed"},
+            filter_params=TaskBulkSearchFieldsSchema(
+                ids=(tasks["root"], tasks["other"])
+            ),
+        )
+    elif write == "bulk_delete":
+        await task_repo.bulk_delete(
+            filter_params=TaskBulkSearchFieldsSchema(ids=(tasks["root"],))
+        )
+    await audit_writer.stop()
+
+    names = {task_id: name for name, task_id in tasks.items()}
+    async with session_factory() as session:
+        events = (
+            await session.execute(
+                select(OutboxEvents.event_type, OutboxEvents.entity_id)
+            )
+        ).all()
+        history = (
+            await session.execute(
+                select(AuditLog.action, AuditLog.entity_id, AuditLog.changes)
+            )
+        ).all()
+    # One event and one history entry per changed task, none for the others
+    assert sorted((event_type, names[id]) for event_type, id in events) == sorted(
+        (f"tasks.{action}", name) for name in changed
+    )
+    assert {
+        names[entity_id]: (entry_action, set(changes))
+        for entry_action, entity_id, changes in history
+    } == {name: (action, fields) for name, fields in changed.items()}
@@ -0,0 +1,37 @@
+"""Tests of the task partition ranges."""
+
+from datetime import datetime, timezone
+
+from app.repository_layer.task_partitions import add_months, partition_ranges
+
+
+def test_add_months_from_end_of_month():
+    value = datetime(2026, 1, 31, 13, 30, tzinfo=timezone.utc)
+    assert add_months(value, 1) == datetime(2026, 2, 1, 13, 30, tzinfo=timezone.utc)
+    assert add_months(value, 13) == datetime(2027, 2, 1, 13, 30, tzinfo=timezone.utc)
+
+
+def test_add_months_across_years():
+    value = datetime(2026, 11, 30, tzinfo=timezone.utc)
+    assert add_months(value, 3) == datetime(2027, 2, 1, tzinfo=timezone.utc)
+    assert add_months(value, -11) == datetime(2025, 12, 1, tzinfo=timezone.utc)
+
+
+def test_partition_ranges_from_end_of_month():
+    ranges = partition_ranges(
+        start=datetime(2026, 1, 31, tzinfo=timezone.utc),
+        end=datetime(2026, 5, 31, tzinfo=timezone.utc),
+        months=3,
+    )
+    assert ranges == [
+        (
+            "tasks_p2026_01",
+            datetime(2026, 1, 1, tzinfo=timezone.utc),
+            datetime(2026, 4, 1, tzinfo=timezone.utc),
+        ),
+        (
+            "tasks_p2026_04",
+            datetime(2026, 4, 1, tzinfo=timezone.utc),
+            datetime(2026, 7, 1, tzinfo=timezone.utc),
+        ),
+    ]
@@ -0,0 +1,160 @@
+"""Behaviour tests of the task repositories. Every test runs against the database
+repositories on SQLite and against the memory repositories."""
+
+from datetime import datetime, timezone
+
+import pytest
+
+from app.repository_layer.exceptions_repository import TasklyRepositoryException
+from app.repository_layer.models.enumerations import TaskAndProjectStatuses
+from app.service_layer.schemas.task_schemas import (
+    TaskListSearchFieldsSchema,
+    TaskStatsSearchFieldsSchema,
+    TaskUpdate,
+)
+from app.tests.utils import project_create, task_create
+
+pytestmark = pytest.mark.anyio
+
+EARLY_DEADLINE = datetime(2030, 1, 1, tzinfo=timezone.utc)
+LATE_DEADLINE = datetime(2030, 6, 1, tzinfo=timezone.utc)
+
+
+async def _raises(status_code: int, action) -> None:
+    with pytest.raises(TasklyRepositoryException) as error:
+        await action
+    assert error.value.status_code == status_code
+
+
+async def _names_in_order(task_repo, project_id) -> list[str]:
+    tasks = await task_repo.get_multi(
+        TaskListSearchFieldsSchema(
+            page=1, project_id=project_id, ordering=("position",)
+        )
+    )
+    return [task["name"] for task in tasks]
+
+
+async def test_update_with_stale_version_is_rejected(repositories):
+    project_repo, task_repo = repositories
+    project = await project_repo.create(project_create("home"))
+    task = await task_repo.create(task_create("task", project_id=project["id"]))
+    assert task["version"] == 1
+
+    updated = await task_repo.update(
+        task["id"], TaskUpdate.model_construct(name="first"), expected_version=1
+    )
+    assert updated["version"] == 2
+    # A client still holding version 1 must read the task again
+    await _raises(
+        412,
+        task_repo.update(
+            task["id"], TaskUpdate.model_construct(name="second"), expected_version=1
+        ),
+    )
+    assert (await task_repo.get(task["id"]))["name"] == "first"
+
+    updated = await task_repo.update(
+        task["id"], TaskUpdate.model_construct(name="second"), expected_version=2
+    )
+    assert (updated["name"], updated["version"]) == ("second", 3)
+
+
+async def test_move_orders_siblings(repositories):
+    project_repo, task_repo = repositories
+    project = await project_repo.create(project_create("home"))
+    a, b, c = [
+        await task_repo.create(task_create(name, project_id=project["id"]))
+        for name in ("a", "b", "c")
+    ]
+    assert await _names_in_order(task_repo, project["id"]) == ["a", "b", "c"]
+
+    moved = await task_repo.move(c["id"], before_id=a["id"])
+    assert await _names_in_order(task_repo, project["id"]) == ["c", "a", "b"]
+    # A move is a change of the task like any other for If-Match
+    assert moved["version"] == c["version"] + 1
+    await task_repo.move(c["id"], after_id=a["id"])
+    assert await _names_in_order(task_repo, project["id"]) == ["a", "c", "b"]
+    await task_repo.move(b["id"], after_id=a["id"], before_id=c["id"])
+    assert await _names_in_order(task_repo, project["id"]) == ["a", "b", "c"]
+
+    # The neighbours must be in order, next to each other and be siblings of the
+    # moved task
+    await _raises(422, task_repo.move(a["id"], after_id=c["id"], before_id=b["id"]))
+    d = await task_repo.create(task_create("d", project_id=project["id"]))
+    await _raises(422, task_repo.move(d["id"], after_id=a["id"], before_id=c["id"]))
+    assert await _names_in_order(task_repo, project["id"]) == ["a", "b", "c", "d"]
+    subtask = await task_repo.create(task_create("subtask", parent_task_id=a["id"]))
+    await _raises(422, task_repo.move(b["id"], after_id=subtask["id"]))
+
+
+async def test_subtree_changes_keep_project_rollups(repositories):
+    project_repo, task_repo = repositories
+    home = await project_repo.create(project_create("home"))
+    work = await project_repo.create(project_create("work"))
+    first = await task_repo.create(
+        task_create("first", project_id=home["id"], deadline_date=EARLY_DEADLINE)
+    )
+    second = await task_repo.create(
+        task_create("second", project_id=home["id"], deadline_date=LATE_DEADLINE)
+    )
+    subtask = await task_repo.create(task_create("subtask", parent_task_id=first["id"]))
+
+    async def rollups(project) -> tuple:
+        project = await project_repo.get(project["id"])
+        return (
+            project["total_tasks"],
+            project["completed_tasks"],
+            project["next_deadline"],
+        )
+
+    assert await rollups(home) == (2, 0, EARLY_DEADLINE)
+
+    await task_repo.complete_subtree(first["id"])
+    assert (await task_repo.get(subtask["id"]))["status"] is (
+        TaskAndProjectStatuses.completed
+    )
+    assert await rollups(home) == (2, 1, LATE_DEADLINE)
+
+    await task_repo.move_subtree(second["id"], project_id=work["id"])
+    assert await rollups(home) == (1, 1, None)
+    assert await rollups(work) == (1, 0, LATE_DEADLINE)
+
+    # The subtask is moved along and now counts towards the project
+    await task_repo.move_subtree(first["id"], project_id=work["id"])
+    assert await rollups(home) == (0, 0, None)
+    assert await rollups(work) == (3, 2, LATE_DEADLINE)
+
+
+async def test_soft_deleted_tasks_are_hidden(repositories):
+    project_repo, task_repo = repositories
+    project = await project_repo.create(project_create("home"))
+    deleted = await task_repo.create(task_create("deleted", project_id=project["id"]))
+    subtask = await task_repo.create(
+        task_create("subtask", parent_task_id=deleted["id"])
+    )
+    await task_repo.create(task_create("kept", project_id=project["id"]))
+
+    await task_repo.delete(deleted["id"])
+
+    for task in (deleted, subtask):
+        await _raises(404, task_repo.get(task["id"]))
+        await _raises(
+            404, task_repo.update(task["id"], TaskUpdate.model_construct(name="x"))
+        )
+        await _raises(404, task_repo.delete(task["id"]))
+        await _raises(404, task_repo.get_subtree(task["id"], depth=1))
+    listed = await task_repo.get_multi(TaskListSearchFieldsSchema(page=1))
+    assert [task["name"] for task in listed] == ["kept"]
+    assert (await task_repo.get_stats(TaskStatsSearchFieldsSchema()))["total"] == 1
+    assert (await project_repo.get(project["id"]))["total_tasks"] == 1
+
+    # Still listed on request with the time they were deleted
+    listed = await task_repo.get_multi(
+        TaskListSearchFieldsSchema(page=1, include_archived=True, ordering=("name",))
+    )
+    assert [(task["name"], task["deleted_at"] is not None) for task in listed] == [
+        ("deleted", True),
+        ("kept", False),
+        ("subtask", True),
+    ]
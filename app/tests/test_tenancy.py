@@ -0,0 +1,204 @@
+"""Tests that tenants only see and change their own rows. Run on SQLite, which has
+no row level security, so only the tenant scoping of the repositories applies."""
+
+import json
+from contextlib import nullcontext
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import select
+
+from app.core_layer.database import _set_transaction_settings
+from app.core_layer.tenancy import all_tenants
+from app.repository_layer.exceptions_repository import TasklyRepositoryException
+from app.repository_layer.models.enumerations import TaskAndProjectStatuses
+from app.repository_layer.models.models import TaskfilterMembers, Tasks
+from app.repository_layer.project_database_repository import (
+    ProjectDatabaseRepository,
+)
+from app.repository_layer.task_database_repository import TaskDatabaseRepository
+from app.repository_layer.taskfilters_database_repository import (
+    TaskfiltersDatabaseRepository,
+)
+from app.service_layer.schemas.task_schemas import (
+    TaskBulkSearchFieldsSchema,
+    TaskListSearchFieldsSchema,
+    TaskStatsSearchFieldsSchema,
+    TaskUpdate,
+)
+from app.service_layer.schemas.taskfilter_schemas import TaskFilterCreate
+from app.tests.utils import as_tenant, project_create, task_create
+
+pytestmark = pytest.mark.anyio
+
+TENANT_A = uuid4()
+TENANT_B = uuid4()
+
+
+@pytest.fixture
+def project_repo(session_factory):
+    return ProjectDatabaseRepository(session_factory)
+
+
+@pytest.fixture
+def task_repo(session_factory):
+    return TaskDatabaseRepository(session_factory)
+
+
+@pytest.fixture
+async def tenant_tasks(project_repo, task_repo) -> dict:
+    """A project with a task and a subtask for each tenant"""
+    tasks = {}
+    for tenant_id in (TENANT_A, TENANT_B):
+        with as_tenant(tenant_id):
+            project = await project_repo.create(project_create("project"))
+            task = await task_repo.create(task_create("task", project_id=project["id"]))
+            subtask = await task_repo.create(
+                task_create("subtask", parent_task_id=task["id"])
+            )
+        tasks[tenant_id] = (project, task, subtask)
+    return tasks
+
+
+async def _task_rows(session_factory) -> dict:
+    """Every task of every tenant by id"""
+    with as_tenant(None):
+        async with session_factory() as session:
+            return {task.id: task for task in await session.scalars(select(Tasks))}
+
+
+async def test_tasks_of_other_tenants_are_not_found(task_repo, tenant_tasks):
+    _, task_a, _ = tenant_tasks[TENANT_A]
+    with as_tenant(TENANT_B):
+        listed = await task_repo.get_multi(TaskListSearchFieldsSchema(page=1))
+        assert {task["tenant_id"] for task in listed} == {TENANT_B}
+        for action in (
+            task_repo.get(task_a["id"]),
+            task_repo.update(task_a["id"], TaskUpdate.model_construct(name="taken")),
+            task_repo.delete(task_a["id"]),
+        ):
+            with pytest.raises(TasklyRepositoryException) as error:
+                await action
+            assert error.value.status_code == 404
+
+
+async def test_tasks_can_not_reference_other_tenants(task_repo, tenant_tasks):
+    project_a, task_a, _ = tenant_tasks[TENANT_A]
+    with as_tenant(TENANT_B):
+        for data in (
+            task_create("task", project_id=project_a["id"]),
+            task_create("subtask", parent_task_id=task_a["id"]),
+        ):
+            with pytest.raises(TasklyRepositoryException) as error:
+                await task_repo.create(data)
+            assert error.value.status_code == 404
+
+
+async def test_bulk_delete_only_matches_own_tenant(
+    session_factory, task_repo, tenant_tasks
+):
+    everything = TaskBulkSearchFieldsSchema.model_construct()
+    with as_tenant(TENANT_B):
+        dry_run = await task_repo.bulk_delete(filter_params=everything, dry_run=True)
+        deleted = await task_repo.bulk_delete(filter_params=everything)
+    assert dry_run == {"matched": 2, "rows_touched": 3, "dry_run": True}
+    assert deleted == {"matched": 2, "rows_touched": 3, "dry_run": False}
+
+    rows = await _task_rows(session_factory)
+    assert all(
+        (row.deleted_at is not None) == (row.tenant_id == TENANT_B)
+        for row in rows.values()
+    )
+
+
+async def test_bulk_update_only_changes_own_tenant(
+    session_factory, project_repo, task_repo, tenant_tasks
+):
+    with as_tenant(TENANT_B):
+        updated = await task_repo.bulk_update(
+            {"status": TaskAndProjectStatuses.completed},
+            filter_params=TaskBulkSearchFieldsSchema.model_construct(),
+        )
+    assert updated["matched"] == 2
+
+    rows = await _task_rows(session_factory)
+    assert all(
+        (row.status is TaskAndProjectStatuses.completed) == (row.tenant_id == TENANT_B)
+        for row in rows.values()
+    )
+    with as_tenant(TENANT_A):
+        project_a = await project_repo.get(tenant_tasks[TENANT_A][0]["id"])
+    assert project_a["completed_tasks"] == 0
+
+
+async def test_stats_count_own_tenant(task_repo, tenant_tasks):
+    with as_tenant(TENANT_A):
+        stats = await task_repo.get_stats(TaskStatsSearchFieldsSchema())
+    assert stats["total"] == 2
+    # The subtask is linked to its parent task rather than the project
+    assert {row["project_id"]: row["count"] for row in stats["by_project"]} == {
+        tenant_tasks[TENANT_A][0]["id"]: 1,
+        None: 1,
+    }
+
+
+async def test_materialized_filter_only_holds_own_tenant(
+    session_factory, task_repo, tenant_tasks
+):
+    rules = json.dumps(
+        [{"status": {"field": "status", "operator": "in", "value": ["Not started"]}}]
+    )
+    with as_tenant(TENANT_B):
+        taskfilter = await TaskfiltersDatabaseRepository(session_factory).create(
+            TaskFilterCreate(name="open", rules=rules, materialized=True)
+        )
+    with as_tenant(TENANT_A):
+        # Changes of other tenants are not added to the filter either
+        await task_repo.create(
+            task_create("new", project_id=tenant_tasks[TENANT_A][0]["id"])
+        )
+
+    with as_tenant(None):
+        async with session_factory() as session:
+            members = set(
+                await session.scalars(
+                    select(TaskfilterMembers.task_id).where(
+                        TaskfilterMembers.filter_id == taskfilter["id"]
+                    )
+                )
+            )
+    assert members == {task["id"] for task in tenant_tasks[TENANT_B][1:]}
+
+
+class _RecordingConnection:
+    """Postgres connection recording the settings of a new transaction"""
+
+    class dialect:
+        name = "postgresql"
+
+    def __init__(self):
+        self.settings = {}
+
+    def execute(self, statement):
+        params = list(statement.compile().params.values())
+        # set_config(name, value, is_local) for each setting
+        for index in range(0, len(params), 3):
+            self.settings[params[index]] = params[index + 1]
+
+
+@pytest.mark.parametrize(
+    "tenant, everyone, expected",
+    [
+        (TENANT_A, False, {"app.tenant_id": str(TENANT_A)}),
+        (None, True, {"app.all_tenants": "on"}),
+        # Row level security shows such transactions no rows at all
+        (None, False, {}),
+    ],
+)
+async def test_transactions_set_the_tenant_for_row_level_security(
+    tenant, everyone, expected
+):
+    connection = _RecordingConnection()
+    with as_tenant(tenant), all_tenants() if everyone else nullcontext():
+        _set_transaction_settings(session=None, transaction=None, connection=connection)
+    assert connection.settings == expected
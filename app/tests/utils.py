@@ -0,0 +1,50 @@
+"""Helpers shared by the behaviour tests"""
+
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from uuid import UUID
+
+from app.core_layer.tenancy import current_tenant_id
+from app.repository_layer.models.enumerations import ProjectTypes
+from app.service_layer.schemas.project_schemas import ProjectCreate
+from app.service_layer.schemas.task_schemas import TaskCreate
+
+# The tables require a description and repeat dates even for records that do not
+# repeat
+DESCRIPTION = "description"
+REPEAT_START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+REPEAT_END = datetime(2027, 1, 1, tzinfo=timezone.utc)
+
+
+@contextmanager
+def as_tenant(tenant_id: UUID | None):
+    """Runs the block as a request of `tenant_id`. None leaves ORM queries unscoped"""
+    token = current_tenant_id.set(tenant_id)
+    try:
+        yield tenant_id
+    finally:
+        current_tenant_id.reset(token)
+
+
+def project_create(name: str, **fields) -> ProjectCreate:
+    """Create schema of a project. Not validated as the repositories are tested
+    rather than the request schemas"""
+    return ProjectCreate.model_construct(
+        name=name,
+        type=ProjectTypes.project,
+        description=DESCRIPTION,
+        repeat_start=REPEAT_START,
+        repeat_end=REPEAT_END,
+        **fields,
+    )
+
+
+def task_create(name: str, **fields) -> TaskCreate:
+    """Create schema of a task, see project_create"""
+    return TaskCreate.model_construct(
+        name=name,
+        description=DESCRIPTION,
+        repeat_start=REPEAT_START,
+        repeat_end=REPEAT_END,
+        **fields,
+    )